@@ -2,6 +2,9 @@
 ImageKit client initialization using environment settings
 This keeps keys out of code and reads from environment variables as configured in `config/settings/base.py`.
 """
+
+from functools import lru_cache
+
 from django.conf import settings
 
 try:
@@ -11,7 +14,8 @@ except Exception:
 
 
 def get_imagekit_client():
-    """Return a configured ImageKit client or None if the SDK isn't installed.
+    """Return a configured ImageKit client or None if the SDK isn't installed
+    or isn't configured.
 
     This is a thin factory to avoid failing import-time when the package
     is not installed (e.g., tests or environments without the SDK).
@@ -19,12 +23,55 @@ def get_imagekit_client():
     if ImageKit is None:
         return None
 
-    return ImageKit(
-        private_key=getattr(settings, "IMAGEKIT_PRIVATE_KEY", ""),
-        public_key=getattr(settings, "IMAGEKIT_PUBLIC_KEY", ""),
-        url_endpoint=getattr(settings, "IMAGEKIT_URL_ENDPOINT", ""),
-    )
+    try:
+        return ImageKit(
+            private_key=getattr(settings, "IMAGEKIT_PRIVATE_KEY", ""),
+            public_key=getattr(settings, "IMAGEKIT_PUBLIC_KEY", ""),
+            url_endpoint=getattr(settings, "IMAGEKIT_URL_ENDPOINT", ""),
+        )
+    except ValueError:
+        # The SDK refuses to initialize without keys and an endpoint
+        return None
 
 
 # Module-level client for convenience
 imagekit = get_imagekit_client()
+
+
+@lru_cache(maxsize=getattr(settings, "IMAGEKIT_URL_CACHE_SIZE", 4096))
+def transformed_url(src, width=None, height=None, quality=None, url_endpoint=None):
+    """Return the ImageKit URL of `src` resized/compressed as requested.
+
+    Building a URL signs and formats it in the SDK, so results are memoized in a
+    bounded LRU cache shared by the media models and the `imagekit_url` tag.
+    Call `transformed_url.cache_info()` for hit/miss counts.
+    """
+    if not src or not imagekit:
+        return src
+
+    transformation = []
+    if height:
+        transformation.append({"height": str(height)})
+    if width:
+        transformation.append({"width": str(width)})
+    if quality:
+        transformation.append({"quality": str(quality)})
+    if not transformation and not url_endpoint:
+        return src
+
+    data = {"src": src}
+    if url_endpoint:
+        data["url_endpoint"] = url_endpoint
+    if transformation:
+        data["transformation"] = transformation
+    return imagekit.url(data)
+
+
+def get_url_cache_stats():
+    info = transformed_url.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
@@ -0,0 +1,160 @@
+"""
+Pagination classes shared by the API apps.
+"""
+
+import json
+import operator
+from functools import reduce
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over `(-created_at, id)`, or the ordering a client picks
+    through the view's `OrderingFilter`.
+
+    `pk` always ends the ordering and the cursor holds the value of every
+    ordering field, so each page is fetched with a range condition on the
+    whole key, e.g. `created_at < c OR (created_at = c AND id > i)`. The cost
+    stays proportional to the page size however deep the client pages, even
+    over ties on a non-unique column such as `price`. Cursors are opaque base64
+    tokens returned in the `next`/`previous` links.
+    """
+
+    ordering = ("-created_at", "pk")
+    page_size_query_param = "page_size"
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, "API_MAX_PAGE_SIZE", 100)
+
+    def get_page_size(self, request):
+        # A `PAGE_SIZE` in REST_FRAMEWORK would paginate every list view
+        self.page_size = getattr(settings, "API_PAGE_SIZE", 20)
+        return super().get_page_size(request)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering[-1].lstrip("-") not in ("pk", "id"):
+            ordering = (*ordering, "pk")
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # `CursorPagination.paginate_queryset`, filtering on the whole key
+        # instead of the first ordering field and an offset over its ties
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(current_position, reverse)
+            )
+
+        end = offset + self.page_size + 1
+        results = list(queryset[offset:end])
+        self.page = list(results[: self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_position_filter(self, position, reverse):
+        """
+        Rows after `position` in the ordering, or before it for a reverse cursor
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        after = []
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            field = order.lstrip("-")
+            lookup = "lt" if order.startswith("-") != reverse else "gt"
+            after.append(equal & Q(**{f"{field}__{lookup}": value}))
+            equal &= Q(**{field: value})
+
+        # The bound on the leading field alone lets the index range scan
+        field = self.ordering[0].lstrip("-")
+        lookup = "lte" if self.ordering[0].startswith("-") != reverse else "gte"
+        return Q(**{f"{field}__{lookup}": values[0]}) & reduce(operator.or_, after)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field = order.lstrip("-")
+            if isinstance(instance, dict):
+                value = instance[field]
+            else:
+                value = getattr(instance, field)
+            values.append(str(value))
+        return json.dumps(values)
+
+
+def _reverse_ordering(ordering):
+    return tuple(
+        order[1:] if order.startswith("-") else f"-{order}" for order in ordering
+    )
+
+
+class SearchResultsPagination(PageNumberPagination):
+    """
+    Page number pagination for relevance-ranked results, which have no stable
+    keyset to build cursors from.
+    """
+
+    page_size_query_param = "page_size"
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, "API_MAX_PAGE_SIZE", 100)
+
+    def get_page_size(self, request):
+        self.page_size = getattr(settings, "API_PAGE_SIZE", 20)
+        return super().get_page_size(request)
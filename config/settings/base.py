@@ -1,5 +1,6 @@
 from pathlib import Path
 
+from celery.schedules import crontab
 from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -10,7 +11,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/4.0/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = config("SECRET_KEY", default="django-insecure-default-key-change-in-production")
+SECRET_KEY = config(
+    "SECRET_KEY", default="django-insecure-default-key-change-in-production"
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config("DEBUG", default=False, cast=bool)
@@ -153,6 +156,42 @@ REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+# Page size of the paginated list endpoints, see config/pagination.py
+API_PAGE_SIZE = config("API_PAGE_SIZE", default=20, cast=int)
+# Upper bound for the `page_size` query parameter on paginated endpoints
+API_MAX_PAGE_SIZE = config("API_MAX_PAGE_SIZE", default=100, cast=int)
+
+# PostgreSQL text search configuration used for the product search vector
+PRODUCT_SEARCH_CONFIG = config("PRODUCT_SEARCH_CONFIG", default="english")
+
+# Responsive renditions (name -> width in px) computed for every uploaded
+# product image, and the quality they are encoded at
+PRODUCT_IMAGE_VARIANTS = {"thumb": 150, "card": 400, "detail": 800, "zoom": 1600}
+PRODUCT_IMAGE_VARIANT_QUALITY = config(
+    "PRODUCT_IMAGE_VARIANT_QUALITY", default=80, cast=int
+)
+
+# Normalization of uploaded product images before they go to ImageKit, see
+# products.image_processing. AVIF needs Pillow 11.3+ or pillow-avif-plugin.
+PRODUCT_IMAGE_NORMALIZE = config("PRODUCT_IMAGE_NORMALIZE", default=True, cast=bool)
+PRODUCT_IMAGE_FORMAT = config("PRODUCT_IMAGE_FORMAT", default="WEBP")
+PRODUCT_IMAGE_QUALITY = config("PRODUCT_IMAGE_QUALITY", default=82, cast=int)
+PRODUCT_IMAGE_MAX_EDGE = config("PRODUCT_IMAGE_MAX_EDGE", default=2048, cast=int)
+PRODUCT_IMAGE_NORMALIZE_WORKERS = config(
+    "PRODUCT_IMAGE_NORMALIZE_WORKERS", default=2, cast=int
+)
+
+# Image variant used as the product card thumbnail
+PRODUCT_CARD_THUMBNAIL_VARIANT = "card"
+
+# Number of rows inserted per transaction by the bulk product import
+PRODUCT_IMPORT_BATCH_SIZE = config("PRODUCT_IMPORT_BATCH_SIZE", default=1000, cast=int)
+
+# Upper bounds of the price buckets reported in product list facets
+PRODUCT_PRICE_FACET_BUCKETS = config(
+    "PRODUCT_PRICE_FACET_BUCKETS", default="25,50,100,250,500,1000", cast=Csv(int)
+)
+
 SITE_ID = 1
 
 REST_USE_JWT = True
@@ -197,12 +236,44 @@ STRIPE_WEBHOOK_SECRET = config("STRIPE_WEBHOOK_SECRET", default="")
 BACKEND_DOMAIN = config("BACKEND_DOMAIN", default="http://localhost:8000")
 FRONTEND_DOMAIN = config("FRONTEND_DOMAIN", default="http://localhost:3000")
 
-PAYMENT_SUCCESS_URL = config("PAYMENT_SUCCESS_URL", default="http://localhost:3000/success")
-PAYMENT_CANCEL_URL = config("PAYMENT_CANCEL_URL", default="http://localhost:3000/cancel")
+PAYMENT_SUCCESS_URL = config(
+    "PAYMENT_SUCCESS_URL", default="http://localhost:3000/success"
+)
+PAYMENT_CANCEL_URL = config(
+    "PAYMENT_CANCEL_URL", default="http://localhost:3000/cancel"
+)
+
+# Most items an order can be synced with in one request
+ORDER_MAX_ITEMS = config("ORDER_MAX_ITEMS", default=100, cast=int)
+
+# Seconds the stock of an order is held for while its buyer checks out, see
+# orders/stock.py. Stripe checkout sessions expire with the reservation, but
+# live at least 31 minutes: with a shorter TTL a session can be paid after
+# its stock was released, and the payment webhook takes the stock again.
+STOCK_RESERVATION_TTL = config("STOCK_RESERVATION_TTL", default=1860, cast=int)
+# Expired reservations released per transaction by the sweeper
+STOCK_RESERVATION_SWEEP_BATCH_SIZE = config(
+    "STOCK_RESERVATION_SWEEP_BATCH_SIZE", default=500, cast=int
+)
 
 # Celery
 CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = config("REDIS_BACKEND", default="redis://localhost:6379/0")
+CELERY_BEAT_SCHEDULE = {
+    "collect-orphaned-media": {
+        "task": "products.tasks.collect_orphaned_media",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    # Picks up retries whose scheduled drain was lost, e.g. with a restarted broker
+    "upload-pending-media": {
+        "task": "products.tasks.upload_pending_media",
+        "schedule": crontab(minute="*/10"),
+    },
+    "release-expired-stock-reservations": {
+        "task": "orders.tasks.release_expired_stock_reservations",
+        "schedule": crontab(),
+    },
+}
 
 
 # DRF Spectacular
@@ -224,26 +295,121 @@ CACHE_MIDDLEWARE_ALIAS = "default"
 CACHE_MIDDLEWARE_SECONDS = 3600
 CACHE_MIDDLEWARE_KEY_PREFIX = ""
 
+# Versioned response cache for the public catalog endpoints (see products/cache.py)
+CATALOG_CACHE_ENABLED = config("CATALOG_CACHE_ENABLED", default=True, cast=bool)
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_CACHE_TIMEOUT = config("CATALOG_CACHE_TIMEOUT", default=3600, cast=int)
+
 # CSRF Trusted Origins (comma-separated URLs), e.g., http://localhost:8000,https://example.com
 CSRF_TRUSTED_ORIGINS = config("CSRF_TRUSTED_ORIGINS", default="", cast=Csv())
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.0/howto/static-files/
-STATIC_URL = '/static/'
-STATIC_ROOT = BASE_DIR.parent / 'staticfiles'
+STATIC_URL = "/static/"
+STATIC_ROOT = BASE_DIR.parent / "staticfiles"
 STATICFILES_DIRS = [
-    BASE_DIR.parent / 'static',
+    BASE_DIR.parent / "static",
 ]
 
 # Media files
-MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR.parent / 'mediafiles'
+MEDIA_URL = "/media/"
+MEDIA_ROOT = BASE_DIR.parent / "mediafiles"
+# Hash uploaded files as they are received, for media deduplication
+FILE_UPLOAD_HANDLERS = [
+    "config.uploadhandlers.HashingMemoryFileUploadHandler",
+    "config.uploadhandlers.HashingTemporaryFileUploadHandler",
+]
 
 # ImageKit configuration - set these in your .env or environment variables
 IMAGEKIT_PUBLIC_KEY = config("IMAGEKIT_PUBLIC_KEY", default="")
 IMAGEKIT_PRIVATE_KEY = config("IMAGEKIT_PRIVATE_KEY", default="")
 IMAGEKIT_URL_ENDPOINT = config("IMAGEKIT_URL_ENDPOINT", default="")
 IMAGEKIT_UPLOAD_ASYNC = config("IMAGEKIT_UPLOAD_ASYNC", default=True, cast=bool)
+# Files accepted by one request to the bulk product image upload endpoint
+PRODUCT_IMAGE_BULK_MAX_FILES = config(
+    "PRODUCT_IMAGE_BULK_MAX_FILES", default=30, cast=int
+)
+# Seconds signed direct-to-ImageKit upload parameters stay valid, under an hour
+IMAGEKIT_DIRECT_UPLOAD_TTL = config("IMAGEKIT_DIRECT_UPLOAD_TTL", default=600, cast=int)
+
+# Chunked, resumable video uploads, see products.video_uploads
+VIDEO_UPLOAD_TEMP_DIR = config(
+    "VIDEO_UPLOAD_TEMP_DIR", default=str(BASE_DIR.parent / "video_uploads")
+)
+VIDEO_UPLOAD_CHUNK_SIZE = config(
+    "VIDEO_UPLOAD_CHUNK_SIZE", default=8 * 1024 * 1024, cast=int
+)
+VIDEO_UPLOAD_MAX_SIZE = config("VIDEO_UPLOAD_MAX_SIZE", default=2 * 1024**3, cast=int)
+# Seconds after its last chunk an unfinished upload is collected as garbage
+VIDEO_UPLOAD_EXPIRY = config("VIDEO_UPLOAD_EXPIRY", default=2 * 24 * 3600, cast=int)
+
+# Video transcoding with a local ffmpeg, see products.video_processing
+VIDEO_TRANSCODE_ENABLED = config("VIDEO_TRANSCODE_ENABLED", default=True, cast=bool)
+FFMPEG_BINARY = config("FFMPEG_BINARY", default="ffmpeg")
+FFPROBE_BINARY = config("FFPROBE_BINARY", default="ffprobe")
+VIDEO_TRANSCODE_MAX_HEIGHT = config(
+    "VIDEO_TRANSCODE_MAX_HEIGHT", default=1080, cast=int
+)
+VIDEO_TRANSCODE_CRF = config("VIDEO_TRANSCODE_CRF", default=23, cast=int)
+VIDEO_TRANSCODE_PRESET = config("VIDEO_TRANSCODE_PRESET", default="veryfast")
+VIDEO_TRANSCODE_AUDIO_BITRATE = config("VIDEO_TRANSCODE_AUDIO_BITRATE", default="128k")
+VIDEO_TRANSCODE_TIMEOUT = config("VIDEO_TRANSCODE_TIMEOUT", default=1800, cast=int)
+VIDEO_TRANSCODE_MAX_RETRIES = config("VIDEO_TRANSCODE_MAX_RETRIES", default=3, cast=int)
+# Seconds into the video the poster frame is taken from
+VIDEO_POSTER_OFFSET = config("VIDEO_POSTER_OFFSET", default=1.0, cast=float)
+# Videos at least this many seconds long also get an ImageKit HLS stream
+VIDEO_HLS_MIN_DURATION = config("VIDEO_HLS_MIN_DURATION", default=60, cast=int)
+VIDEO_HLS_RENDITIONS = config(
+    "VIDEO_HLS_RENDITIONS", default="360,480,720,1080", cast=Csv(int)
+)
+
+# Orphaned media collection, see products.garbage
+IMAGEKIT_API_URL = config("IMAGEKIT_API_URL", default="https://api.imagekit.io")
+MEDIA_GC_BATCH_SIZE = config("MEDIA_GC_BATCH_SIZE", default=1000, cast=int)
+# Files younger than this many seconds are never collected
+MEDIA_GC_GRACE_PERIOD = config("MEDIA_GC_GRACE_PERIOD", default=24 * 3600, cast=int)
+
+# Background upload worker, see products.uploads
+IMAGEKIT_UPLOAD_API_URL = config(
+    "IMAGEKIT_UPLOAD_API_URL", default="https://upload.imagekit.io"
+)
+IMAGEKIT_UPLOAD_CONCURRENCY = config("IMAGEKIT_UPLOAD_CONCURRENCY", default=8, cast=int)
+IMAGEKIT_UPLOAD_BATCH_SIZE = config("IMAGEKIT_UPLOAD_BATCH_SIZE", default=50, cast=int)
+IMAGEKIT_UPLOAD_MAX_BATCHES = config(
+    "IMAGEKIT_UPLOAD_MAX_BATCHES", default=20, cast=int
+)
+# Uploads per second across the worker's threads, 0 for no limit
+IMAGEKIT_UPLOAD_RATE_LIMIT = config("IMAGEKIT_UPLOAD_RATE_LIMIT", default=0, cast=float)
+IMAGEKIT_UPLOAD_TIMEOUT = config("IMAGEKIT_UPLOAD_TIMEOUT", default=60, cast=int)
+# Seconds to wait after a media save before draining, so bursts share batches
+IMAGEKIT_UPLOAD_DRAIN_DELAY = config("IMAGEKIT_UPLOAD_DRAIN_DELAY", default=2, cast=int)
+# Failed uploads are retried after IMAGEKIT_UPLOAD_RETRY_DELAY seconds, doubling
+# up to IMAGEKIT_UPLOAD_RETRY_MAX_DELAY, and marked failed after MAX_ATTEMPTS
+IMAGEKIT_UPLOAD_MAX_ATTEMPTS = config(
+    "IMAGEKIT_UPLOAD_MAX_ATTEMPTS", default=6, cast=int
+)
+IMAGEKIT_UPLOAD_RETRY_DELAY = config(
+    "IMAGEKIT_UPLOAD_RETRY_DELAY", default=30, cast=int
+)
+IMAGEKIT_UPLOAD_RETRY_MAX_DELAY = config(
+    "IMAGEKIT_UPLOAD_RETRY_MAX_DELAY", default=3600, cast=int
+)
+# Seconds after which a batch still `processing` is assumed lost and requeued
+IMAGEKIT_UPLOAD_STALE_AFTER = config(
+    "IMAGEKIT_UPLOAD_STALE_AFTER", default=900, cast=int
+)
+# New uploads get a 429 while this many files are waiting, 0 for no limit
+IMAGEKIT_UPLOAD_MAX_QUEUE_DEPTH = config(
+    "IMAGEKIT_UPLOAD_MAX_QUEUE_DEPTH", default=5000, cast=int
+)
+IMAGEKIT_UPLOAD_QUEUE_DEPTH_TTL = config(
+    "IMAGEKIT_UPLOAD_QUEUE_DEPTH_TTL", default=5, cast=int
+)
+IMAGEKIT_UPLOAD_QUEUE_RETRY_AFTER = config(
+    "IMAGEKIT_UPLOAD_QUEUE_RETRY_AFTER", default=60, cast=int
+)
+# Number of transformed URLs memoized per process by config.imagekit.transformed_url
+IMAGEKIT_URL_CACHE_SIZE = config("IMAGEKIT_URL_CACHE_SIZE", default=4096, cast=int)
 
 # Jazzmin configuration for a modern, branded admin
 JAZZMIN_SETTINGS = {
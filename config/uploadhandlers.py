@@ -0,0 +1,64 @@
+"""
+Upload handlers that compute the SHA-256 of each uploaded file while it is
+being received, so the content hash costs no extra pass over the bytes.
+
+The digest is available as `uploaded_file.sha256`. Use `content_sha256` to
+get the digest of any file, hashed on demand when no handler computed it.
+"""
+
+import hashlib
+
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+
+
+class HashingMixin:
+    digest = None
+
+    def new_file(self, *args, **kwargs):
+        self.digest = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        result = super().receive_data_chunk(raw_data, start)
+        # A handler that returns the chunk passes it on instead of storing it
+        if result is None and self.digest is not None:
+            self.digest.update(raw_data)
+        return result
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.sha256 = self.digest.hexdigest()
+        return uploaded_file
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def content_sha256(file_obj):
+    """
+    Hex SHA-256 of a Django `File`, read in chunks when it wasn't computed
+    by one of the handlers above
+    """
+    digest = getattr(file_obj, "sha256", None) or getattr(
+        getattr(file_obj, "file", None), "sha256", None
+    )
+    if digest:
+        return digest
+
+    digest = hashlib.sha256()
+    file_obj.open("rb")
+    try:
+        for chunk in file_obj.chunks():
+            digest.update(chunk)
+    finally:
+        file_obj.seek(0)
+    return digest.hexdigest()
@@ -4,7 +4,7 @@ from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
 from django.core.paginator import Paginator
-from django.db.models import Count, F, Sum, DecimalField, ExpressionWrapper
+from django.db.models import Count, Sum
 from django.db.models.functions import TruncDate
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
@@ -12,7 +12,8 @@ from django.views.decorators.cache import never_cache
 
 from orders.models import Order, OrderItem
 from products.models import Product, ProductCategory, ProductImage, ProductVideo
-from .forms import ProductForm, OrderStatusForm
+
+from .forms import OrderStatusForm, ProductForm
 
 User = get_user_model()
 
@@ -25,12 +26,7 @@ def index(request):
     total_products = Product.objects.count()
     total_orders = Order.objects.count()
 
-    total_sales = (
-        OrderItem.objects.aggregate(
-            total=Sum(ExpressionWrapper(F("quantity") * F("product__price"), output_field=DecimalField(max_digits=12, decimal_places=2)))
-        )["total"]
-        or 0
-    )
+    total_sales = Order.objects.aggregate(total=Sum("total"))["total"] or 0
 
     # Sales trend last 30 days
     thirty_days_ago = timezone.now() - timedelta(days=30)
@@ -38,9 +34,7 @@ def index(request):
         OrderItem.objects.filter(created_at__gte=thirty_days_ago)
         .annotate(day=TruncDate("created_at"))
         .values("day")
-        .annotate(
-            total=Sum(ExpressionWrapper(F("quantity") * F("product__price"), output_field=DecimalField(max_digits=12, decimal_places=2)))
-        )
+        .annotate(total=Sum("line_total"))
         .order_by("day")
     )
     sales_trend = {str(item["day"]): float(item["total"]) for item in sales_trend_qs}
@@ -53,9 +47,7 @@ def index(request):
     )
     top_products = {item["product__name"]: int(item["qty"]) for item in top_products_qs}
 
-    recent_orders = (
-        Order.objects.select_related("buyer").order_by("-created_at")[:10]
-    )
+    recent_orders = Order.objects.select_related("buyer").order_by("-created_at")[:10]
 
     context = {
         "total_customers": total_customers,
@@ -92,7 +84,13 @@ def products_list(request):
     return render(
         request,
         "dashboard/products_list.html",
-        {"page_obj": page_obj, "query": q or "", "sort": order_by, "form": form, "categories": categories},
+        {
+            "page_obj": page_obj,
+            "query": q or "",
+            "sort": order_by,
+            "form": form,
+            "categories": categories,
+        },
     )
 
 
@@ -106,15 +104,15 @@ def product_create(request):
             product.seller = request.user
             product.save()
             # Handle multiple uploaded images/videos
-            for idx, f in enumerate(request.FILES.getlist('image_files')):
+            for idx, f in enumerate(request.FILES.getlist("image_files")):
                 ProductImage.objects.create(product=product, file_local=f, order=idx)
-            for idx, f in enumerate(request.FILES.getlist('video_files')):
+            for idx, f in enumerate(request.FILES.getlist("video_files")):
                 ProductVideo.objects.create(product=product, file_local=f, order=idx)
             messages.success(request, f'Product "{product.name}" created successfully!')
             return redirect("dashboard:products_list")
         else:
             # Form has errors, re-render with error messages
-            messages.error(request, 'Please correct the errors below.')
+            messages.error(request, "Please correct the errors below.")
             qs = Product.objects.select_related("category", "seller").all()
             q = request.GET.get("q")
             order_by = request.GET.get("sort", "-created_at")
@@ -128,7 +126,13 @@ def product_create(request):
             return render(
                 request,
                 "dashboard/products_list.html",
-                {"page_obj": page_obj, "query": q or "", "sort": order_by, "form": form, "categories": categories},
+                {
+                    "page_obj": page_obj,
+                    "query": q or "",
+                    "sort": order_by,
+                    "form": form,
+                    "categories": categories,
+                },
             )
     return redirect("dashboard:products_list")
 
@@ -142,13 +146,13 @@ def product_update(request, product_id):
         if form.is_valid():
             form.save()
             # Update multiple uploads
-            for idx, f in enumerate(request.FILES.getlist('image_files')):
+            for idx, f in enumerate(request.FILES.getlist("image_files")):
                 ProductImage.objects.create(product=product, file_local=f, order=idx)
-            for idx, f in enumerate(request.FILES.getlist('video_files')):
+            for idx, f in enumerate(request.FILES.getlist("video_files")):
                 ProductVideo.objects.create(product=product, file_local=f, order=idx)
             messages.success(request, f'Product "{product.name}" updated successfully!')
         else:
-            messages.error(request, 'Failed to update product. Please check the form.')
+            messages.error(request, "Failed to update product. Please check the form.")
     return redirect("dashboard:products_list")
 
 
@@ -166,7 +170,9 @@ def product_delete(request, product_id):
 @never_cache
 @staff_member_required
 def product_detail(request, product_id):
-    product = get_object_or_404(Product.objects.select_related("category", "seller"), id=product_id)
+    product = get_object_or_404(
+        Product.objects.select_related("category", "seller"), id=product_id
+    )
     return render(
         request,
         "dashboard/product_detail.html",
@@ -177,11 +183,7 @@ def product_detail(request, product_id):
 @never_cache
 @staff_member_required
 def orders_list(request):
-    qs = (
-        Order.objects.select_related("buyer")
-        .prefetch_related("order_items__product")
-        .all()
-    )
+    qs = Order.objects.select_related("buyer").all()
 
     status = request.GET.get("status")
     if status in dict(Order.STATUS_CHOICES):
@@ -211,19 +213,11 @@ def order_update_status(request, order_id):
 @never_cache
 @staff_member_required
 def users_list(request):
-    qs = (
-        User.objects.all()
-        .annotate(total_orders=Count("orders", distinct=True))
-    )
+    qs = User.objects.all().annotate(total_orders=Count("orders", distinct=True))
 
-    # Total spent per user using OrderItem linkage
-    spent_map = (
-        OrderItem.objects.values("order__buyer")
-        .annotate(
-            total=Sum(ExpressionWrapper(F("quantity") * F("product__price"), output_field=DecimalField(max_digits=12, decimal_places=2)))
-        )
-    )
-    spent_dict = {row["order__buyer"]: float(row["total"]) for row in spent_map}
+    # Total spent per user from the persisted order totals
+    spent_map = Order.objects.values("buyer").annotate(total=Sum("total"))
+    spent_dict = {row["buyer"]: float(row["total"]) for row in spent_map}
 
     paginator = Paginator(qs, 20)
     page_obj = paginator.get_page(request.GET.get("page"))
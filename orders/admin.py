@@ -1,75 +1,130 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from orders.models import Order, OrderItem
+
+from orders.models import Order, OrderItem, StockReservation
 
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ['product', 'quantity', 'item_cost']
+    readonly_fields = ["product", "quantity", "item_cost"]
     can_delete = False
-    
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product")
+
     def item_cost(self, obj):
-        return format_html('<strong>${:.2f}</strong>', obj.cost)
-    item_cost.short_description = 'Cost'
+        if obj.line_total is None:
+            return self.get_empty_value_display()
+        return format_html("<strong>${}</strong>", f"{obj.line_total:.2f}")
+
+    item_cost.short_description = "Cost"
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'buyer', 'status_badge', 'total_cost_display', 'item_count', 'created_at']
-    list_filter = ['status', 'created_at', 'updated_at']
-    search_fields = ['id', 'buyer__email', 'buyer__first_name', 'buyer__last_name']
-    readonly_fields = ['created_at', 'updated_at', 'total_cost_display']
+    list_display = [
+        "id",
+        "buyer",
+        "status_badge",
+        "total_cost_display",
+        "item_count",
+        "created_at",
+    ]
+    list_filter = ["status", "created_at", "updated_at"]
+    search_fields = ["id", "buyer__email", "buyer__first_name", "buyer__last_name"]
+    readonly_fields = ["created_at", "updated_at", "total_cost_display"]
     list_per_page = 25
     inlines = [OrderItemInline]
-    
+
+    def get_queryset(self, request):
+        # Item counts come from one aggregate query, not per row
+        return super().get_queryset(request).with_totals().select_related("buyer")
+
     fieldsets = (
-        ('Order Information', {
-            'fields': ('buyer', 'status', 'shipping_address', 'billing_address')
-        }),
-        ('Order Summary', {
-            'fields': ('total_cost_display',)
-        }),
-        ('Timestamps', {
-            'fields': ('created_at', 'updated_at'),
-            'classes': ('collapse',)
-        }),
+        (
+            "Order Information",
+            {"fields": ("buyer", "status", "shipping_address", "billing_address")},
+        ),
+        ("Order Summary", {"fields": ("total_cost_display",)}),
+        (
+            "Timestamps",
+            {"fields": ("created_at", "updated_at"), "classes": ("collapse",)},
+        ),
     )
-    
+
     def status_badge(self, obj):
         status_colors = {
-            'P': '#ffc107',  # Pending
-            'C': '#28a745',   # Completed
+            "P": "#ffc107",  # Pending
+            "C": "#28a745",  # Completed
         }
-        color = status_colors.get(obj.status, '#6c757d')
+        color = status_colors.get(obj.status, "#6c757d")
         return format_html(
             '<span style="background: {}; color: white; padding: 3px 10px; border-radius: 3px; font-weight: bold;">{}</span>',
-            color, obj.get_status_display()
+            color,
+            obj.get_status_display(),
         )
-    status_badge.short_description = 'Status'
-    
+
+    status_badge.short_description = "Status"
+
     def item_count(self, obj):
-        count = obj.order_items.count()
-        return format_html('<strong>{}</strong> items', count)
-    item_count.short_description = 'Items'
-    
+        return format_html("<strong>{}</strong> items", obj.item_count)
+
+    item_count.short_description = "Items"
+    item_count.admin_order_field = "item_count"
+
     def total_cost_display(self, obj):
-        return format_html('<strong>${:.2f}</strong>', obj.total_cost)
-    total_cost_display.short_description = 'Total Cost'
+        return format_html("<strong>${}</strong>", f"{obj.total_cost:.2f}")
+
+    total_cost_display.short_description = "Total Cost"
+    total_cost_display.admin_order_field = "total"
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ['id', 'order', 'product', 'quantity', 'product_price', 'item_cost']
-    list_filter = ['order__status', 'order__created_at']
-    search_fields = ['order__id', 'product__name']
-    readonly_fields = ['item_cost']
+    list_display = ["id", "order", "product", "quantity", "product_price", "item_cost"]
+    list_filter = ["order__status", "order__created_at"]
+    search_fields = ["order__id", "product__name"]
+    readonly_fields = ["item_cost"]
     list_per_page = 25
-    
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("order__buyer", "product")
+
     def product_price(self, obj):
-        return format_html('<strong>${:.2f}</strong>', obj.product.price)
-    product_price.short_description = 'Unit Price'
-    
+        return format_html("<strong>${}</strong>", f"{obj.unit_price:.2f}")
+
+    product_price.short_description = "Unit Price"
+    product_price.admin_order_field = "unit_price"
+
     def item_cost(self, obj):
-        return format_html('<strong>${:.2f}</strong>', obj.cost)
-    item_cost.short_description = 'Total Cost'
+        if obj.line_total is None:
+            return self.get_empty_value_display()
+        return format_html("<strong>${}</strong>", f"{obj.line_total:.2f}")
+
+    item_cost.short_description = "Total Cost"
+    item_cost.admin_order_field = "line_total"
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ["id", "order", "product", "quantity", "status", "expires_at"]
+    list_filter = ["status", "expires_at"]
+    search_fields = ["order__id", "product__name"]
+    readonly_fields = [
+        "order",
+        "product",
+        "quantity",
+        "status",
+        "expires_at",
+        "created_at",
+        "updated_at",
+    ]
+    list_per_page = 25
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("order__buyer", "product")
+
+    def has_add_permission(self, request):
+        # Reservations move stock, they are only made by checkouts
+        return False
@@ -0,0 +1,8 @@
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import APIException
+
+
+class OutOfStockException(APIException):
+    status_code = 409
+    default_detail = _("Some of the ordered products are out of stock.")
+    default_code = "out-of-stock"
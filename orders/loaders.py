@@ -0,0 +1,25 @@
+from django.http import Http404
+
+from orders.models import Order
+
+
+def get_request_order(request, order_id):
+    """
+    The order `order_id` with its buyer and addresses, or a 404.
+
+    Fetched once per request and shared by the permission classes and the
+    view, which would otherwise each load the same order.
+    """
+    orders = getattr(request, "_orders", None)
+    if orders is None:
+        orders = request._orders = {}
+    key = str(order_id)
+    if key not in orders:
+        orders[key] = (
+            Order.objects.select_related("buyer", "shipping_address", "billing_address")
+            .filter(id=order_id)
+            .first()
+        )
+    if orders[key] is None:
+        raise Http404("No Order matches the given query.")
+    return orders[key]
@@ -0,0 +1,178 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from orders.exceptions import OutOfStockException
+from orders.models import Order, OrderItem, StockReservation
+from orders.stock import commit_order_stock, release_order_stock, reserve_order_stock
+from products.models import Product, ProductCategory
+
+User = get_user_model()
+
+STRESS_PREFIX = "stock-stress"
+STRESS_CATEGORY = "Stock Stress Test"
+
+
+class Command(BaseCommand):
+    help = (
+        "Run many concurrent checkouts against products with little stock and "
+        "check that stock reservations never oversell. Creates its own buyers, "
+        "products and orders and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checkouts", type=int, default=200)
+        parser.add_argument(
+            "--stock", type=int, default=50, help="Stock of each product"
+        )
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=3,
+            help="Products in every order, added in a random order",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=50,
+            help="Concurrent checkouts, each uses a database connection",
+        )
+        parser.add_argument("--keep", action="store_true", help="Keep the created rows")
+
+    def handle(self, *args, **options):
+        self.cleanup()
+        products, order_ids = self.seed(options)
+        try:
+            self.stress(products, order_ids, options)
+        finally:
+            if not options["keep"]:
+                self.cleanup()
+
+    def seed(self, options):
+        seller = User.objects.create_user(
+            f"{STRESS_PREFIX}-seller", f"{STRESS_PREFIX}-seller@example.com", None
+        )
+        category = ProductCategory.objects.create(name=STRESS_CATEGORY)
+        products = [
+            Product.objects.create(
+                seller=seller,
+                category=category,
+                name=f"Stress product {index}",
+                price=10,
+                quantity=options["stock"],
+            )
+            for index in range(options["products"])
+        ]
+
+        buyers = User.objects.bulk_create(
+            User(
+                username=f"{STRESS_PREFIX}-buyer-{index}",
+                email=f"{STRESS_PREFIX}-buyer-{index}@example.com",
+            )
+            for index in range(options["checkouts"])
+        )
+        orders = Order.objects.bulk_create(Order(buyer=buyer) for buyer in buyers)
+
+        items = []
+        for order in orders:
+            for product in random.sample(products, len(products)):
+                item = OrderItem(order=order, product=product, quantity=1)
+                item.snapshot_price()
+                items.append(item)
+        OrderItem.objects.bulk_create(items)
+        Order.objects.filter(pk__in=[order.pk for order in orders]).update(
+            total=10 * len(products)
+        )
+        return products, [order.pk for order in orders]
+
+    def stress(self, products, order_ids, options):
+        start_gate = threading.Event()
+
+        def checkout(order_id):
+            start_gate.wait()
+            try:
+                reserve_order_stock(order_id)
+                return "reserved"
+            except OutOfStockException:
+                return "out of stock"
+            except Exception as exc:
+                return f"error: {exc}"
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = [executor.submit(checkout, order_id) for order_id in order_ids]
+            start_gate.set()
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+
+        outcomes = Counter(results)
+        self.stdout.write(
+            f"{len(order_ids)} checkouts on {options['workers']} workers in {elapsed:.2f}s: "
+            + ", ".join(f"{count} {outcome}" for outcome, count in outcomes.items())
+        )
+
+        reserved = outcomes["reserved"]
+        expected = min(options["stock"], options["checkouts"])
+        failures = [outcome for outcome in outcomes if outcome.startswith("error")]
+        if reserved != expected:
+            failures.append(f"{reserved} checkouts reserved stock, expected {expected}")
+        for product in Product.objects.filter(
+            pk__in=[product.pk for product in products]
+        ):
+            held = (
+                StockReservation.objects.filter(
+                    product=product, status=StockReservation.HELD
+                ).aggregate(total=Sum("quantity"))["total"]
+                or 0
+            )
+            if product.quantity < 0 or product.quantity + held != options["stock"]:
+                failures.append(
+                    f"{product.name}: {product.quantity} in stock with {held} held "
+                    f"out of {options['stock']}"
+                )
+
+        # Pay for half of the reservations and abandon the others
+        held_orders = sorted(
+            set(
+                StockReservation.objects.filter(
+                    order_id__in=order_ids, status=StockReservation.HELD
+                ).values_list("order_id", flat=True)
+            )
+        )
+        half = len(held_orders) // 2
+        paid = held_orders[:half]
+        for order_id in paid:
+            commit_order_stock(order_id)
+        for order_id in held_orders[half:]:
+            release_order_stock(order_id)
+        for product in Product.objects.filter(
+            pk__in=[product.pk for product in products]
+        ):
+            if product.quantity != options["stock"] - len(paid):
+                failures.append(
+                    f"{product.name}: {product.quantity} in stock after {len(paid)} "
+                    f"payments out of {options['stock']}"
+                )
+
+        if failures:
+            raise CommandError("Stock reservations failed:\n" + "\n".join(failures))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"No oversell: {reserved} reservations, {len(paid)} committed, "
+                f"{len(held_orders) - len(paid)} released."
+            )
+        )
+
+    def cleanup(self):
+        # Deleting the orders releases what they still hold
+        User.objects.filter(username__startswith=f"{STRESS_PREFIX}-").delete()
+        ProductCategory.objects.filter(name=STRESS_CATEGORY).delete()
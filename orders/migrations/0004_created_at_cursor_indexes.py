@@ -0,0 +1,21 @@
+# Generated by Django 4.0.4 on 2026-10-17 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_alter_order_billing_address_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['buyer', '-created_at', 'id'], name='order_buyer_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', '-created_at', 'id'], name='orderitem_order_created_idx'),
+        ),
+    ]
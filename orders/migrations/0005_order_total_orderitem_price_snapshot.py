@@ -0,0 +1,95 @@
+# Generated by Django 4.0.4 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+BATCH_SIZE = 10000
+
+
+def batches(queryset):
+    """
+    Yield querysets over consecutive primary key ranges of `queryset`
+    """
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        yield queryset.filter(id__gte=ids[0], id__lte=ids[-1])
+        last_id = ids[-1]
+
+
+def backfill_totals(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+
+    # The price at the time historical items were added is lost, the
+    # current product price is the best snapshot left
+    price = models.Subquery(
+        Product.objects.filter(pk=models.OuterRef('product_id')).values('price')[:1]
+    )
+    for batch in batches(OrderItem.objects.all()):
+        batch.update(
+            unit_price=price,
+            line_total=models.ExpressionWrapper(
+                models.F('quantity') * price,
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+    line_totals = (
+        OrderItem.objects.filter(order=models.OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total=models.Sum('line_total'))
+        .values('total')
+    )
+    for batch in batches(Order.objects.all()):
+        batch.update(
+            total=models.functions.Coalesce(
+                models.Subquery(line_totals),
+                models.Value(0),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            )
+        )
+
+
+class Migration(migrations.Migration):
+    # Each backfill batch commits on its own, so the rows of a batch are
+    # only locked while it is updated
+    atomic = False
+
+    dependencies = [
+        ('orders', '0004_created_at_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=12, null=True),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=12),
+        ),
+    ]
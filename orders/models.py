@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
-from django.db import models
-from django.utils.functional import cached_property
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from products.models import Product
@@ -9,6 +11,39 @@ from users.models import Address
 User = get_user_model()
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate `item_count`, the total itself is persisted on the order
+        """
+        return self.annotate(item_count=Count("order_items"))
+
+    def with_items(self):
+        return self.prefetch_related("order_items")
+
+    def update_totals(self):
+        """
+        Recompute the persisted `total` of the orders from their item line totals.
+
+        Must run in a transaction, after the item changes. The orders are
+        locked first, so concurrent changes to items of the same order add up
+        instead of overwriting each other's total.
+        """
+        order_ids = list(self.select_for_update().values_list("pk", flat=True))
+        line_totals = (
+            OrderItem.objects.filter(order=OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(total=Sum("line_total"))
+            .values("total")
+        )
+        return Order.objects.filter(pk__in=order_ids).update(
+            total=Coalesce(
+                Subquery(line_totals), Value(0), output_field=Order.total.field
+            )
+        )
+
+
 class Order(models.Model):
     PENDING = "P"
     COMPLETED = "C"
@@ -31,22 +66,85 @@ class Order(models.Model):
         blank=True,
         null=True,
     )
+    total = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(
+                fields=["buyer", "-created_at", "id"], name="order_buyer_created_at_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.buyer.get_full_name()
 
-    @cached_property
+    def save(self, *args, **kwargs):
+        # `total` is only written by `update_totals`, a stale copy of it must
+        # not overwrite the stored one
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "total"
+            ]
+        super().save(*args, **kwargs)
+
+    @property
     def total_cost(self):
+        return self.total
+
+    def set_items(self, quantities):
         """
-        Total cost of all the items in an order
+        Replace the items of the order with `{product: quantity}` in a constant
+        number of queries. Items of products that stay in the order keep
+        their price snapshot. Returns the items, in the order given.
         """
-        return round(sum([order_item.cost for order_item in self.order_items.all()]), 2)
+        with transaction.atomic():
+            # Serializes concurrent changes to the items of this order
+            list(
+                Order.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values_list("pk", flat=True)
+            )
+            existing = {
+                item.product_id: item for item in OrderItem.objects.filter(order=self)
+            }
+
+            now = timezone.now()
+            items, created, updated = [], [], []
+            for product, quantity in quantities.items():
+                item = existing.pop(product.pk, None)
+                if item is None:
+                    item = OrderItem(order=self, product=product, quantity=quantity)
+                    created.append(item)
+                elif item.quantity != quantity:
+                    item.quantity = quantity
+                    item.updated_at = now
+                    updated.append(item)
+                item.snapshot_price()
+                items.append(item)
+
+            if existing:
+                # Nothing references items, and the total is updated below, so
+                # the per-row delete signals would only add queries per item
+                OrderItem.objects.filter(
+                    pk__in=[item.pk for item in existing.values()]
+                )._raw_delete(self._state.db)
+            OrderItem.objects.bulk_create(created)
+            OrderItem.objects.bulk_update(
+                updated, ["quantity", "line_total", "updated_at"]
+            )
+            Order.objects.filter(pk=self.pk).update_totals()
+            self.refresh_from_db(fields=["total"])
+        return items
 
 
 class OrderItem(models.Model):
@@ -57,19 +155,90 @@ class OrderItem(models.Model):
         Product, related_name="product_orders", on_delete=models.CASCADE
     )
     quantity = models.IntegerField()
+    # Snapshot of the product price when the item was added, later price
+    # changes don't alter the order
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(
+                fields=["order", "-created_at", "id"],
+                name="orderitem_order_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.order.buyer.get_full_name()
 
-    @cached_property
-    def cost(self):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The product the stored unit price was taken from
+        instance._priced_product_id = instance.__dict__.get("product_id")
+        return instance
+
+    def snapshot_price(self):
         """
-        Total cost of the ordered item
+        Take the unit price from the product when the item is new or its
+        product was changed, and compute the line total
         """
-        return round(self.quantity * self.product.price, 2)
+        priced_product_id = getattr(self, "_priced_product_id", self.product_id)
+        if self.unit_price is None or self.product_id != priced_product_id:
+            self.unit_price = self.product.price
+            self._priced_product_id = self.product_id
+        self.line_total = self.quantity * self.unit_price
+
+    def save(self, *args, **kwargs):
+        self.snapshot_price()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Order.objects.filter(pk=self.order_id).update_totals()
+
+
+class StockReservation(models.Model):
+    """
+    Stock of a product taken out of `Product.quantity` for an order during
+    checkout. Held until it expires, committed once the order is paid.
+    """
+
+    HELD = "H"
+    COMMITTED = "C"
+    RELEASED = "R"
+
+    STATUS_CHOICES = (
+        (HELD, _("held")),
+        (COMMITTED, _("committed")),
+        (RELEASED, _("released")),
+    )
+
+    order = models.ForeignKey(
+        Order, related_name="stock_reservations", on_delete=models.CASCADE
+    )
+    product = models.ForeignKey(
+        Product, related_name="stock_reservations", on_delete=models.CASCADE
+    )
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=HELD)
+    expires_at = models.DateTimeField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+        indexes = [
+            # The sweeper's scan for expired reservations
+            models.Index(
+                fields=["expires_at"],
+                name="stockreservation_held_idx",
+                condition=models.Q(status="H"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for order {self.order_id}"
@@ -1,8 +1,7 @@
-from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
 from rest_framework.permissions import BasePermission
 
-from orders.models import Order
+from orders.loaders import get_request_order
 
 
 class IsOrderPending(BasePermission):
@@ -24,12 +23,12 @@ class IsOrderItemByBuyerOrAdmin(BasePermission):
     """
 
     def has_permission(self, request, view):
-        order_id = view.kwargs.get("order_id")
-        order = get_object_or_404(Order, id=order_id)
-        return order.buyer == request.user or request.user.is_staff
+        order = get_request_order(request, view.kwargs.get("order_id"))
+        return order.buyer_id == request.user.id or request.user.is_staff
 
     def has_object_permission(self, request, view, obj):
-        return obj.order.buyer == request.user or request.user.is_staff
+        order = get_request_order(request, obj.order_id)
+        return order.buyer_id == request.user.id or request.user.is_staff
 
 
 class IsOrderByBuyerOrAdmin(BasePermission):
@@ -54,8 +53,7 @@ class IsOrderItemPending(BasePermission):
     )
 
     def has_permission(self, request, view):
-        order_id = view.kwargs.get("order_id")
-        order = get_object_or_404(Order, id=order_id)
+        order = get_request_order(request, view.kwargs.get("order_id"))
 
         if view.action in ("list",):
             return True
@@ -65,4 +63,4 @@ class IsOrderItemPending(BasePermission):
     def has_object_permission(self, request, view, obj):
         if view.action in ("retrieve",):
             return True
-        return obj.order.status == "P"
+        return get_request_order(request, obj.order_id).status == "P"
@@ -1,8 +1,11 @@
+from django.conf import settings
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
 
 from orders.models import Order, OrderItem
+from products.models import Product
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -10,8 +13,12 @@ class OrderItemSerializer(serializers.ModelSerializer):
     Serializer class for serializing order items
     """
 
-    price = serializers.SerializerMethodField()
-    cost = serializers.SerializerMethodField()
+    price = serializers.DecimalField(
+        source="unit_price", max_digits=10, decimal_places=2, read_only=True
+    )
+    cost = serializers.DecimalField(
+        source="line_total", max_digits=12, decimal_places=2, read_only=True
+    )
 
     class Meta:
         model = OrderItem
@@ -33,13 +40,17 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
         order_id = self.context["view"].kwargs.get("order_id")
         product = validated_data["product"]
-        current_item = OrderItem.objects.filter(order__id=order_id, product=product)
 
         if order_quantity > product_quantity:
             error = {"quantity": _("Ordered quantity is more than the stock.")}
             raise serializers.ValidationError(error)
 
-        if not self.instance and current_item.count() > 0:
+        # Items nested in an order being written are checked by the order
+        if (
+            not self.instance
+            and order_id
+            and OrderItem.objects.filter(order__id=order_id, product=product).exists()
+        ):
             error = {"product": _("Product already exists in your order.")}
             raise serializers.ValidationError(error)
 
@@ -49,12 +60,6 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
         return validated_data
 
-    def get_price(self, obj):
-        return obj.product.price
-
-    def get_cost(self, obj):
-        return obj.cost
-
 
 class OrderReadSerializer(serializers.ModelSerializer):
     """
@@ -107,24 +112,78 @@ class OrderWriteSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ("status",)
 
+    def validate_order_items(self, order_items):
+        products = [order_item["product"] for order_item in order_items]
+        if len(set(products)) != len(products):
+            raise serializers.ValidationError(
+                _("Product already exists in your order.")
+            )
+        return order_items
+
+    @transaction.atomic
     def create(self, validated_data):
         orders_data = validated_data.pop("order_items")
         order = Order.objects.create(**validated_data)
-
-        for order_data in orders_data:
-            OrderItem.objects.create(order=order, **order_data)
+        order.set_items({data["product"]: data["quantity"] for data in orders_data})
 
         return order
 
     def update(self, instance, validated_data):
         orders_data = validated_data.pop("order_items", None)
-        orders = list((instance.order_items).all())
 
         if orders_data:
-            for order_data in orders_data:
-                order = orders.pop(0)
-                order.product = order_data.get("product", order.product)
-                order.quantity = order_data.get("quantity", order.quantity)
-                order.save()
+            instance.set_items(
+                {data["product"]: data["quantity"] for data in orders_data}
+            )
 
         return instance
+
+
+class CartItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class OrderItemSyncSerializer(serializers.Serializer):
+    """
+    Serializer class for replacing all the items of an order at once
+
+    The products are loaded in one query and the items validated in memory
+    """
+
+    order_items = serializers.ListField(
+        child=CartItemSerializer(), max_length=settings.ORDER_MAX_ITEMS
+    )
+
+    def validate_order_items(self, order_items):
+        user = self.context["request"].user
+        products = Product.objects.only("id", "price", "quantity", "seller_id").in_bulk(
+            [order_item["product"] for order_item in order_items]
+        )
+
+        quantities = {}
+        errors = {}
+        seen = set()
+        for index, order_item in enumerate(order_items):
+            product = products.get(order_item["product"])
+            if product is None:
+                errors[index] = {"product": [_("Product does not exist.")]}
+            elif product.pk in seen:
+                errors[index] = {
+                    "product": [_("Product already exists in your order.")]
+                }
+            elif order_item["quantity"] > product.quantity:
+                errors[index] = {
+                    "quantity": [_("Ordered quantity is more than the stock.")]
+                }
+            elif product.seller_id == user.id:
+                raise PermissionDenied(
+                    _("Adding your own product to your order is not allowed")
+                )
+            else:
+                quantities[product] = order_item["quantity"]
+            seen.add(order_item["product"])
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return quantities
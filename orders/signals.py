@@ -0,0 +1,41 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from orders.models import Order, OrderItem
+from orders.stock import release_order_stock
+
+# Orders whose items were deleted in the current transaction
+_deleted_items = threading.local()
+
+
+@receiver(pre_delete, sender=Order)
+def release_deleted_order_stock(sender, instance, **kwargs):
+    # The reservations are deleted along with the order, the stock they hold
+    # would be lost
+    release_order_stock(instance.pk)
+
+
+def update_deleted_item_order_totals():
+    order_ids = getattr(_deleted_items, "order_ids", None)
+    _deleted_items.order_ids = set()
+    if order_ids:
+        with transaction.atomic():
+            Order.objects.filter(pk__in=order_ids).update_totals()
+
+
+@receiver(post_delete, sender=OrderItem)
+def collect_deleted_item_order(sender, instance, **kwargs):
+    """
+    Items are also deleted in bulk and through cascades, e.g. of their
+    product, which skip `OrderItem.delete`. The totals of their orders are
+    updated once, after the deleting transaction commits.
+    """
+    if not hasattr(_deleted_items, "order_ids"):
+        _deleted_items.order_ids = set()
+    _deleted_items.order_ids.add(instance.order_id)
+    # The first callback updates every order, the others find nothing left.
+    # Ids left over by a rolled back transaction are only recomputed.
+    transaction.on_commit(update_deleted_item_order_totals)
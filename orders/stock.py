@@ -0,0 +1,228 @@
+"""
+Reservation of product stock for orders being checked out.
+
+Creating a checkout session takes the ordered quantities out of
+`Product.quantity` with conditional updates (`quantity >= n`), so concurrent
+buyers can never both get the last unit. The `StockReservation`s hold that
+stock for `STOCK_RESERVATION_TTL` seconds. A completed payment commits them,
+an expired or abandoned checkout gives the stock back, either through the
+`checkout.session.expired` Stripe webhook or the
+`release_expired_stock_reservations` sweeper.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from orders.exceptions import OutOfStockException
+from orders.models import Order, OrderItem, StockReservation
+from products.cache import bump_catalog_version
+from products.models import Product, ProductCard
+
+logger = logging.getLogger(__name__)
+
+
+def adjust_stock(changes):
+    """
+    Take `{product_id: quantity}` out of stock, negative quantities give
+    stock back. All or nothing, so it must run in a transaction.
+
+    Products are updated in id order, so concurrent adjustments lock their
+    rows in the same order and cannot deadlock. Raises `OutOfStockException`
+    when a product has less stock left than is taken.
+    """
+    changes = {
+        product_id: quantity for product_id, quantity in changes.items() if quantity
+    }
+    if not changes:
+        return
+
+    # `updated_at` moves the ETag and Last-Modified date of the products
+    now = timezone.now()
+    for product_id in sorted(changes):
+        quantity = changes[product_id]
+        products = Product.objects.filter(pk=product_id)
+        if quantity > 0:
+            products = products.filter(quantity__gte=quantity)
+        updated = products.update(quantity=F("quantity") - quantity, updated_at=now)
+        if not updated and quantity > 0:
+            raise OutOfStockException(
+                _("Product %(product)s does not have enough stock left.")
+                % {"product": product_id}
+            )
+
+    # Product cards only show whether a product is in stock
+    flipped = [
+        product_id
+        for product_id, stock in Product.objects.filter(pk__in=changes).values_list(
+            "pk", "quantity"
+        )
+        if (stock > 0) != (stock + changes[product_id] > 0)
+    ]
+
+    def refresh():
+        if flipped:
+            ProductCard.objects.refresh(flipped)
+        # Cached product responses show the quantity
+        bump_catalog_version()
+
+    transaction.on_commit(refresh)
+
+
+def order_quantities(order_id):
+    quantities = defaultdict(int)
+    items = OrderItem.objects.filter(order_id=order_id, quantity__gt=0)
+    for product_id, quantity in items.values_list("product_id", "quantity"):
+        quantities[product_id] += quantity
+    return quantities
+
+
+def lock_order(order_id):
+    """
+    Lock the order row, serializing the reservation changes of an order
+    """
+    return list(
+        Order.objects.select_for_update()
+        .filter(pk=order_id)
+        .values_list("pk", flat=True)
+    )
+
+
+def held_reservations(order_id):
+    return StockReservation.objects.select_for_update().filter(
+        order_id=order_id, status=StockReservation.HELD
+    )
+
+
+@transaction.atomic
+def reserve_order_stock(order_id):
+    """
+    Hold the stock of the items of an order, replacing the reservations it
+    holds already. Returns the time the new reservations expire at.
+
+    Raises `OutOfStockException`, leaving stock and reservations unchanged,
+    when a product doesn't have enough stock.
+    """
+    lock_order(order_id)
+    held = list(held_reservations(order_id))
+    quantities = order_quantities(order_id)
+
+    # One pass over the products, returning the old holds and taking the new
+    changes = defaultdict(int, quantities)
+    for reservation in held:
+        changes[reservation.product_id] -= reservation.quantity
+    adjust_stock(changes)
+
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    StockReservation.objects.filter(
+        pk__in=[reservation.pk for reservation in held]
+    ).update(status=StockReservation.RELEASED, updated_at=now)
+    StockReservation.objects.bulk_create(
+        StockReservation(
+            order_id=order_id,
+            product_id=product_id,
+            quantity=quantity,
+            expires_at=expires_at,
+        )
+        for product_id, quantity in quantities.items()
+    )
+    return expires_at
+
+
+def release(reservations):
+    """
+    Give the stock of held reservations locked by the caller back
+    """
+    reservations = list(reservations)
+    changes = defaultdict(int)
+    for reservation in reservations:
+        changes[reservation.product_id] -= reservation.quantity
+    adjust_stock(changes)
+    StockReservation.objects.filter(
+        pk__in=[reservation.pk for reservation in reservations]
+    ).update(status=StockReservation.RELEASED, updated_at=timezone.now())
+    return len(reservations)
+
+
+@transaction.atomic
+def release_order_stock(order_id, expired_at=None):
+    """
+    Give the stock held for an order back, e.g. when its checkout expired.
+
+    With `expired_at`, only the reservations expiring by then are released,
+    those of a later checkout of the same order stay held.
+    """
+    reservations = held_reservations(order_id)
+    if expired_at is not None:
+        reservations = reservations.filter(expires_at__lte=expired_at)
+    return release(reservations)
+
+
+@transaction.atomic
+def commit_order_stock(order_id):
+    """
+    Make the stock taken for a paid order permanent.
+
+    A payment can complete after its reservations were released, then the
+    stock is taken again. Returns False when there isn't enough left: the
+    order is paid but oversold and needs attention.
+    """
+    lock_order(order_id)
+    now = timezone.now()
+    if held_reservations(order_id).update(
+        status=StockReservation.COMMITTED, updated_at=now
+    ):
+        return True
+    # A retried webhook
+    if StockReservation.objects.filter(
+        order_id=order_id, status=StockReservation.COMMITTED
+    ).exists():
+        return True
+
+    quantities = order_quantities(order_id)
+    try:
+        with transaction.atomic():
+            adjust_stock(quantities)
+    except OutOfStockException:
+        logger.error("Order %s was paid but is out of stock", order_id)
+        return False
+    StockReservation.objects.bulk_create(
+        StockReservation(
+            order_id=order_id,
+            product_id=product_id,
+            quantity=quantity,
+            status=StockReservation.COMMITTED,
+            expires_at=now,
+        )
+        for product_id, quantity in quantities.items()
+    )
+    return True
+
+
+def release_expired_reservations(batch_size=None):
+    """
+    Give the stock of expired held reservations back, a batch per
+    transaction. Reservations locked by a concurrent commit are skipped.
+    """
+    batch_size = batch_size or settings.STOCK_RESERVATION_SWEEP_BATCH_SIZE
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(status=StockReservation.HELD, expires_at__lte=timezone.now())
+                .order_by("expires_at")[:batch_size]
+            )
+            if not expired:
+                break
+            released += release(expired)
+    if released:
+        logger.info("Released %d expired stock reservations", released)
+    return released
@@ -0,0 +1,11 @@
+from celery import shared_task
+
+from orders.stock import release_expired_reservations
+
+
+@shared_task()
+def release_expired_stock_reservations(batch_size=None):
+    """
+    Give the stock of checkouts that were never paid back
+    """
+    return release_expired_reservations(batch_size=batch_size)
@@ -0,0 +1,656 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders.exceptions import OutOfStockException
+from orders.models import Order, OrderItem, StockReservation
+from orders.stock import (
+    commit_order_stock,
+    release_expired_reservations,
+    reserve_order_stock,
+)
+from payment.models import Payment
+from payment.views import STRIPE_SESSION_MIN_TTL
+from products.models import Product, ProductCategory, ProductImage
+from users.models import Address
+
+User = get_user_model()
+
+
+class OrderTotalTests(TestCase):
+    """
+    The persisted order total follows its items, however they are deleted
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(
+            "seller", "seller@example.com", "password"
+        )
+        cls.buyer = User.objects.create_user("buyer", "buyer@example.com", "password")
+        category = ProductCategory.objects.create(name="Category")
+        cls.product = Product.objects.create(
+            seller=cls.seller,
+            category=category,
+            name="Product",
+            desc="Description",
+            price=10,
+            quantity=5,
+        )
+        cls.other_product = Product.objects.create(
+            seller=cls.seller,
+            category=category,
+            name="Other",
+            desc="Description",
+            price=3,
+            quantity=5,
+        )
+
+    def setUp(self):
+        self.order = Order.objects.create(buyer=self.buyer)
+        self.item = OrderItem.objects.create(
+            order=self.order, product=self.product, quantity=2
+        )
+        self.other_item = OrderItem.objects.create(
+            order=self.order, product=self.other_product, quantity=1
+        )
+
+    def assert_total(self, total):
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total, Decimal(total))
+
+    def delete(self, target):
+        with self.captureOnCommitCallbacks(execute=True):
+            target.delete()
+
+    def test_item_delete(self):
+        self.assert_total("23")
+        self.delete(self.item)
+        self.assert_total("3")
+
+    def test_queryset_delete(self):
+        self.delete(OrderItem.objects.filter(pk__in=[self.item.pk, self.other_item.pk]))
+        self.assert_total("0")
+
+    def test_product_delete(self):
+        self.delete(self.product)
+        self.assert_total("3")
+
+    def count_product_delete_queries(self, order_count):
+        product = Product.objects.create(
+            seller=self.seller,
+            category=self.product.category,
+            name="Deleted",
+            desc="Description",
+            price=1,
+        )
+        orders = Order.objects.bulk_create(
+            Order(buyer=self.buyer) for _ in range(order_count)
+        )
+        for order in orders:
+            OrderItem.objects.create(order=order, product=product, quantity=1)
+        with CaptureQueriesContext(connection) as queries:
+            self.delete(product)
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.total, 0)
+        return len(queries)
+
+    def test_product_delete_updates_totals_once(self):
+        # Every order gets its total from the same queries
+        self.assertEqual(
+            self.count_product_delete_queries(1), self.count_product_delete_queries(10)
+        )
+
+
+def create_orders(buyer, products, count):
+    """
+    Orders of `buyer` with one item of each product, created in bulk
+    """
+    orders = Order.objects.bulk_create(Order(buyer=buyer) for _ in range(count))
+    OrderItem.objects.bulk_create(
+        OrderItem(
+            order=order,
+            product=product,
+            quantity=1,
+            unit_price=product.price,
+            line_total=product.price,
+        )
+        for order in orders
+        for product in products
+    )
+    Order.objects.filter(pk__in=[order.pk for order in orders]).update_totals()
+    return orders
+
+
+class OrderListQueryCountTests(TestCase):
+    """
+    Order lists, in the API and the admin, load in a fixed number of queries,
+    however many orders and items they show
+    """
+
+    # The page of orders and their items
+    API_LIST_QUERIES = 2
+    # The session, the user, the count of all and of the filtered rows, the
+    # page and the permissions of the sidebar and the navigation
+    ADMIN_CHANGELIST_QUERIES = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        cls.buyer = User.objects.create_user("buyer", "buyer@example.com", "password")
+        cls.admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        category = ProductCategory.objects.create(name="Category")
+        cls.products = Product.objects.bulk_create(
+            Product(
+                seller=seller,
+                category=category,
+                name=f"Product {index}",
+                desc="Description",
+                price=10,
+            )
+            for index in range(3)
+        )
+
+    def assert_api_list_queries(self, count):
+        create_orders(self.buyer, self.products, count)
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        with self.assertNumQueries(self.API_LIST_QUERIES):
+            response = client.get("/api/user/orders/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), count)
+
+    def assert_changelist_queries(self, url, count):
+        create_orders(self.buyer, self.products, count)
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(self.ADMIN_CHANGELIST_QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_api_list_1_order(self):
+        self.assert_api_list_queries(1)
+
+    def test_api_list_20_orders(self):
+        self.assert_api_list_queries(20)
+
+    def test_admin_order_changelist_1_order(self):
+        self.assert_changelist_queries("/admin/orders/order/", 1)
+
+    def test_admin_order_changelist_25_orders(self):
+        self.assert_changelist_queries("/admin/orders/order/", 25)
+
+    def test_admin_order_item_changelist_1_order(self):
+        self.assert_changelist_queries("/admin/orders/orderitem/", 1)
+
+    def test_admin_order_item_changelist_25_orders(self):
+        self.assert_changelist_queries("/admin/orders/orderitem/", 25)
+
+
+class OrderItemQueryCountTests(TestCase):
+    """
+    The order is loaded once per request, shared by the permissions and the
+    views of its items and checkout
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        cls.buyer = User.objects.create_user("buyer", "buyer@example.com", "password")
+        category = ProductCategory.objects.create(name="Category")
+        cls.products = Product.objects.bulk_create(
+            Product(
+                seller=seller,
+                category=category,
+                name=f"Product {index}",
+                desc="Description",
+                price=10,
+                quantity=10,
+            )
+            for index in range(5)
+        )
+        address = Address.objects.create(
+            user=cls.buyer,
+            address_type="S",
+            country="US",
+            city="City",
+            street_address="Street",
+            apartment_address="1",
+        )
+        cls.order = Order.objects.create(
+            buyer=cls.buyer, shipping_address=address, billing_address=address
+        )
+        cls.items = cls.order.set_items({product: 1 for product in cls.products[:3]})
+        ProductImage.objects.create(
+            product=cls.products[0], url="https://ik.imagekit.io/demo/0.jpg"
+        )
+        Payment.objects.create(order=cls.order, payment_option=Payment.STRIPE)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.items_url = f"/api/user/orders/{self.order.pk}/order-items/"
+        self.item_url = f"{self.items_url}{self.items[0].pk}/"
+
+    def test_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.items_url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.item_url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_create(self):
+        data = {"product": self.products[3].pk, "quantity": 1}
+        # The order, the product, the duplicate check and the seller, then in a
+        # savepoint the item, the lock of the order and its total
+        with self.assertNumQueries(9):
+            response = self.client.post(self.items_url, data, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_update(self):
+        data = {"product": self.products[0].pk, "quantity": 2}
+        # The order, the item, the product and the seller, then in a savepoint
+        # the item, the lock of the order and its total
+        with self.assertNumQueries(9):
+            response = self.client.patch(self.item_url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_sync(self):
+        data = {
+            "order_items": [
+                {"product": self.products[0].pk, "quantity": 2},
+                {"product": self.products[1].pk, "quantity": 1},
+                {"product": self.products[2].pk, "quantity": 1},
+                {"product": self.products[3].pk, "quantity": 1},
+            ]
+        }
+        # The order and the products, then in a savepoint the lock, the items,
+        # their insert and update, the total and its reload
+        with self.assertNumQueries(11):
+            response = self.client.put(f"{self.items_url}sync/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def count_sync_removing_queries(self, removed):
+        order = Order.objects.create(buyer=self.buyer)
+        extra = Product.objects.bulk_create(
+            Product(
+                seller=self.products[0].seller,
+                category=self.products[0].category,
+                name=f"Removed {index}",
+                desc="Description",
+                price=10,
+                quantity=10,
+            )
+            for index in range(removed)
+        )
+        order.set_items({product: 1 for product in [self.products[0], *extra]})
+        data = {"order_items": [{"product": self.products[0].pk, "quantity": 2}]}
+        with (
+            CaptureQueriesContext(connection) as queries,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            response = self.client.put(
+                f"/api/user/orders/{order.pk}/order-items/sync/", data, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(order.order_items.count(), 1)
+        return len(queries)
+
+    def test_sync_removing_items(self):
+        self.assertEqual(
+            self.count_sync_removing_queries(2), self.count_sync_removing_queries(40)
+        )
+
+    def test_checkout(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/user/payments/checkout/{self.order.pk}/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_stripe_checkout_session(self):
+        url = f"/api/user/payments/stripe/create-checkout-session/{self.order.pk}/"
+        with mock.patch(
+            "stripe.checkout.Session.create", return_value={"id": "cs_test"}
+        ) as create:
+            # The order, its items and their images, then in a savepoint the
+            # lock, the held stock, the items, an update of each of the 3
+            # products, their quantities and the reservations
+            with self.assertNumQueries(13):
+                response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        line_items = create.call_args.kwargs["line_items"]
+        images = {
+            item["price_data"]["product_data"]["name"]: item["price_data"][
+                "product_data"
+            ]["images"]
+            for item in line_items
+        }
+        self.assertEqual(
+            images,
+            {
+                "Product 0": ["https://ik.imagekit.io/demo/0.jpg"],
+                "Product 1": [],
+                "Product 2": [],
+            },
+        )
+
+
+class StockChangeCacheTests(TestCase):
+    """
+    Taking stock for an order changes what the catalog shows of its products
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        buyer = User.objects.create_user("buyer", "buyer@example.com", "password")
+        category = ProductCategory.objects.create(name="Category")
+        cls.product = Product.objects.create(
+            seller=seller,
+            category=category,
+            name="Product",
+            desc="Description",
+            price=10,
+            quantity=10,
+        )
+        cls.order = Order.objects.create(buyer=buyer)
+        cls.order.set_items({cls.product: 3})
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product_url = f"/api/products/{self.product.pk}/"
+
+    def test_reservation_refreshes_detail_and_list(self):
+        etag = self.client.get(self.product_url)["ETag"]
+        self.client.get("/api/products/")
+        self.assertEqual(self.client.get("/api/products/")["X-Cache"], "HIT")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_order_stock(self.order.pk)
+
+        response = self.client.get(self.product_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["quantity"], 7)
+        response = self.client.get("/api/products/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["quantity"], 7)
+
+
+class StockReservationTests(TestCase):
+    """
+    Stock is held while an order is checked out, given back when the
+    checkout fails or expires and kept once the order is paid
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        cls.buyer = User.objects.create_user("buyer", "buyer@example.com", "password")
+        category = ProductCategory.objects.create(name="Category")
+        cls.product = Product.objects.create(
+            seller=seller,
+            category=category,
+            name="Product",
+            desc="Description",
+            price=10,
+            quantity=5,
+        )
+        address = Address.objects.create(
+            user=cls.buyer,
+            address_type="S",
+            country="US",
+            city="City",
+            street_address="Street",
+            apartment_address="1",
+        )
+        cls.order = Order.objects.create(
+            buyer=cls.buyer, shipping_address=address, billing_address=address
+        )
+        cls.order.set_items({cls.product: 2})
+        cls.payment = Payment.objects.create(
+            order=cls.order, payment_option=Payment.STRIPE
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.session_url = (
+            f"/api/user/payments/stripe/create-checkout-session/{self.order.pk}/"
+        )
+
+    def create_session(self):
+        with mock.patch(
+            "stripe.checkout.Session.create", return_value={"id": "cs_test"}
+        ) as create:
+            response = self.client.post(self.session_url)
+        self.assertEqual(response.status_code, 201)
+        return create.call_args.kwargs
+
+    def send_webhook(self, event_type, session):
+        event = {"type": event_type, "data": {"object": session}}
+        with mock.patch("stripe.Webhook.construct_event", return_value=event):
+            response = self.client.post(
+                "/api/user/payments/stripe/webhook/",
+                {},
+                format="json",
+                HTTP_STRIPE_SIGNATURE="signature",
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def expire_session(self, session):
+        self.send_webhook(
+            "checkout.session.expired",
+            {"id": "cs_test", "metadata": session["metadata"]},
+        )
+
+    def complete_session(self, session):
+        self.send_webhook(
+            "checkout.session.completed",
+            {
+                "id": "cs_test",
+                "metadata": session["metadata"],
+                "customer_details": {"email": "buyer@example.com"},
+            },
+        )
+
+    def assert_stock(self, quantity, held):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, quantity)
+        self.assertEqual(
+            StockReservation.objects.filter(
+                order=self.order, status=StockReservation.HELD
+            ).count(),
+            held,
+        )
+
+    def test_reserve(self):
+        expires_at = reserve_order_stock(self.order.pk)
+        self.assert_stock(3, held=1)
+        reservation = StockReservation.objects.get(order=self.order)
+        self.assertEqual(reservation.quantity, 2)
+        self.assertEqual(reservation.expires_at, expires_at)
+
+    def test_reserve_again_replaces_holds(self):
+        reserve_order_stock(self.order.pk)
+        reserve_order_stock(self.order.pk)
+        self.assert_stock(3, held=1)
+        self.assertEqual(
+            StockReservation.objects.filter(
+                order=self.order, status=StockReservation.RELEASED
+            ).count(),
+            1,
+        )
+
+    def test_oversell_is_a_conflict(self):
+        Product.objects.filter(pk=self.product.pk).update(quantity=1)
+        with mock.patch("stripe.checkout.Session.create") as create:
+            response = self.client.post(self.session_url)
+        self.assertEqual(response.status_code, 409)
+        create.assert_not_called()
+        self.assert_stock(1, held=0)
+
+    def test_session_error_releases_stock(self):
+        with mock.patch("stripe.checkout.Session.create", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(self.session_url)
+        self.assert_stock(5, held=0)
+
+    def test_line_item_error_reserves_nothing(self):
+        with (
+            mock.patch("payment.views.checkout_line_items", side_effect=ValueError),
+            mock.patch("stripe.checkout.Session.create") as create,
+        ):
+            with self.assertRaises(ValueError):
+                self.client.post(self.session_url)
+        create.assert_not_called()
+        self.assert_stock(5, held=0)
+
+    def test_expired_reservations_are_released(self):
+        reserve_order_stock(self.order.pk)
+        self.assertEqual(release_expired_reservations(), 0)
+
+        StockReservation.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assert_stock(5, held=0)
+
+    def test_expired_session_releases_stock(self):
+        session = self.create_session()
+        self.assert_stock(3, held=1)
+
+        self.expire_session(session)
+        self.assert_stock(5, held=0)
+
+    def test_expired_session_keeps_newer_session_stock(self):
+        old_session = self.create_session()
+        self.create_session()
+
+        self.expire_session(old_session)
+        self.assert_stock(3, held=1)
+
+    def test_expired_session_without_reservation_is_skipped(self):
+        session = self.create_session()
+        del session["metadata"]["reserved_until"]
+
+        self.expire_session(session)
+        self.assert_stock(3, held=1)
+
+    def test_session_expires_with_reservation(self):
+        self.assertGreaterEqual(
+            timedelta(seconds=settings.STOCK_RESERVATION_TTL), STRIPE_SESSION_MIN_TTL
+        )
+        session = self.create_session()
+        reservation = StockReservation.objects.get(
+            order=self.order, status=StockReservation.HELD
+        )
+        self.assertAlmostEqual(
+            session["expires_at"], reservation.expires_at.timestamp(), delta=1
+        )
+
+    def test_payment_commits_stock(self):
+        session = self.create_session()
+        self.complete_session(session)
+
+        self.assert_stock(3, held=0)
+        self.assertTrue(
+            StockReservation.objects.filter(
+                order=self.order, status=StockReservation.COMMITTED
+            ).exists()
+        )
+        self.order.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertEqual(
+            (self.order.status, self.payment.status),
+            (Order.COMPLETED, Payment.COMPLETED),
+        )
+        # Retried by Stripe
+        self.complete_session(session)
+        self.assert_stock(3, held=0)
+
+    def test_payment_after_release_takes_stock_again(self):
+        session = self.create_session()
+        StockReservation.objects.update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        release_expired_reservations()
+
+        self.complete_session(session)
+        self.assert_stock(3, held=0)
+
+    def test_oversold_payment(self):
+        Product.objects.filter(pk=self.product.pk).update(quantity=1)
+        self.assertFalse(commit_order_stock(self.order.pk))
+        self.assert_stock(1, held=0)
+
+
+class ConcurrentStockReservationTests(TransactionTestCase):
+    """
+    Concurrent checkouts can't sell the same last units twice
+    """
+
+    BUYERS = 4
+
+    def setUp(self):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        category = ProductCategory.objects.create(name="Category")
+        self.product = Product.objects.create(
+            seller=seller,
+            category=category,
+            name="Product",
+            desc="Description",
+            price=10,
+            quantity=3,
+        )
+        self.orders = []
+        for index in range(self.BUYERS):
+            buyer = User.objects.create_user(
+                f"buyer{index}", f"buyer{index}@example.com", "password"
+            )
+            order = Order.objects.create(buyer=buyer)
+            order.set_items({self.product: 2})
+            self.orders.append(order)
+
+    def test_last_units_are_reserved_once(self):
+        barrier = threading.Barrier(self.BUYERS)
+        results = []
+
+        def checkout(order):
+            try:
+                barrier.wait()
+                reserve_order_stock(order.pk)
+                results.append(True)
+            except OutOfStockException:
+                results.append(False)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=checkout, args=(order,)) for order in self.orders
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), [False] * (self.BUYERS - 1) + [True])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 1)
+        self.assertEqual(
+            StockReservation.objects.filter(status=StockReservation.HELD).count(), 1
+        )
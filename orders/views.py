@@ -1,6 +1,9 @@
-from django.shortcuts import get_object_or_404
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
+from config.pagination import CreatedAtCursorPagination
+from orders.loaders import get_request_order
 from orders.models import Order, OrderItem
 from orders.permissions import (
     IsOrderByBuyerOrAdmin,
@@ -10,6 +13,7 @@ from orders.permissions import (
 )
 from orders.serializers import (
     OrderItemSerializer,
+    OrderItemSyncSerializer,
     OrderReadSerializer,
     OrderWriteSerializer,
 )
@@ -23,6 +27,7 @@ class OrderItemViewSet(viewsets.ModelViewSet):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
     permission_classes = [IsOrderItemByBuyerOrAdmin]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         res = super().get_queryset()
@@ -30,12 +35,29 @@ class OrderItemViewSet(viewsets.ModelViewSet):
         return res.filter(order__id=order_id)
 
     def perform_create(self, serializer):
-        order = get_object_or_404(Order, id=self.kwargs.get("order_id"))
+        order = get_request_order(self.request, self.kwargs.get("order_id"))
         serializer.save(order=order)
 
+    @action(detail=False, methods=["put"], serializer_class=OrderItemSyncSerializer)
+    def sync(self, request, *args, **kwargs):
+        """
+        Replace all the items of the order with the given list, e.g. a cart
+        """
+        order = get_request_order(self.request, self.kwargs.get("order_id"))
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = order.set_items(serializer.validated_data["order_items"])
+
+        return Response(
+            {
+                "order_items": OrderItemSerializer(items, many=True).data,
+                "total_cost": order.total_cost,
+            }
+        )
+
     def get_permissions(self):
-        if self.action in ("create", "update", "partial_update", "destroy"):
-            self.permission_classes += [IsOrderItemPending]
+        if self.action in ("create", "update", "partial_update", "destroy", "sync"):
+            self.permission_classes = [*self.permission_classes, IsOrderItemPending]
 
         return super().get_permissions()
 
@@ -47,6 +69,7 @@ class OrderViewSet(viewsets.ModelViewSet):
 
     queryset = Order.objects.all()
     permission_classes = [IsOrderByBuyerOrAdmin]
+    pagination_class = CreatedAtCursorPagination
 
     def get_serializer_class(self):
         if self.action in ("create", "update", "partial_update", "destroy"):
@@ -57,10 +80,14 @@ class OrderViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         res = super().get_queryset()
         user = self.request.user
-        return res.filter(buyer=user)
+        res = res.filter(buyer=user)
+        if self.action in ("list", "retrieve"):
+            # OrderReadSerializer reads the buyer, payment, items and totals
+            res = res.with_totals().with_items().select_related("buyer", "payment")
+        return res
 
     def get_permissions(self):
         if self.action in ("update", "partial_update", "destroy"):
-            self.permission_classes += [IsOrderPending]
+            self.permission_classes = [*self.permission_classes, IsOrderPending]
 
         return super().get_permissions()
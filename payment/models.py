@@ -32,6 +32,11 @@ class Payment(models.Model):
 
     class Meta:
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(
+                fields=["-created_at", "id"], name="payment_created_at_id_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.order.buyer.get_full_name()
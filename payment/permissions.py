@@ -1,8 +1,7 @@
-from django.shortcuts import get_object_or_404
 from django.utils.translation import gettext_lazy as _
 from rest_framework.permissions import BasePermission
 
-from orders.models import Order
+from orders.loaders import get_request_order
 
 
 class IsPaymentByUser(BasePermission):
@@ -35,8 +34,7 @@ class IsPaymentForOrderNotCompleted(BasePermission):
 
     def has_permission(self, request, view):
         if request.user.is_authenticated:
-            order_id = view.kwargs.get("order_id")
-            order = get_object_or_404(Order, id=order_id)
+            order = get_request_order(request, view.kwargs.get("order_id"))
             return order.status != "C"
         return False
 
@@ -48,8 +46,7 @@ class DoesOrderHaveAddress(BasePermission):
 
     def has_permission(self, request, view):
         if request.user.is_authenticated:
-            order_id = view.kwargs.get("order_id")
-            order = get_object_or_404(Order, id=order_id)
+            order = get_request_order(request, view.kwargs.get("order_id"))
             return order.shipping_address and order.billing_address
         return False
 
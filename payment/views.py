@@ -1,14 +1,22 @@
+import logging
+from datetime import datetime, timedelta
+
 import stripe
 from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.generics import RetrieveUpdateAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
+from config.pagination import CreatedAtCursorPagination
+from orders.loaders import get_request_order
 from orders.models import Order
 from orders.permissions import IsOrderByBuyerOrAdmin
+from orders.stock import commit_order_stock, release_order_stock, reserve_order_stock
 from payment.models import Payment
 from payment.permissions import (
     DoesOrderHaveAddress,
@@ -20,8 +28,14 @@ from payment.permissions import (
 from payment.serializers import CheckoutSerializer, PaymentSerializer
 from payment.tasks import send_payment_success_email_task
 
+logger = logging.getLogger(__name__)
+
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+# Shortest lifetime Stripe accepts for a checkout session, with a margin.
+# The default `STOCK_RESERVATION_TTL` matches it.
+STRIPE_SESSION_MIN_TTL = timedelta(minutes=31)
+
 
 class PaymentViewSet(ModelViewSet):
     """
@@ -31,6 +45,7 @@ class PaymentViewSet(ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [IsPaymentByUser]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         res = super().get_queryset()
@@ -39,7 +54,7 @@ class PaymentViewSet(ModelViewSet):
 
     def get_permissions(self):
         if self.action in ("update", "partial_update", "destroy"):
-            self.permission_classes += [IsPaymentPending]
+            self.permission_classes = [*self.permission_classes, IsPaymentPending]
 
         return super().get_permissions()
 
@@ -49,59 +64,87 @@ class CheckoutAPIView(RetrieveUpdateAPIView):
     Create, Retrieve, Update billing address, shipping address and payment of an order
     """
 
-    queryset = Order.objects.all()
+    queryset = Order.objects.select_related(
+        "buyer", "shipping_address", "billing_address", "payment"
+    )
     serializer_class = CheckoutSerializer
     permission_classes = [IsOrderByBuyerOrAdmin]
 
     def get_permissions(self):
         if self.request.method in ("PUT", "PATCH"):
-            self.permission_classes += [IsOrderPendingWhenCheckout]
+            self.permission_classes = [
+                *self.permission_classes,
+                IsOrderPendingWhenCheckout,
+            ]
 
         return super().get_permissions()
 
 
-class StripeCheckoutSessionCreateAPIView(APIView):
+def checkout_line_items(order):
     """
-    Create and return checkout session ID for order payment of type 'Stripe'
+    Stripe line items of the order, showing the uploaded images of each product
     """
-
-    permission_classes = (
-        IsPaymentForOrderNotCompleted,
-        DoesOrderHaveAddress,
+    line_items = []
+    order_items = order.order_items.select_related("product").prefetch_related(
+        "product__images"
     )
-
-    def post(self, request, *args, **kwargs):
-        order = get_object_or_404(Order, id=self.kwargs.get("order_id"))
-
-        order_items = []
-
-        for order_item in order.order_items.all():
-            product = order_item.product
-            quantity = order_item.quantity
-
-            data = {
+    for order_item in order_items:
+        product = order_item.product
+        line_items.append(
+            {
                 "price_data": {
                     "currency": "usd",
-                    "unit_amount_decimal": product.price,
+                    "unit_amount_decimal": order_item.unit_price,
                     "product_data": {
                         "name": product.name,
                         "description": product.desc,
-                        "images": [f"{settings.BACKEND_DOMAIN}{product.image.url}"],
+                        # Stripe takes at most 8 images
+                        "images": [
+                            image.url for image in product.images.all() if image.url
+                        ][:8],
                     },
                 },
-                "quantity": quantity,
+                "quantity": order_item.quantity,
             }
+        )
+    return line_items
 
-            order_items.append(data)
 
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=order_items,
-            metadata={"order_id": order.id},
-            mode="payment",
-            success_url=settings.PAYMENT_SUCCESS_URL,
-            cancel_url=settings.PAYMENT_CANCEL_URL,
-        )
+class StripeCheckoutSessionCreateAPIView(APIView):
+    """
+    Create and return checkout session ID for order payment of type 'Stripe'
+    """
+
+    permission_classes = (
+        IsPaymentForOrderNotCompleted,
+        DoesOrderHaveAddress,
+    )
+
+    def post(self, request, *args, **kwargs):
+        order = get_request_order(request, self.kwargs.get("order_id"))
+        order_items = checkout_line_items(order)
+
+        # Raises a 409 when a product sold out since it was added
+        reserved_until = reserve_order_stock(order.id)
+        try:
+            # A session outliving its reservation can still be paid, the
+            # webhook then takes the stock again
+            expires_at = max(reserved_until, timezone.now() + STRIPE_SESSION_MIN_TTL)
+            checkout_session = stripe.checkout.Session.create(
+                payment_method_types=["card"],
+                line_items=order_items,
+                metadata={
+                    "order_id": order.id,
+                    "reserved_until": reserved_until.isoformat(),
+                },
+                mode="payment",
+                success_url=settings.PAYMENT_SUCCESS_URL,
+                cancel_url=settings.PAYMENT_CANCEL_URL,
+                expires_at=int(expires_at.timestamp()),
+            )
+        except Exception:
+            release_order_stock(order.id)
+            raise
 
         return Response(
             {"sessionId": checkout_session["id"]}, status=status.HTTP_201_CREATED
@@ -131,19 +174,42 @@ class StripeWebhookAPIView(APIView):
             customer_email = session["customer_details"]["email"]
             order_id = session["metadata"]["order_id"]
 
-            print("Payment successfull")
+            logger.info("Payment of order %s completed", order_id)
 
-            payment = get_object_or_404(Payment, order=order_id)
-            payment.status = "C"
-            payment.save()
+            with transaction.atomic():
+                payment = get_object_or_404(Payment, order=order_id)
+                payment.status = "C"
+                payment.save()
 
-            order = get_object_or_404(Order, id=order_id)
-            order.status = "C"
-            order.save()
+                order = get_object_or_404(Order, id=order_id)
+                order.status = "C"
+                order.save()
 
-            # TODO - Decrease product quantity
+                commit_order_stock(order.id)
 
-            send_payment_success_email_task.delay(customer_email)
+                transaction.on_commit(
+                    lambda: send_payment_success_email_task.delay(customer_email)
+                )
+
+        elif event["type"] == "checkout.session.expired":
+            session = event["data"]["object"]
+            metadata = session.get("metadata") or {}
+            order_id = metadata.get("order_id")
+            reserved_until = metadata.get("reserved_until")
+
+            if order_id and reserved_until:
+                logger.info("Checkout of order %s expired", order_id)
+                # The holds of a newer session of the order expire later and stay
+                release_order_stock(
+                    order_id, expired_at=datetime.fromisoformat(reserved_until)
+                )
+            else:
+                # Made before sessions recorded their reservation, or not by
+                # this shop. Holds left behind expire on their own.
+                logger.info(
+                    "Expired checkout session %s holds no stock, skipped",
+                    session.get("id"),
+                )
 
         # Can handle other events here.
 
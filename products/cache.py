@@ -0,0 +1,216 @@
+"""
+Versioned response cache for the public catalog endpoints.
+
+Cached responses are keyed on a catalog version number that is bumped whenever
+a product, category, image or video changes (see `products.signals`). A write
+therefore makes every previously cached catalog response unreachable at once,
+without waiting for a TTL to expire.
+
+The same version, and the `updated_at` columns for single resources, back the
+ETag/Last-Modified validators used for conditional GETs.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+from rest_framework.response import Response
+
+from products.models import Product, ProductCategory
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_HITS_KEY = "catalog:stats:hits"
+CATALOG_MISSES_KEY = "catalog:stats:misses"
+
+
+def get_catalog_cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def _incr(key, initial):
+    cache = get_catalog_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key is missing or was evicted
+        if cache.add(key, initial, timeout=None):
+            return initial
+        return cache.incr(key)
+
+
+def get_catalog_version():
+    cache = get_catalog_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = _incr(CATALOG_VERSION_KEY, _initial_version())
+    return version
+
+
+def bump_catalog_version():
+    return _incr(CATALOG_VERSION_KEY, _initial_version())
+
+
+def _initial_version():
+    # If the version key is evicted, restart from a value that is larger than
+    # any version handed out before so stale entries are never reused.
+    return int(time.time() * 1000)
+
+
+def get_catalog_cache_stats():
+    cache = get_catalog_cache()
+    stats = cache.get_many([CATALOG_HITS_KEY, CATALOG_MISSES_KEY])
+    hits = stats.get(CATALOG_HITS_KEY, 0)
+    misses = stats.get(CATALOG_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "version": get_catalog_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+    }
+
+
+class CatalogCacheMixin:
+    """
+    Serve the `catalog_cached_actions` of a viewset from the versioned catalog cache.
+
+    Only use it on actions whose response does not depend on the requesting user.
+    """
+
+    catalog_cached_actions = ("list", "retrieve")
+
+    def get_catalog_cache_key(self, request, version):
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, "")
+        params = sorted(request.query_params.lists())
+        digest = hashlib.md5(repr((lookup, params)).encode()).hexdigest()
+        return f"catalog:{version}:{self.basename}:{self.action}:{digest}"
+
+    def list(self, request, *args, **kwargs):
+        return self._catalog_cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._catalog_cached(super().retrieve, request, *args, **kwargs)
+
+    def _catalog_cached(self, handler, request, *args, **kwargs):
+        if self.action not in self.catalog_cached_actions or not getattr(
+            settings, "CATALOG_CACHE_ENABLED", True
+        ):
+            return handler(request, *args, **kwargs)
+
+        cache = get_catalog_cache()
+        key = self.get_catalog_cache_key(request, get_catalog_version())
+        data = cache.get(key)
+        if data is not None:
+            _incr(CATALOG_HITS_KEY, 1)
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        _incr(CATALOG_MISSES_KEY, 1)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(
+                key, response.data, getattr(settings, "CATALOG_CACHE_TIMEOUT", 3600)
+            )
+        response["X-Cache"] = "MISS"
+        return response
+
+
+def catalog_list_etag(request, *args, **kwargs):
+    """
+    ETag of a catalog listing: changes with the catalog version and query params
+    """
+    if not getattr(settings, "CATALOG_CACHE_ENABLED", True):
+        # The version isn't shared between processes
+        return None
+    params = sorted(request.GET.lists())
+    digest = hashlib.md5(repr((request.path, params)).encode()).hexdigest()
+    return f"{get_catalog_version()}-{digest}"
+
+
+def _product_validators(request, pk):
+    """
+    Fetch the timestamps a product response depends on in a single query.
+
+    Memoized on the request because `condition` asks for the ETag and the
+    Last-Modified date separately.
+    """
+    cached = getattr(request, "_product_validators", None)
+    if cached is not None and cached[0] == pk:
+        return cached[1]
+
+    try:
+        row = (
+            Product.objects.filter(pk=pk)
+            .values("pk", "updated_at", "category__updated_at")
+            .annotate(
+                images_count=Count("images", distinct=True),
+                images_updated_at=Max("images__updated_at"),
+                videos_count=Count("videos", distinct=True),
+                videos_updated_at=Max("videos__updated_at"),
+            )
+            .first()
+        )
+    except (TypeError, ValueError):
+        row = None
+
+    request._product_validators = (pk, row)
+    return row
+
+
+def product_etag(request, pk=None, *args, **kwargs):
+    row = _product_validators(request, pk)
+    if row is None:
+        return None
+    parts = [
+        row["pk"],
+        row["updated_at"],
+        row["category__updated_at"],
+        row["images_count"],
+        row["images_updated_at"],
+        row["videos_count"],
+        row["videos_updated_at"],
+    ]
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def product_last_modified(request, pk=None, *args, **kwargs):
+    row = _product_validators(request, pk)
+    if row is None:
+        return None
+    timestamps = (
+        row["updated_at"],
+        row["category__updated_at"],
+        row["images_updated_at"],
+        row["videos_updated_at"],
+    )
+    return max(t for t in timestamps if t is not None)
+
+
+def _category_updated_at(request, pk):
+    cached = getattr(request, "_category_updated_at", None)
+    if cached is not None and cached[0] == pk:
+        return cached[1]
+
+    try:
+        updated_at = (
+            ProductCategory.objects.filter(pk=pk)
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+    except (TypeError, ValueError):
+        updated_at = None
+
+    request._category_updated_at = (pk, updated_at)
+    return updated_at
+
+
+def category_etag(request, pk=None, *args, **kwargs):
+    updated_at = _category_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    return hashlib.md5(repr((pk, updated_at)).encode()).hexdigest()
+
+
+def category_last_modified(request, pk=None, *args, **kwargs):
+    return _category_updated_at(request, pk)
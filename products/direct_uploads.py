@@ -0,0 +1,96 @@
+"""
+Direct client uploads to ImageKit.
+
+Instead of sending image bytes through our servers, a client asks for signed
+upload parameters, uploads straight to ImageKit, and confirms the upload with
+the returned `fileId`. The grant handed out with the parameters is signed
+with `SECRET_KEY`, so any web process can verify it without shared state.
+"""
+
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import ValidationError
+
+from config.imagekit import imagekit
+from products.models import ProductImage
+
+GRANT_SALT = "products.direct_uploads"
+
+
+def image_folder(product_id):
+    return f"/products/{product_id}/images"
+
+
+def issue_upload_params(product, user):
+    """
+    Signed parameters for one ImageKit client upload into `product`'s folder
+    """
+    if imagekit is None:
+        raise ValidationError({"detail": _("Direct uploads are not configured.")})
+
+    ttl = settings.IMAGEKIT_DIRECT_UPLOAD_TTL
+    expire = int(time.time()) + ttl
+    auth = imagekit.get_authentication_parameters(uuid.uuid4().hex, expire)
+    folder = image_folder(product.pk)
+    grant = signing.dumps(
+        {"product": product.pk, "user": user.pk, "folder": folder}, salt=GRANT_SALT
+    )
+    return {
+        "upload_url": settings.IMAGEKIT_UPLOAD_API_URL.rstrip("/")
+        + "/api/v1/files/upload",
+        "public_key": settings.IMAGEKIT_PUBLIC_KEY,
+        "token": auth["token"],
+        "expire": auth["expire"],
+        "signature": auth["signature"],
+        "folder": folder,
+        "grant": grant,
+    }
+
+
+def confirm_upload(grant, file_id, user, is_primary=False, order=0):
+    """
+    Record a file the client uploaded with `issue_upload_params` as a new
+    `ProductImage`, after checking with ImageKit that it exists and sits in
+    the folder the grant was issued for.
+    """
+    try:
+        data = signing.loads(
+            grant, salt=GRANT_SALT, max_age=settings.IMAGEKIT_DIRECT_UPLOAD_TTL * 2
+        )
+    except signing.BadSignature:
+        raise ValidationError(
+            {"grant": _("The upload grant is invalid or has expired.")}
+        )
+    if data["user"] != user.pk:
+        raise ValidationError(
+            {"grant": _("The upload grant was issued to another user.")}
+        )
+
+    existing = ProductImage.objects.filter(
+        file_id=file_id, product_id=data["product"]
+    ).first()
+    if existing is not None:
+        # Confirming twice, e.g. after a lost response
+        return existing
+
+    try:
+        result = imagekit.get_file_details(file_id)
+    except Exception:
+        raise ValidationError({"file_id": _("The file was not found on ImageKit.")})
+    raw = getattr(result, "response_metadata", None)
+    raw = getattr(raw, "raw", {}) if raw else {}
+    if not (raw.get("filePath") or "").startswith(data["folder"] + "/"):
+        raise ValidationError(
+            {"file_id": _("The file was not uploaded with this grant.")}
+        )
+    if raw.get("fileType") != "image":
+        raise ValidationError({"file_id": _("The file is not an image.")})
+
+    image = ProductImage(product_id=data["product"], is_primary=is_primary, order=order)
+    image.apply_upload_result(raw)
+    image.save()
+    return image
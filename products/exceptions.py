@@ -0,0 +1,13 @@
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import APIException, Throttled
+
+
+class UploadOffsetConflictException(APIException):
+    status_code = 409
+    default_detail = _("The chunk offset does not match the upload offset.")
+    default_code = "upload-offset-conflict"
+
+
+class UploadQueueFullException(Throttled):
+    default_detail = _("Too many uploads are waiting to be processed, try again later.")
+    default_code = "upload-queue-full"
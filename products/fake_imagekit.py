@@ -0,0 +1,146 @@
+"""
+A local stand-in for the ImageKit upload and file APIs, for development and
+benchmarks.
+
+It accepts `POST /api/v1/files/upload` like the real upload API, waits
+`latency` seconds to simulate the network round trip, and answers with a
+response of the same shape. It also serves the file listing and batch delete
+endpoints over the files it received. Point `IMAGEKIT_UPLOAD_API_URL` and
+`IMAGEKIT_API_URL` at it, or pass its `url` to `ImageKitUploader`.
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FOLDER_FIELD_RE = re.compile(rb'name="folder"\r\n\r\n([^\r]*)\r\n')
+
+
+class FakeImageKitHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self.headers.get("Authorization"):
+            return self.respond(
+                401, {"message": "Your request does not contain private API key."}
+            )
+        if self.path == "/v1/files/batch/deleteByFileIds":
+            return self.batch_delete(json.loads(body or b"{}").get("fileIds", []))
+        if self.path != "/api/v1/files/upload":
+            return self.respond(404, {"message": "Not found"})
+
+        time.sleep(self.server.latency)
+        folder = FOLDER_FIELD_RE.search(body)
+        folder = folder.group(1).decode().rstrip("/") if folder else ""
+        file_id = uuid.uuid4().hex[:24]
+        file_name = f"{file_id}.bin"
+        details = {
+            "type": "file",
+            "fileId": file_id,
+            "name": file_name,
+            "filePath": f"{folder}/{file_name}",
+            "url": f"{self.server.url_endpoint}{folder}/{file_name}",
+            "size": len(body),
+            "fileType": "non-image",
+            "createdAt": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        }
+        with self.server.lock:
+            self.server.uploads += 1
+            self.server.bytes_received += len(body)
+            self.server.files[file_id] = details
+        self.respond(200, details)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/v1/files":
+            return self.respond(404, {"message": "Not found"})
+        if not self.headers.get("Authorization"):
+            return self.respond(
+                401, {"message": "Your request does not contain private API key."}
+            )
+
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        path = query.get("path", "/").rstrip("/") + "/"
+        skip = int(query.get("skip", 0))
+        limit = int(query.get("limit", 1000))
+        with self.server.lock:
+            files = [
+                f for f in self.server.files.values() if f["filePath"].startswith(path)
+            ]
+        self.respond(200, files[skip:][:limit])
+
+    def batch_delete(self, file_ids):
+        with self.server.lock:
+            missing = [
+                file_id for file_id in file_ids if file_id not in self.server.files
+            ]
+            if not missing:
+                for file_id in file_ids:
+                    del self.server.files[file_id]
+        if missing:
+            return self.respond(
+                404,
+                {
+                    "message": "The requested file(s) does not exist.",
+                    "missingFileIds": missing,
+                },
+            )
+        self.respond(200, {"successfullyDeletedFileIds": file_ids})
+
+    def respond(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeImageKitServer(ThreadingHTTPServer):
+    """
+    Usage:
+        with FakeImageKitServer(latency=0.05) as server:
+            ImageKitUploader(upload_url=server.url)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, url_endpoint=None):
+        super().__init__((host, port), FakeImageKitHandler)
+        self.latency = latency
+        self.url_endpoint = url_endpoint or "https://ik.imagekit.io/fake"
+        self.lock = threading.Lock()
+        self.uploads = 0
+        self.bytes_received = 0
+        # Uploaded file details by fileId, insertion ordered like a listing
+        self.files = {}
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
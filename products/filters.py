@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    """
+    Validates the product filter query parameters
+    """
+
+    category = serializers.IntegerField(required=False, min_value=1)
+    seller = serializers.IntegerField(required=False, min_value=1)
+    min_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False, min_value=0
+    )
+    max_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False, min_value=0
+    )
+    in_stock = serializers.BooleanField(required=False)
+
+
+class ProductFilterBackend(BaseFilterBackend):
+    """
+    Filter products by `category`, `seller`, `min_price`, `max_price` and `in_stock`
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        # A plain dict, so a missing `in_stock` isn't read as an unchecked checkbox
+        serializer = ProductFilterSerializer(data=request.query_params.dict())
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+
+        if "category" in filters:
+            queryset = queryset.filter(category_id=filters["category"])
+        if "seller" in filters:
+            queryset = queryset.filter(seller_id=filters["seller"])
+        if "min_price" in filters:
+            queryset = queryset.filter(price__gte=filters["min_price"])
+        if "max_price" in filters:
+            queryset = queryset.filter(price__lte=filters["max_price"])
+        if "in_stock" in filters:
+            if filters["in_stock"]:
+                queryset = queryset.filter(quantity__gt=0)
+            else:
+                queryset = queryset.filter(quantity__lte=0)
+
+        return queryset
+
+
+def product_facets(queryset):
+    """
+    Product counts per category and per price bucket, from a single GROUP BY
+    over `(category, price bucket)` that is folded into both facets here.
+    """
+    bounds = list(settings.PRODUCT_PRICE_FACET_BUCKETS)
+    price_bucket = Case(
+        *[
+            When(price__lt=bound, then=Value(index))
+            for index, bound in enumerate(bounds)
+        ],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=price_bucket)
+        .values("category_id", "category__name", "price_bucket")
+        .annotate(count=Count("id"))
+    )
+
+    categories = {}
+    bucket_counts = [0] * (len(bounds) + 1)
+    for row in rows:
+        category = categories.setdefault(
+            row["category_id"],
+            {"id": row["category_id"], "name": row["category__name"], "count": 0},
+        )
+        category["count"] += row["count"]
+        bucket_counts[row["price_bucket"]] += row["count"]
+
+    edges = [None] + bounds + [None]
+    return {
+        "categories": sorted(categories.values(), key=lambda c: (-c["count"], c["id"])),
+        "price": [
+            {"min": edges[index] or 0, "max": edges[index + 1], "count": count}
+            for index, count in enumerate(bucket_counts)
+        ],
+    }
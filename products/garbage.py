@@ -0,0 +1,238 @@
+"""
+Garbage collection of product media nothing refers to anymore.
+
+Three sources are collected:
+
+- ImageKit files under `/products` whose `fileId` no longer belongs to any
+  `ProductImage`/`ProductVideo`, e.g. after their product was deleted.
+- Files under the product media folders of `MEDIA_ROOT` that are not
+  waiting to be uploaded or transcoded.
+- Chunked video uploads abandoned before completion.
+
+Listings are compared with the database a page at a time using one
+`__in` query per model, and ImageKit files are deleted with the bulk API.
+Anything younger than `MEDIA_GC_GRACE_PERIOD` is left alone, so uploads in
+flight are never mistaken for orphans.
+"""
+
+import logging
+import os
+import time
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from products.models import (
+    ProductImage,
+    ProductVideo,
+    ProductVideoUpload,
+    TranscodeStatus,
+)
+from products.uploads import pending_media
+
+logger = logging.getLogger(__name__)
+
+IMAGEKIT_FOLDER = "/products"
+LOCAL_FOLDERS = ("product/images", "product/videos")
+# Maximum number of fileIds the ImageKit bulk delete API accepts per call
+DELETE_BATCH_SIZE = 100
+
+
+class MediaGarbageCollector:
+    """
+    Usage:
+        report = MediaGarbageCollector(dry_run=True).collect()
+    """
+
+    def __init__(self, dry_run=False, batch_size=None, api_url=None):
+        self.dry_run = dry_run
+        self.batch_size = batch_size or settings.MEDIA_GC_BATCH_SIZE
+        self.api_url = (api_url or settings.IMAGEKIT_API_URL).rstrip("/")
+        self.cutoff = timezone.now() - timedelta(seconds=settings.MEDIA_GC_GRACE_PERIOD)
+
+        self.session = requests.Session()
+        self.session.auth = (settings.IMAGEKIT_PRIVATE_KEY, "")
+
+    def collect(self):
+        try:
+            report = {"dry_run": self.dry_run}
+            report["imagekit"] = self.collect_imagekit()
+            report["local"] = self.collect_local()
+            report["video_uploads"] = self.collect_video_uploads()
+        finally:
+            self.session.close()
+        report["reclaimed_bytes"] = sum(
+            report[source]["bytes"] for source in ("imagekit", "local", "video_uploads")
+        )
+        return report
+
+    def collect_imagekit(self):
+        result = {"scanned": 0, "orphans": 0, "bytes": 0}
+        if not settings.IMAGEKIT_PRIVATE_KEY:
+            return result
+
+        # Collect all orphans first, deleting while paging would shift the pages
+        orphans = []
+        skip = 0
+        while True:
+            response = self.session.get(
+                f"{self.api_url}/v1/files",
+                params={
+                    "type": "file",
+                    "path": IMAGEKIT_FOLDER,
+                    "skip": skip,
+                    "limit": self.batch_size,
+                },
+                timeout=settings.IMAGEKIT_UPLOAD_TIMEOUT,
+            )
+            response.raise_for_status()
+            files = response.json()
+            if not files:
+                break
+            skip += len(files)
+            result["scanned"] += len(files)
+
+            files = [f for f in files if self.is_old_enough(f.get("createdAt"))]
+            file_ids = [f["fileId"] for f in files]
+            referenced = set(
+                ProductImage.objects.filter(file_id__in=file_ids).values_list(
+                    "file_id", flat=True
+                )
+            )
+            referenced.update(
+                ProductVideo.objects.filter(file_id__in=file_ids).values_list(
+                    "file_id", flat=True
+                )
+            )
+            referenced.update(
+                ProductVideo.objects.filter(mp4_file_id__in=file_ids).values_list(
+                    "mp4_file_id", flat=True
+                )
+            )
+            referenced.update(
+                ProductVideo.objects.filter(poster_file_id__in=file_ids).values_list(
+                    "poster_file_id", flat=True
+                )
+            )
+            orphans += [f for f in files if f["fileId"] not in referenced]
+
+        for start in range(0, len(orphans), DELETE_BATCH_SIZE):
+            end = start + DELETE_BATCH_SIZE
+            batch = orphans[start:end]
+            if not self.dry_run:
+                response = self.session.post(
+                    f"{self.api_url}/v1/files/batch/deleteByFileIds",
+                    json={"fileIds": [f["fileId"] for f in batch]},
+                    timeout=settings.IMAGEKIT_UPLOAD_TIMEOUT,
+                )
+                if not response.ok:
+                    logger.warning("Deleting ImageKit files failed: %s", response.text)
+                    continue
+            result["orphans"] += len(batch)
+            result["bytes"] += sum(f.get("size") or 0 for f in batch)
+        return result
+
+    def collect_local(self):
+        result = {"scanned": 0, "orphans": 0, "bytes": 0}
+        batch = []
+        for folder in LOCAL_FOLDERS:
+            for name, entry in self.walk(folder):
+                result["scanned"] += 1
+                if entry.stat().st_mtime > self.cutoff.timestamp():
+                    continue
+                batch.append((name, entry))
+                if len(batch) >= self.batch_size:
+                    self.delete_local_orphans(batch, result)
+                    batch = []
+        if batch:
+            self.delete_local_orphans(batch, result)
+        return result
+
+    def walk(self, folder):
+        """
+        Yield `(storage name, DirEntry)` for every file below `folder`
+        """
+        root = default_storage.path(folder)
+        if not os.path.isdir(root):
+            return
+        stack = [root]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        name = os.path.relpath(entry.path, settings.MEDIA_ROOT)
+                        yield name.replace(os.sep, "/"), entry
+
+    def delete_local_orphans(self, batch, result):
+        names = [name for name, _entry in batch]
+        # Uploaded media keep their `file_local` name, only pending files are live
+        referenced = set(
+            pending_media(ProductImage)
+            .filter(file_local__in=names)
+            .values_list("file_local", flat=True)
+        )
+        referenced.update(
+            pending_media(ProductVideo)
+            .filter(file_local__in=names)
+            .values_list("file_local", flat=True)
+        )
+        # Originals stay until the transcoding stage is done with them
+        referenced.update(
+            ProductVideo.objects.filter(
+                file_local__in=names,
+                transcode_status__in=[
+                    TranscodeStatus.PENDING,
+                    TranscodeStatus.PROCESSING,
+                ],
+            ).values_list("file_local", flat=True)
+        )
+
+        for name, entry in batch:
+            if name in referenced:
+                continue
+            size = entry.stat().st_size
+            if not self.dry_run:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+            result["orphans"] += 1
+            result["bytes"] += size
+
+    def collect_video_uploads(self):
+        result = {"scanned": 0, "orphans": 0, "bytes": 0}
+        stale = ProductVideoUpload.objects.filter(
+            video__isnull=True,
+            updated_at__lt=timezone.now()
+            - timedelta(seconds=settings.VIDEO_UPLOAD_EXPIRY),
+        )
+        for upload in stale.iterator():
+            result["scanned"] += 1
+            result["orphans"] += 1
+            try:
+                result["bytes"] += os.path.getsize(upload.partial_path)
+                if not self.dry_run:
+                    os.remove(upload.partial_path)
+            except OSError:
+                pass
+        if not self.dry_run:
+            stale.delete()
+        return result
+
+    def is_old_enough(self, created_at):
+        created_at = parse_datetime(created_at) if created_at else None
+        return created_at is not None and created_at < self.cutoff
+
+
+def collect_media_garbage(dry_run=False):
+    start = time.perf_counter()
+    report = MediaGarbageCollector(dry_run=dry_run).collect()
+    report["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+    logger.info("Media garbage collection: %s", report)
+    return report
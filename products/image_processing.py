@@ -0,0 +1,143 @@
+"""
+Normalization of product images before they are uploaded to ImageKit.
+
+Phone photos are re-encoded into a compact web format: EXIF metadata is
+dropped (after it has been used to orient the image) and the long edge is
+capped. Encoding is CPU bound, so batches are spread over a process pool.
+
+The pool is billiard's, Celery's fork of multiprocessing: uploads run in
+prefork worker processes, which are daemonic, and the standard library
+refuses to start children from those.
+"""
+
+import logging
+import os
+
+from billiard.pool import Pool
+from django.conf import settings
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {"WEBP": "webp", "AVIF": "avif", "JPEG": "jpg"}
+
+_pool = None
+_pool_pid = None
+
+
+def get_output_format():
+    image_format = settings.PRODUCT_IMAGE_FORMAT.upper()
+    Image.init()
+    if image_format not in Image.SAVE:
+        # AVIF needs Pillow 11.3+ or the pillow-avif-plugin package
+        logger.warning("Pillow cannot encode %s, using WEBP instead", image_format)
+        image_format = "WEBP"
+    return image_format
+
+
+def normalize_image(path, output_path, max_edge, image_format, quality):
+    """
+    Re-encode the image at `path` into `output_path`.
+
+    Runs in pool worker processes, so it only deals with plain values.
+    Returns `(original_size, size)` in bytes, or None when the image was left
+    as it is because it is animated or can't be read.
+    """
+    # Written next to the result and renamed, `output_path` may be `path`
+    partial_path = f"{output_path}.part"
+    try:
+        original_size = os.path.getsize(path)
+        with Image.open(path) as source:
+            if getattr(source, "is_animated", False):
+                return None
+            image = ImageOps.exif_transpose(source)
+            if max(image.size) > max_edge:
+                image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            if image.mode not in ("RGB", "RGBA"):
+                has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+                image = image.convert("RGBA" if has_alpha else "RGB")
+            if image_format == "JPEG" and image.mode == "RGBA":
+                image = image.convert("RGB")
+
+            # Pillow only writes EXIF when asked to
+            image.save(partial_path, format=image_format, quality=quality)
+    except (OSError, ValueError) as exc:
+        logger.warning("Could not normalize %s: %s", path, exc)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return None
+
+    os.replace(partial_path, output_path)
+    if output_path != path:
+        os.remove(path)
+    return original_size, os.path.getsize(output_path)
+
+
+def get_pool():
+    """
+    Process pool shared by every batch of this process, started on first use
+    """
+    global _pool, _pool_pid
+    if _pool_pid != os.getpid():
+        # A pool inherited through a fork belongs to the parent
+        _pool = None
+    if _pool is None:
+        _pool = Pool(processes=settings.PRODUCT_IMAGE_NORMALIZE_WORKERS)
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def reset_pool():
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.terminate()
+    _pool = None
+
+
+def normalize_images(images, use_pool=True):
+    """
+    Normalize the local files of unsaved-to-ImageKit `ProductImage`s in place,
+    updating their `file_local` name, `original_size` and `size`.
+
+    Returns the images that were changed. The caller saves them.
+    """
+    if not settings.PRODUCT_IMAGE_NORMALIZE:
+        return []
+
+    image_format = get_output_format()
+    extension = FORMAT_EXTENSIONS.get(image_format, image_format.lower())
+    jobs = []
+    for image in images:
+        storage = image.file_local.storage
+        name = f"{os.path.splitext(image.file_local.name)[0]}.{extension}"
+        if name != image.file_local.name:
+            name = storage.get_available_name(name)
+        args = (
+            image.file_local.path,
+            storage.path(name),
+            settings.PRODUCT_IMAGE_MAX_EDGE,
+            image_format,
+            settings.PRODUCT_IMAGE_QUALITY,
+        )
+        jobs.append((image, name, args))
+
+    if use_pool and len(jobs) > 1:
+        try:
+            results = list(
+                get_pool().starmap(normalize_image, [args for _, _, args in jobs])
+            )
+        except Exception:
+            logger.exception("Image normalization pool failed, normalizing in process")
+            reset_pool()
+            results = [normalize_image(*args) for _, _, args in jobs]
+    else:
+        results = [normalize_image(*args) for _, _, args in jobs]
+
+    normalized = []
+    for (image, name, _args), result in zip(jobs, results):
+        if result is None:
+            continue
+        image.file_local.name = name
+        image.original_size, image.size = result
+        normalized.append(image)
+    return normalized
@@ -0,0 +1,163 @@
+"""
+Streaming bulk import of products from CSV or JSON Lines files.
+
+Rows are read one at a time and written with `bulk_create` in batches, so
+memory use stays constant whatever the size of the file.
+"""
+
+import csv
+import io
+import json
+import os
+import time
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from products.cache import bump_catalog_version
+from products.models import Product, ProductCard, ProductCategory
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    Validates a single imported row
+    """
+
+    name = serializers.CharField(max_length=200)
+    desc = serializers.CharField(required=False, allow_blank=True, default="")
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    quantity = serializers.IntegerField(required=False, default=1, min_value=0)
+    category = serializers.CharField(max_length=100, required=False, default="Others")
+
+
+def detect_format(file_name):
+    extension = os.path.splitext(file_name or "")[1].lower().lstrip(".")
+    if extension in ("json", "jsonl", "ndjson"):
+        return "jsonl"
+    return "csv"
+
+
+class ProductImporter:
+    """
+    Import products for `seller` from a binary stream.
+
+    Usage:
+        report = ProductImporter(seller).run(uploaded_file, "csv")
+    """
+
+    def __init__(self, seller, batch_size=None, max_errors=1000):
+        self.seller = seller
+        self.batch_size = batch_size or settings.PRODUCT_IMPORT_BATCH_SIZE
+        self.max_errors = max_errors
+        self.categories = dict(ProductCategory.objects.values_list("name", "id"))
+        # Reused for every row: building a serializer deep-copies its fields,
+        # which costs more than validating the row itself
+        self.row_serializer = ProductImportRowSerializer()
+
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, stream, file_format):
+        if file_format not in IMPORT_FORMATS:
+            raise ValueError(f"Unsupported import format: {file_format}")
+
+        start = time.perf_counter()
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        rows = self.read_csv(text) if file_format == "csv" else self.read_jsonl(text)
+
+        batch = []
+        for row_number, row in rows:
+            product = self.build_product(row_number, row)
+            if product is None:
+                continue
+            batch.append(product)
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        if batch:
+            self.flush(batch)
+        text.detach()
+
+        elapsed = time.perf_counter() - start
+        return {
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_minute": (
+                round((self.created + self.failed) / elapsed * 60) if elapsed else None
+            ),
+        }
+
+    def read_csv(self, text):
+        # Row 1 is the header. Empty cells are treated as missing values so
+        # optional columns fall back to their defaults.
+        for row_number, row in enumerate(csv.DictReader(text), start=2):
+            yield row_number, {
+                key: value
+                for key, value in row.items()
+                if key and value not in ("", None)
+            }
+
+    def read_jsonl(self, text):
+        for row_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                self.add_error(
+                    row_number, {"non_field_errors": [f"Invalid JSON: {exc}"]}
+                )
+                continue
+            if not isinstance(row, dict):
+                self.add_error(
+                    row_number, {"non_field_errors": ["Expected a JSON object."]}
+                )
+                continue
+            yield row_number, row
+
+    def build_product(self, row_number, row):
+        try:
+            data = self.row_serializer.run_validation(row)
+        except serializers.ValidationError as exc:
+            self.add_error(row_number, exc.detail)
+            return None
+
+        return Product(
+            seller=self.seller,
+            category_id=self.get_category_id(data["category"]),
+            name=data["name"],
+            desc=data["desc"],
+            price=data["price"],
+            quantity=data["quantity"],
+        )
+
+    def get_category_id(self, name):
+        category_id = self.categories.get(name)
+        if category_id is None:
+            category_id = ProductCategory.objects.create(name=name).id
+            self.categories[name] = category_id
+        return category_id
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def flush(self, products):
+        """
+        Insert a batch and do what the post_save signals would have done
+        for each product, once for the whole batch.
+        """
+        with transaction.atomic():
+            products = Product.objects.bulk_create(products)
+            product_ids = [product.pk for product in products]
+            Product.objects.filter(pk__in=product_ids).update_search_vector()
+            ProductCard.objects.refresh(product_ids)
+            transaction.on_commit(bump_catalog_version)
+        self.created += len(products)
@@ -0,0 +1,107 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from products.fake_imagekit import FakeImageKitServer
+from products.models import Product, ProductCategory, ProductImage
+from products.uploads import ImageKitUploader, upload_media
+
+User = get_user_model()
+
+BENCHMARK_CATEGORY = "Upload Benchmark"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure upload throughput of the batched ImageKit upload worker against "
+        "a local fake ImageKit server, one file at a time and concurrently"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=200)
+        parser.add_argument(
+            "--size", type=int, default=64 * 1024, help="Bytes per file"
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0.05, help="Simulated seconds per upload"
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            action="append",
+            help="Concurrency level to measure, can be repeated",
+        )
+        parser.add_argument("--batch-size", type=int, default=50)
+
+    def handle(self, *args, **options):
+        seller = User.objects.filter(is_superuser=True).first() or User.objects.first()
+        if seller is None:
+            raise CommandError("Create a user before running the benchmark.")
+        category, _ = ProductCategory.objects.get_or_create(name=BENCHMARK_CATEGORY)
+        product = Product.objects.create(
+            seller=seller, category=category, name="Upload benchmark", price=1
+        )
+        payload = b"\0" * options["size"]
+
+        self.stdout.write(
+            f"{options['files']} files of {options['size']} bytes, "
+            f"{options['latency'] * 1000:.0f} ms simulated latency"
+        )
+        self.stdout.write(f"{'mode':<28} {'seconds':>8} {'files/s':>8}")
+        try:
+            with FakeImageKitServer(latency=options["latency"]) as server:
+                # Baseline: one file per call, like the former per-image task
+                elapsed = self.run(
+                    product,
+                    payload,
+                    options["files"],
+                    server.url,
+                    concurrency=1,
+                    batch_size=1,
+                )
+                self.report("sequential, batch of 1", options["files"], elapsed)
+
+                for concurrency in options["concurrency"] or [4, 8, 16]:
+                    elapsed = self.run(
+                        product,
+                        payload,
+                        options["files"],
+                        server.url,
+                        concurrency=concurrency,
+                        batch_size=options["batch_size"],
+                    )
+                    self.report(
+                        f"concurrency {concurrency}, batch of {options['batch_size']}",
+                        options["files"],
+                        elapsed,
+                    )
+        finally:
+            product.delete()
+
+    def run(self, product, payload, count, upload_url, concurrency, batch_size):
+        images = [
+            ProductImage(
+                product=product,
+                file_local=default_storage.save(
+                    f"products/images/benchmark_{index}.bin", ContentFile(payload)
+                ),
+            )
+            for index in range(count)
+        ]
+        ids = [image.pk for image in ProductImage.objects.bulk_create(images)]
+
+        start = time.perf_counter()
+        with ImageKitUploader(
+            concurrency=concurrency, upload_url=upload_url
+        ) as uploader:
+            while upload_media(
+                ProductImage, media_ids=ids, batch_size=batch_size, uploader=uploader
+            )["uploaded"]:
+                pass
+        return time.perf_counter() - start
+
+    def report(self, mode, count, elapsed):
+        self.stdout.write(f"{mode:<28} {elapsed:>8.2f} {count / elapsed:>8.1f}")
@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from config.imagekit import imagekit, transformed_url
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-URL cost of building transformed ImageKit URLs with the "
+        "SDK directly and through the memoized transformed_url helper"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--urls", type=int, default=500, help="Number of distinct source URLs"
+        )
+        parser.add_argument(
+            "--renders",
+            type=int,
+            default=20,
+            help="How many times each URL is rendered, like repeated page views",
+        )
+        parser.add_argument("--width", type=int, default=400)
+        parser.add_argument("--quality", type=int, default=80)
+
+    def handle(self, *args, **options):
+        if imagekit is None:
+            raise CommandError("The ImageKit SDK is not installed.")
+
+        endpoint = settings.IMAGEKIT_URL_ENDPOINT or "https://ik.imagekit.io/benchmark"
+        sources = [
+            f"{endpoint.rstrip('/')}/products/{index}/image.jpg"
+            for index in range(options["urls"])
+        ]
+        width, quality = options["width"], options["quality"]
+        calls = len(sources) * options["renders"]
+
+        start = time.perf_counter()
+        for _ in range(options["renders"]):
+            for src in sources:
+                imagekit.url(
+                    {
+                        "src": src,
+                        "transformation": [
+                            {"width": str(width)},
+                            {"quality": str(quality)},
+                        ],
+                    }
+                )
+        uncached = (time.perf_counter() - start) / calls * 1e6
+
+        transformed_url.cache_clear()
+        start = time.perf_counter()
+        for _ in range(options["renders"]):
+            for src in sources:
+                transformed_url(src, width=width, quality=quality)
+        cached = (time.perf_counter() - start) / calls * 1e6
+        info = transformed_url.cache_info()
+
+        self.stdout.write(f"{calls} URL builds ({len(sources)} distinct)")
+        self.stdout.write(f"SDK imagekit.url:  {uncached:8.2f} us/url")
+        self.stdout.write(f"transformed_url:   {cached:8.2f} us/url")
+        self.stdout.write(
+            f"cache hits={info.hits} misses={info.misses} size={info.currsize}"
+        )
@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import IMPORT_FORMATS, ProductImporter
+from products.models import Product, ProductCategory
+
+User = get_user_model()
+
+BENCHMARK_CATEGORY = "Import Benchmark"
+COLUMNS = ("name", "desc", "price", "quantity", "category")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the rows per minute of the bulk product importer for each file "
+        "format, against saving one product at a time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000)
+        parser.add_argument(
+            "--baseline-rows",
+            type=int,
+            default=2000,
+            help="Products saved one at a time for the baseline, 0 to skip it",
+        )
+        parser.add_argument("--batch-size", type=int)
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            action="append",
+            dest="formats",
+            help="Format to benchmark, can be repeated, all of them by default",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the imported products instead of deleting them afterwards",
+        )
+
+    def handle(self, *args, **options):
+        seller = User.objects.filter(is_superuser=True).first() or User.objects.first()
+        if seller is None:
+            raise CommandError("Create a user before benchmarking the import.")
+
+        rows = [self.build_row(index) for index in range(options["rows"])]
+        self.stdout.write(f"{'method':<12} {'rows':>8} {'seconds':>9} {'rows/min':>10}")
+        try:
+            for file_format in options["formats"] or IMPORT_FORMATS:
+                stream = io.BytesIO(self.encode(rows, file_format))
+                importer = ProductImporter(seller, batch_size=options["batch_size"])
+                report = importer.run(stream, file_format)
+                if report["failed"]:
+                    raise CommandError(
+                        f"{report['failed']} {file_format} rows failed: {report['errors'][:3]}"
+                    )
+                self.write_result(
+                    file_format, report["created"], report["elapsed_seconds"]
+                )
+
+            if options["baseline_rows"]:
+                self.write_result(
+                    "per row",
+                    *self.save_one_by_one(seller, rows[: options["baseline_rows"]]),
+                )
+        finally:
+            if not options["keep"]:
+                Product.objects.filter(
+                    category__name__startswith=BENCHMARK_CATEGORY
+                ).delete()
+                ProductCategory.objects.filter(
+                    name__startswith=BENCHMARK_CATEGORY
+                ).delete()
+
+    def build_row(self, index):
+        return {
+            "name": f"Benchmark product {index}",
+            "desc": f"Synthetic product {index} for the import benchmark",
+            "price": f"{random.randint(100, 100000) / 100:.2f}",
+            "quantity": str(random.randint(0, 50)),
+            "category": f"{BENCHMARK_CATEGORY} {index % 20}",
+        }
+
+    def encode(self, rows, file_format):
+        text = io.StringIO()
+        if file_format == "csv":
+            writer = csv.DictWriter(text, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                text.write(json.dumps(row) + "\n")
+        return text.getvalue().encode()
+
+    def save_one_by_one(self, seller, rows):
+        """
+        What importing without the bulk path costs: one save per product,
+        each running its post_save signals
+        """
+        categories = {}
+        start = time.perf_counter()
+        for row in rows:
+            if row["category"] not in categories:
+                categories[row["category"]], _ = ProductCategory.objects.get_or_create(
+                    name=row["category"]
+                )
+            Product.objects.create(
+                seller=seller,
+                category=categories[row["category"]],
+                name=row["name"],
+                desc=row["desc"],
+                price=row["price"],
+                quantity=row["quantity"],
+            )
+        return len(rows), time.perf_counter() - start
+
+    def write_result(self, method, count, elapsed):
+        rows_per_minute = round(count / elapsed * 60) if elapsed else 0
+        self.stdout.write(
+            f"{method:<12} {count:>8} {elapsed:>9.2f} {rows_per_minute:>10}"
+        )
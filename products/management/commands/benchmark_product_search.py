@@ -0,0 +1,139 @@
+import random
+import statistics
+import string
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from products.models import Product, ProductCategory
+
+User = get_user_model()
+
+BENCHMARK_CATEGORY = "Search Benchmark"
+WORDS = (
+    "leather cotton wireless organic steel wooden vintage classic portable smart "
+    "bamboo ceramic waterproof handmade premium compact solar silk carbon glass "
+    "shoes jacket speaker lamp table chair bottle watch backpack phone charger "
+    "headphones blanket mug knife sofa camera bicycle guitar keyboard mirror"
+).split()
+# Pad the vocabulary with filler tokens so each real word matches a realistic,
+# small fraction of the catalog
+_filler = random.Random(0)
+VOCABULARY = WORDS + [
+    "".join(_filler.choices(string.ascii_lowercase, k=7)) for _ in range(20000)
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare full-text product search latency against the name__icontains "
+        "lookup used by the dashboard, optionally seeding synthetic products first"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Create this many synthetic products before benchmarking",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--query",
+            action="append",
+            dest="queries",
+            help="Search term to benchmark, can be repeated",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument(
+            "--cleanup",
+            action="store_true",
+            help="Delete the synthetic products and exit",
+        )
+
+    def handle(self, *args, **options):
+        if options["cleanup"]:
+            deleted, _ = Product.objects.filter(
+                category__name=BENCHMARK_CATEGORY
+            ).delete()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} rows."))
+            return
+
+        if options["seed"]:
+            self.seed(options["seed"], options["batch_size"])
+
+        total = Product.objects.count()
+        queries = options["queries"] or ["wireless", "leather jacket", "ceramic mug"]
+        self.stdout.write(
+            f"Benchmarking against {total} products, {options['repeat']} runs each"
+        )
+        self.stdout.write(
+            f"{'query':<20} {'icontains p50 ms':>18} {'search p50 ms':>16} {'speedup':>8}"
+        )
+
+        for query in queries:
+            icontains = self.measure(
+                lambda: Product.objects.filter(name__icontains=query),
+                options["repeat"],
+                options["page_size"],
+            )
+            search = self.measure(
+                lambda: Product.objects.search(query),
+                options["repeat"],
+                options["page_size"],
+            )
+            speedup = icontains / search if search else float("inf")
+            self.stdout.write(
+                f"{query:<20} {icontains:>18.2f} {search:>16.2f} {speedup:>7.1f}x"
+            )
+
+    def measure(self, get_queryset, repeat, page_size):
+        """
+        Median time in milliseconds to fetch the first page and the total count,
+        which is what a paginated endpoint does per request
+        """
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset = get_queryset()
+            queryset.count()
+            list(queryset.values_list("id", flat=True)[:page_size])
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def seed(self, count, batch_size):
+        seller = User.objects.filter(is_superuser=True).first() or User.objects.first()
+        if seller is None:
+            raise CommandError("Create a user before seeding benchmark products.")
+        category, _ = ProductCategory.objects.get_or_create(name=BENCHMARK_CATEGORY)
+
+        start = time.perf_counter()
+        created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            products = [
+                Product(
+                    seller=seller,
+                    category=category,
+                    name=" ".join(random.sample(VOCABULARY, 3)),
+                    desc=" ".join(random.choices(VOCABULARY, k=25)),
+                    price=random.randint(100, 100000) / 100,
+                    quantity=random.randint(0, 50),
+                )
+                for _ in range(size)
+            ]
+            with transaction.atomic():
+                new_products = Product.objects.bulk_create(products)
+                Product.objects.filter(
+                    pk__in=[product.pk for product in new_products]
+                ).update_search_vector()
+            created += size
+            self.stdout.write(f"Seeded {created}/{count} products", ending="\r")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"\nSeeded {count} products in {elapsed:.1f}s")
+        )
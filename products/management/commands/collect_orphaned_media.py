@@ -0,0 +1,25 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from products.garbage import collect_media_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete ImageKit files, local media files and abandoned chunked uploads "
+        "that no product media refers to"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report what would be deleted only"
+        )
+
+    def handle(self, *args, **options):
+        report = collect_media_garbage(dry_run=options["dry_run"])
+        self.stdout.write(json.dumps(report, indent=2))
+        verb = "Would reclaim" if options["dry_run"] else "Reclaimed"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {report['reclaimed_bytes'] / 1e6:.2f} MB.")
+        )
@@ -0,0 +1,53 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import IMPORT_FORMATS, ProductImporter, detect_format
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Stream products from a CSV or JSON Lines file into the catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file to import")
+        parser.add_argument(
+            "--seller", required=True, help="Email or id of the seller to import for"
+        )
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            help="File format, detected from the extension by default",
+        )
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        seller_lookup = options["seller"]
+        sellers = User.objects.filter(email=seller_lookup)
+        if seller_lookup.isdigit():
+            sellers = User.objects.filter(pk=seller_lookup)
+        seller = sellers.first()
+        if seller is None:
+            raise CommandError(f"Seller {seller_lookup!r} does not exist.")
+
+        file_format = options["format"] or detect_format(options["path"])
+        importer = ProductImporter(seller, batch_size=options["batch_size"])
+        try:
+            with open(options["path"], "rb") as stream:
+                report = importer.run(stream, file_format)
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in report["errors"]:
+            self.stdout.write(
+                self.style.WARNING(f"Row {error['row']}: {json.dumps(error['errors'])}")
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report['created']} products, {report['failed']} rows failed "
+                f"in {report['elapsed_seconds']}s ({report['rows_per_minute']} rows/min)."
+            )
+        )
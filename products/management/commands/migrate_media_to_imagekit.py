@@ -1,26 +1,162 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from config.uploadhandlers import content_sha256
 from products.models import Product, ProductImage, ProductVideo
+from products.uploads import ImageKitUploader, pending_media, upload_media
 
 
 class Command(BaseCommand):
-    help = "Migrate existing Product.image and Product.video fields to ProductImage/ProductVideo models"
+    help = (
+        "Migrate existing Product.image and Product.video fields to ProductImage/ProductVideo "
+        "models and upload them to ImageKit. Safe to rerun: products whose media was "
+        "migrated already are skipped, and an interrupted run resumes from its checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=settings.IMAGEKIT_UPLOAD_CONCURRENCY
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=200,
+            help="Products fetched and migrated at a time",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default="migrate_media_to_imagekit.checkpoint",
+            help="File recording the last migrated product id",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint and start over",
+        )
 
     def handle(self, *args, **options):
-        migrated_images = 0
-        migrated_videos = 0
-        for product in Product.objects.all():
-            if product.image:
-                # Create ProductImage pointing to the same file
-                try:
-                    ProductImage.objects.create(product=product, file_local=product.image, is_primary=True)
-                    migrated_images += 1
-                except Exception:
-                    self.stdout.write(self.style.WARNING(f"Failed to migrate image for Product id={product.id}"))
-            if product.video:
-                try:
-                    ProductVideo.objects.create(product=product, file_local=product.video, is_primary=True)
-                    migrated_videos += 1
-                except Exception:
-                    self.stdout.write(self.style.WARNING(f"Failed to migrate video for Product id={product.id}"))
-
-        self.stdout.write(self.style.SUCCESS(f"Migrated {migrated_images} images and {migrated_videos} videos to ImageKit model instances."))
+        checkpoint = options["checkpoint"]
+        last_pk = 0 if options["restart"] else self.read_checkpoint(checkpoint)
+        if last_pk:
+            self.stdout.write(f"Resuming after product id={last_pk}")
+
+        products = (
+            Product.objects.filter(pk__gt=last_pk)
+            .filter(
+                (Q(image__isnull=False) & ~Q(image=""))
+                | (Q(video__isnull=False) & ~Q(video=""))
+            )
+            .only("pk", "image", "video")
+            .order_by("pk")
+        )
+
+        self.stats = {"files": 0, "bytes": 0, "skipped": 0, "failed": 0}
+        self.start = time.perf_counter()
+        chunk = []
+        with ImageKitUploader(concurrency=options["workers"]) as uploader:
+            for product in products.iterator(chunk_size=options["chunk_size"]):
+                chunk.append(product)
+                if len(chunk) >= options["chunk_size"]:
+                    self.migrate(chunk, uploader, options["workers"])
+                    self.write_checkpoint(checkpoint, chunk[-1].pk)
+                    chunk = []
+            if chunk:
+                self.migrate(chunk, uploader, options["workers"])
+                self.write_checkpoint(checkpoint, chunk[-1].pk)
+
+        self.stdout.write(self.style.SUCCESS(f"Done. {self.progress()}"))
+        if self.stats["failed"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{self.stats['failed']} uploads failed, they stay pending for the upload worker."
+                )
+            )
+
+    def migrate(self, products, uploader, workers):
+        for model, field in ((ProductImage, "image"), (ProductVideo, "video")):
+            files = [
+                (product, getattr(product, field))
+                for product in products
+                if getattr(product, field)
+            ]
+            if not files:
+                continue
+
+            # Hash the files concurrently, a missing file has nothing left to migrate
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                hashes = list(executor.map(lambda item: self.hash_file(item[1]), files))
+            migrated = set(
+                model.objects.filter(
+                    product__in=[product for product, _file in files],
+                    content_hash__in=[
+                        content_hash for content_hash in hashes if content_hash
+                    ],
+                ).values_list("product_id", "content_hash")
+            )
+
+            new_media = []
+            for (product, file), content_hash in zip(files, hashes):
+                if not content_hash or (product.pk, content_hash) in migrated:
+                    self.stats["skipped"] += 1
+                    continue
+                new_media.append(
+                    model(
+                        product=product,
+                        file_local=file.name,
+                        content_hash=content_hash,
+                        is_primary=True,
+                    )
+                )
+                self.stats["bytes"] += file.size
+            if not new_media:
+                continue
+
+            # Created without `save` so no per-row upload is scheduled
+            media_ids = [media.pk for media in model.objects.bulk_create(new_media)]
+            while True:
+                report = upload_media(model, media_ids=media_ids, uploader=uploader)
+                self.stats["files"] += report["uploaded"]
+                if not report["uploaded"]:
+                    break
+            self.stats["failed"] += (
+                pending_media(model).filter(pk__in=media_ids).count()
+            )
+
+        self.stdout.write(
+            f"Migrated up to product id={products[-1].pk}: {self.progress()}"
+        )
+
+    def hash_file(self, file):
+        try:
+            return content_sha256(file)
+        except OSError:
+            return ""
+        finally:
+            file.close()
+
+    def progress(self):
+        elapsed = time.perf_counter() - self.start
+        return (
+            f"{self.stats['files']} files, {self.stats['bytes'] / 1e6:.1f} MB, "
+            f"{self.stats['skipped']} skipped in {elapsed:.1f}s "
+            f"({self.stats['files'] / elapsed:.1f} files/s, "
+            f"{self.stats['bytes'] / 1e6 / elapsed:.2f} MB/s)"
+        )
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return int(checkpoint.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def write_checkpoint(self, path, pk):
+        partial_path = f"{path}.part"
+        with open(partial_path, "w") as checkpoint:
+            checkpoint.write(str(pk))
+        os.replace(partial_path, path)
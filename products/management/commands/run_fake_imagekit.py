@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from products.fake_imagekit import FakeImageKitServer
+
+
+class Command(BaseCommand):
+    help = "Serve a fake ImageKit upload API for local development"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--latency", type=float, default=0.05, help="Seconds to wait per upload"
+        )
+
+    def handle(self, *args, **options):
+        server = FakeImageKitServer(
+            options["host"], options["port"], options["latency"]
+        )
+        self.stdout.write(
+            f"Fake ImageKit listening on {server.url}, "
+            f"set IMAGEKIT_UPLOAD_API_URL={server.url} to use it"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
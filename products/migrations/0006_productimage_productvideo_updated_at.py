@@ -0,0 +1,22 @@
+# Generated by hand
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_created_at_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.0.4 on 2026-10-17 23:41
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+BATCH_SIZE = 10000
+
+
+def backfill_search_vector(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductCategory = apps.get_model('products', 'ProductCategory')
+
+    search_config = settings.PRODUCT_SEARCH_CONFIG
+    category_name = models.Subquery(
+        ProductCategory.objects.filter(pk=models.OuterRef('category_id')).values('name')[:1]
+    )
+    vector = (
+        SearchVector('name', weight='A', config=search_config)
+        + SearchVector('desc', weight='B', config=search_config)
+        + SearchVector(category_name, weight='C', config=search_config)
+    )
+
+    # Update in primary key ranges to keep each statement's locks short
+    last_id = 0
+    while True:
+        ids = list(
+            Product.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:BATCH_SIZE]
+        )
+        if not ids:
+            break
+        Product.objects.filter(id__gte=ids[0], id__lte=ids[-1]).update(search_vector=vector)
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_productimage_productvideo_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+        ),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.0.4 on 2026-10-17 23:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def backfill_product_cards(apps, schema_editor):
+    """
+    Fill cards for existing products. Thumbnails use the untransformed image URL;
+    run `manage.py refresh_product_cards` to apply the ImageKit transformation.
+    """
+    Product = apps.get_model('products', 'Product')
+    ProductCard = apps.get_model('products', 'ProductCard')
+    ProductImage = apps.get_model('products', 'ProductImage')
+
+    products = (
+        Product.objects.select_related('seller', 'category')
+        .order_by('pk')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for product in products:
+        thumbnail = (
+            ProductImage.objects.filter(product_id=product.pk)
+            .exclude(url__isnull=True)
+            .exclude(url='')
+            .order_by('-is_primary', 'order', '-created_at')
+            .values_list('url', flat=True)
+            .first()
+        )
+        seller_name = f"{product.seller.first_name} {product.seller.last_name}".strip()
+        batch.append(
+            ProductCard(
+                product_id=product.pk,
+                name=product.name,
+                price=product.price,
+                in_stock=product.quantity > 0,
+                category_name=product.category.name,
+                seller_name=seller_name,
+                thumbnail_url=thumbnail,
+                created_at=product.created_at,
+            )
+        )
+        if len(batch) == BATCH_SIZE:
+            ProductCard.objects.bulk_create(batch)
+            batch = []
+    ProductCard.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='products.product')),
+                ('name', models.CharField(max_length=200)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('in_stock', models.BooleanField()),
+                ('category_name', models.CharField(max_length=100)),
+                ('seller_name', models.CharField(blank=True, max_length=300)),
+                ('thumbnail_url', models.URLField(blank=True, max_length=600, null=True)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(fields=['-created_at', 'product'], name='productcard_created_at_idx'),
+        ),
+        migrations.RunPython(backfill_product_cards, migrations.RunPython.noop),
+    ]
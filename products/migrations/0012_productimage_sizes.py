@@ -0,0 +1,23 @@
+# Generated by Django 4.0.4 on 2026-10-18 00:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_productvideoupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='original_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='size',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
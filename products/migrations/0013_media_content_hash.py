@@ -0,0 +1,31 @@
+# Generated by Django 4.0.4 on 2026-10-18 00:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_productimage_sizes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(condition=models.Q(('content_hash', ''), _negated=True), fields=['content_hash'], name='productimage_content_hash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvideo',
+            index=models.Index(condition=models.Q(('content_hash', ''), _negated=True), fields=['content_hash'], name='productvideo_content_hash_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.0.4 on 2026-10-18 00:11
+
+from django.db import migrations, models
+
+
+def mark_uploaded_media(apps, schema_editor):
+    # Rows that already have an ImageKit URL were uploaded before the status existed
+    for model_name in ('ProductImage', 'ProductVideo'):
+        model = apps.get_model('products', model_name)
+        model.objects.exclude(url__isnull=True).exclude(url='').update(upload_status='uploaded')
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_media_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='next_upload_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='upload_attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='upload_error',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='upload_status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('uploaded', 'Uploaded'), ('failed', 'Failed')], default='queued', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='next_upload_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='upload_attempts',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='upload_error',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='upload_status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('uploaded', 'Uploaded'), ('failed', 'Failed')], default='queued', editable=False, max_length=10),
+        ),
+        migrations.RunPython(mark_uploaded_media, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='productimage',
+            index=models.Index(condition=models.Q(('upload_status__in', ['queued', 'processing'])), fields=['upload_status', 'next_upload_at'], name='productimage_upload_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productvideo',
+            index=models.Index(condition=models.Q(('upload_status__in', ['queued', 'processing'])), fields=['upload_status', 'next_upload_at'], name='productvideo_upload_queue_idx'),
+        ),
+    ]
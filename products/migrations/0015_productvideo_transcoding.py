@@ -0,0 +1,59 @@
+# Generated by Django 4.0.4 on 2026-10-18 00:15
+
+from django.db import migrations, models
+
+
+def skip_existing_videos(apps, schema_editor):
+    # Uploaded originals were deleted, there is nothing left to transcode
+    ProductVideo = apps.get_model('products', 'ProductVideo')
+    ProductVideo.objects.filter(upload_status='uploaded').update(transcode_status='skipped')
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_media_upload_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvideo',
+            name='duration',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='mp4_file_id',
+            field=models.CharField(blank=True, editable=False, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='mp4_url',
+            field=models.URLField(blank=True, editable=False, max_length=600, null=True),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='poster_file_id',
+            field=models.CharField(blank=True, editable=False, max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='poster_url',
+            field=models.URLField(blank=True, editable=False, max_length=600, null=True),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='transcode_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed'), ('skipped', 'Skipped')], default='pending', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='productvideo',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(skip_existing_videos, migrations.RunPython.noop),
+    ]
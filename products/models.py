@@ -1,23 +1,53 @@
+import logging
+import os
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchVectorField,
+)
+from django.db import connections, models, transaction
+from django.db.models import F, OuterRef, Prefetch, Subquery
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from django.conf import settings
-from django.urls import reverse
-import os
+
+from config.imagekit import transformed_url
+from config.uploadhandlers import content_sha256
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
 
 def category_image_path(instance, filename):
     return f"product/category/icons/{instance.name}/{filename}"
 
 
 def product_image_path(instance, filename):
-    return f"product/images/{instance.name}/{filename}"
+    # Shared by `Product.image` and `ProductImage.file_local`
+    owner = getattr(instance, "product", instance)
+    return f"product/images/{owner.name}/{filename}"
 
 
 def product_video_path(instance, filename):
-    return f"product/videos/{instance.name}/{filename}"
+    owner = getattr(instance, "product", instance)
+    return f"product/videos/{owner.name}/{filename}"
+
+
+def get_content_hash(file_obj):
+    try:
+        return content_sha256(file_obj)
+    except OSError:
+        # The local file is gone, e.g. already uploaded and deleted
+        return ""
+
 
 class ProductCategory(models.Model):
     name = models.CharField(_("Category name"), max_length=100)
@@ -38,6 +68,48 @@ def get_default_product_category():
     return ProductCategory.objects.get_or_create(name="Others")[0]
 
 
+def product_search_vector(category_name):
+    """
+    Weighted search document of a product: name, description, category name
+    """
+    search_config = settings.PRODUCT_SEARCH_CONFIG
+    return (
+        SearchVector("name", weight="A", config=search_config)
+        + SearchVector("desc", weight="B", config=search_config)
+        + SearchVector(category_name, weight="C", config=search_config)
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    def update_search_vector(self):
+        """
+        Recompute the stored `search_vector` of every product in the queryset
+        with a single UPDATE.
+        """
+        # `to_tsvector` is PostgreSQL only, other backends have no vectors to keep
+        if connections[self.db].vendor != "postgresql":
+            return 0
+        category_name = Subquery(
+            ProductCategory.objects.filter(pk=OuterRef("category_id")).values("name")[
+                :1
+            ]
+        )
+        return self.update(search_vector=product_search_vector(category_name))
+
+    def search(self, query):
+        """
+        Products matching a web-search style `query`, best matches first
+        """
+        search_query = SearchQuery(
+            query, search_type="websearch", config=settings.PRODUCT_SEARCH_CONFIG
+        )
+        return (
+            self.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .order_by("-rank", "-created_at", "id")
+        )
+
+
 class Product(models.Model):
     seller = models.ForeignKey(User, related_name="products", on_delete=models.CASCADE)
     category = models.ForeignKey(
@@ -53,31 +125,179 @@ class Product(models.Model):
     video = models.FileField(upload_to=product_video_path, blank=True, null=True)
     price = models.DecimalField(decimal_places=2, max_digits=10)
     quantity = models.IntegerField(default=1)
+    # Maintained by `products.signals`, see `ProductQuerySet.update_search_vector`
+    search_vector = SearchVectorField(null=True, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(
+                fields=["-created_at", "id"], name="product_created_at_id_idx"
+            ),
+            models.Index(
+                fields=["category", "-created_at"], name="product_category_created_idx"
+            ),
+            models.Index(
+                fields=["seller", "-created_at"], name="product_seller_created_idx"
+            ),
+            # Keyset pages of `?ordering=price` break ties on the id
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(
+                fields=["-created_at"],
+                condition=models.Q(quantity__gt=0),
+                name="product_in_stock_created_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class ProductImage(models.Model):
+class ProductMediaQuerySet(models.QuerySet):
+    def transformed_urls(self, width=None, height=None, quality=None):
+        """
+        Map of pk to transformed URL for every uploaded file in the queryset,
+        fetched with one query and built through the shared URL cache.
+        """
+        rows = self.exclude(url__isnull=True).exclude(url="").values_list("pk", "url")
+        return {
+            pk: transformed_url(url, width=width, height=height, quality=quality)
+            for pk, url in rows
+        }
+
+    def uploaded_by_hash(self, hashes):
+        """
+        Map of content hash to the `{"url", "fileId"}` of an already uploaded
+        file with that content, for the given hashes.
+        """
+        rows = (
+            self.filter(content_hash__in=[h for h in hashes if h])
+            .exclude(url__isnull=True)
+            .exclude(url="")
+            .values_list("content_hash", "url", "file_id")
+        )
+        return {h: {"url": url, "fileId": file_id} for h, url, file_id in rows}
+
+
+def get_upload_retry_delay(attempts):
+    """
+    Seconds to wait before upload attempt number `attempts + 1`, doubling
+    with every failure up to `IMAGEKIT_UPLOAD_RETRY_MAX_DELAY`. The jitter
+    keeps a batch that failed together from retrying together.
+    """
+    delay = settings.IMAGEKIT_UPLOAD_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+    return min(delay, settings.IMAGEKIT_UPLOAD_RETRY_MAX_DELAY) * random.uniform(
+        0.8, 1.2
+    )
+
+
+class UploadStatus(models.TextChoices):
+    QUEUED = "queued", _("Queued")
+    PROCESSING = "processing", _("Processing")
+    UPLOADED = "uploaded", _("Uploaded")
+    FAILED = "failed", _("Failed")
+
+
+class TranscodeStatus(models.TextChoices):
+    PENDING = "pending", _("Pending")
+    PROCESSING = "processing", _("Processing")
+    DONE = "done", _("Done")
+    FAILED = "failed", _("Failed")
+    # Transcoding is disabled or ffmpeg isn't installed
+    SKIPPED = "skipped", _("Skipped")
+
+
+class MediaUploadState(models.Model):
+    """Where a media file is in its way to ImageKit.
+
+    Rows start `queued`, the upload worker moves them to `processing` while it
+    uploads their batch, and then to `uploaded`. A failed attempt queues the
+    row again with an exponential backoff until `IMAGEKIT_UPLOAD_MAX_ATTEMPTS`
+    is reached, after which it is `failed` for good.
+    """
+
+    upload_status = models.CharField(
+        max_length=10,
+        choices=UploadStatus.choices,
+        default=UploadStatus.QUEUED,
+        editable=False,
+    )
+    upload_attempts = models.PositiveSmallIntegerField(default=0, editable=False)
+    upload_error = models.CharField(
+        max_length=500, blank=True, default="", editable=False
+    )
+    # When a queued row may be retried, null when it is due right away
+    next_upload_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def mark_uploaded(self):
+        self.upload_status = UploadStatus.UPLOADED
+        self.upload_error = ""
+        self.next_upload_at = None
+
+    def record_upload_failure(self, error):
+        self.upload_attempts += 1
+        self.upload_error = str(error)[:500]
+        if self.upload_attempts >= settings.IMAGEKIT_UPLOAD_MAX_ATTEMPTS:
+            self.upload_status = UploadStatus.FAILED
+            self.next_upload_at = None
+        else:
+            self.upload_status = UploadStatus.QUEUED
+            self.next_upload_at = timezone.now() + timedelta(
+                seconds=get_upload_retry_delay(self.upload_attempts)
+            )
+
+
+class ProductImage(MediaUploadState):
     """Images for products. Uses a local temporary file field for uploads (`file_local`),
     then uploads the file to ImageKit in `save` and stores the final URL and fileId.
     """
-    product = models.ForeignKey(Product, related_name="images", on_delete=models.CASCADE)
+
+    product = models.ForeignKey(
+        Product, related_name="images", on_delete=models.CASCADE
+    )
     file_local = models.ImageField(upload_to=product_image_path, blank=True, null=True)
     url = models.URLField(max_length=600, blank=True, null=True)
     file_id = models.CharField(max_length=200, blank=True, null=True)
     is_primary = models.BooleanField(default=False)
     order = models.PositiveIntegerField(default=0)
+    # Named, right-sized renditions computed once the upload completes,
+    # see `build_variants`
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+    # SHA-256 of the uploaded bytes, identical files share one ImageKit upload
+    content_hash = models.CharField(
+        max_length=64, blank=True, default="", editable=False
+    )
+    # Bytes before and after `products.image_processing` normalized the file
+    original_size = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    size = models.PositiveIntegerField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductMediaQuerySet.as_manager()
 
     class Meta:
         ordering = ["order", "-created_at"]
+        indexes = [
+            models.Index(
+                fields=["content_hash"],
+                name="productimage_content_hash_idx",
+                condition=~models.Q(content_hash=""),
+            ),
+            models.Index(
+                fields=["upload_status", "next_upload_at"],
+                name="productimage_upload_queue_idx",
+                condition=models.Q(upload_status__in=["queued", "processing"]),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - image {self.pk or ''}"
@@ -87,89 +307,170 @@ class ProductImage(models.Model):
         Deletes the local file afterwards to avoid storing files locally in production.
         """
         # Async upload via Celery if enabled
+        # The local file name is kept after its upload, the status tells them apart
         has_local = bool(self.file_local and getattr(self.file_local, "name", None))
+        has_local = has_local and self.upload_status != UploadStatus.UPLOADED
+        if has_local and not self.content_hash:
+            self.content_hash = get_content_hash(self.file_local)
         try:
             from django.conf import settings as _settings
+
             async_upload = getattr(_settings, "IMAGEKIT_UPLOAD_ASYNC", True)
         except Exception:
             async_upload = True
 
         if has_local and async_upload:
-            # Schedule Celery task instead of uploading immediately
-            try:
-                from products.tasks import upload_product_image_to_imagekit
-                # Save first to ensure file is on disk and we have pk
-                super().save(*args, **kwargs)
-                upload_product_image_to_imagekit.delay(self.pk)
-                return
-            except Exception:
-                # Fall through and do synchronous behavior on failure
-                pass
+            from products.tasks import schedule_pending_uploads
+
+            # Save first to ensure file is on disk and we have pk
+            super().save(*args, **kwargs)
+            # Picked up by the next batch of the upload worker
+            transaction.on_commit(schedule_pending_uploads)
+            return
 
         # If async disabled or scheduling failed, perform upload synchronously
         try:
             from config.imagekit import imagekit
         except Exception:
             imagekit = None
+        reused = None
         if has_local and imagekit:
+            reused = ProductImage.objects.uploaded_by_hash([self.content_hash]).get(
+                self.content_hash
+            )
+        if reused:
+            # The same bytes are on ImageKit already
+            self.apply_upload_result(reused)
+            if not self.file_local._committed:
+                self.file_local = None
+        elif has_local and imagekit:
             try:
+                from products.image_processing import normalize_images
+
+                if not self.file_local._committed:
+                    # Normalization works on the stored file
+                    self.file_local.save(
+                        self.file_local.name, self.file_local.file, save=False
+                    )
+                normalize_images([self], use_pool=False)
                 file_obj = self.file_local
                 file_obj.open()
                 filename = os.path.basename(file_obj.name)
-                folder = f"/products/{self.product.id}/images" if self.product_id else "/products/images"
-                result = imagekit.upload_file(file=file_obj, file_name=filename, options={"folder": folder})
+                folder = (
+                    f"/products/{self.product.id}/images"
+                    if self.product_id
+                    else "/products/images"
+                )
+                result = imagekit.upload_file(
+                    file=file_obj, file_name=filename, options={"folder": folder}
+                )
                 raw = getattr(result, "response_metadata", None)
                 raw = getattr(raw, "raw", {}) if raw else {}
-                self.url = raw.get("url") or raw.get("filePath")
-                self.file_id = raw.get("fileId")
+                if not (raw.get("url") or raw.get("filePath")):
+                    raise ValueError(f"ImageKit returned no file URL: {raw}")
+                self.apply_upload_result(raw)
                 try:
                     file_path = os.path.join(settings.MEDIA_ROOT, file_obj.name)
                     if os.path.exists(file_path):
                         os.remove(file_path)
                 except Exception:
                     pass
-            except Exception:
-                pass
+            except Exception as exc:
+                # Left queued for the upload worker to retry after a backoff
+                logger.exception(
+                    "Uploading image of product %s failed", self.product_id
+                )
+                self.record_upload_failure(exc)
 
         super().save(*args, **kwargs)
+        if self.upload_status == UploadStatus.QUEUED and has_local and imagekit:
+            from products.tasks import schedule_pending_uploads
 
-    def get_transformed_url(self, width=None, height=None, quality=None):
-        try:
-            from config.imagekit import imagekit
-        except Exception:
-            imagekit = None
+            transaction.on_commit(schedule_pending_uploads)
+
+    def apply_upload_result(self, raw):
+        """Store the URL and fileId from an ImageKit upload response and
+        precompute the responsive variants for the new URL.
+        """
+        self.url = raw.get("url") or raw.get("filePath")
+        self.file_id = raw.get("fileId")
+        self.variants = self.build_variants()
+        self.mark_uploaded()
 
+    def build_variants(self):
+        """Transformed URL and width of each `PRODUCT_IMAGE_VARIANTS` entry."""
         if not self.url:
-            return None
-        if not imagekit:
-            return self.url
+            return {}
+        quality = settings.PRODUCT_IMAGE_VARIANT_QUALITY
+        return {
+            name: {
+                "url": transformed_url(self.url, width=width, quality=quality),
+                "width": width,
+            }
+            for name, width in settings.PRODUCT_IMAGE_VARIANTS.items()
+        }
+
+    def get_variant_url(self, name):
+        variant = (self.variants or self.build_variants()).get(name)
+        return variant["url"] if variant else self.url
 
-        transformation = []
-        if height:
-            transformation.append({"height": str(height)})
-        if width:
-            transformation.append({"width": str(width)})
-        if quality:
-            transformation.append({"quality": str(quality)})
+    def get_transformed_url(self, width=None, height=None, quality=None):
+        if not self.url:
+            return None
+        return transformed_url(self.url, width=width, height=height, quality=quality)
 
-        if transformation:
-            return imagekit.url({"src": self.url, "transformation": transformation})
-        return self.url
 
+class ProductVideo(MediaUploadState):
+    """Videos for products. Similar behavior to `ProductImage`."""
 
-class ProductVideo(models.Model):
-    """Videos for products. Similar behavior to `ProductImage`.
-    """
-    product = models.ForeignKey(Product, related_name="videos", on_delete=models.CASCADE)
+    product = models.ForeignKey(
+        Product, related_name="videos", on_delete=models.CASCADE
+    )
     file_local = models.FileField(upload_to=product_video_path, blank=True, null=True)
     url = models.URLField(max_length=600, blank=True, null=True)
     file_id = models.CharField(max_length=200, blank=True, null=True)
     is_primary = models.BooleanField(default=False)
     order = models.PositiveIntegerField(default=0)
+    content_hash = models.CharField(
+        max_length=64, blank=True, default="", editable=False
+    )
+    # Web-optimized MP4 and poster frame made by `products.video_processing`
+    transcode_status = models.CharField(
+        max_length=10,
+        choices=TranscodeStatus.choices,
+        default=TranscodeStatus.PENDING,
+        editable=False,
+    )
+    mp4_url = models.URLField(max_length=600, blank=True, null=True, editable=False)
+    mp4_file_id = models.CharField(
+        max_length=200, blank=True, null=True, editable=False
+    )
+    poster_url = models.URLField(max_length=600, blank=True, null=True, editable=False)
+    poster_file_id = models.CharField(
+        max_length=200, blank=True, null=True, editable=False
+    )
+    duration = models.FloatField(null=True, blank=True, editable=False)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductMediaQuerySet.as_manager()
 
     class Meta:
         ordering = ["order", "-created_at"]
+        indexes = [
+            models.Index(
+                fields=["content_hash"],
+                name="productvideo_content_hash_idx",
+                condition=~models.Q(content_hash=""),
+            ),
+            models.Index(
+                fields=["upload_status", "next_upload_at"],
+                name="productvideo_upload_queue_idx",
+                condition=models.Q(upload_status__in=["queued", "processing"]),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - video {self.pk or ''}"
@@ -177,64 +478,237 @@ class ProductVideo(models.Model):
     def save(self, *args, **kwargs):
         try:
             from django.conf import settings as _settings
+
             async_upload = getattr(_settings, "IMAGEKIT_UPLOAD_ASYNC", True)
         except Exception:
             async_upload = True
+        # The local file name is kept after its upload, the status tells them apart
         has_local = bool(self.file_local and getattr(self.file_local, "name", None))
+        has_local = has_local and self.upload_status != UploadStatus.UPLOADED
+        if has_local and not self.content_hash:
+            self.content_hash = get_content_hash(self.file_local)
+        if (
+            not settings.VIDEO_TRANSCODE_ENABLED
+            and self.transcode_status == TranscodeStatus.PENDING
+        ):
+            self.transcode_status = TranscodeStatus.SKIPPED
         if has_local and async_upload:
-            try:
-                from products.tasks import upload_product_video_to_imagekit
-                super().save(*args, **kwargs)
-                upload_product_video_to_imagekit.delay(self.pk)
-                return
-            except Exception:
-                pass
+            from products.tasks import schedule_pending_uploads
+
+            super().save(*args, **kwargs)
+            transaction.on_commit(schedule_pending_uploads)
+            return
         try:
             from config.imagekit import imagekit
         except Exception:
             imagekit = None
+        reused = None
         if has_local and imagekit:
+            reused = ProductVideo.objects.uploaded_by_hash([self.content_hash]).get(
+                self.content_hash
+            )
+        if reused:
+            self.apply_upload_result(reused)
+            if not self.file_local._committed:
+                self.file_local = None
+        elif has_local and imagekit:
             try:
+                transcode = self.transcode_status == TranscodeStatus.PENDING
+                if transcode and not self.file_local._committed:
+                    # The transcoding stage works on the stored file
+                    self.file_local.save(
+                        self.file_local.name, self.file_local.file, save=False
+                    )
                 file_obj = self.file_local
                 file_obj.open()
                 filename = os.path.basename(file_obj.name)
-                folder = f"/products/{self.product.id}/videos" if self.product_id else "/products/videos"
-                result = imagekit.upload_file(file=file_obj, file_name=filename, options={"folder": folder})
+                folder = (
+                    f"/products/{self.product.id}/videos"
+                    if self.product_id
+                    else "/products/videos"
+                )
+                result = imagekit.upload_file(
+                    file=file_obj, file_name=filename, options={"folder": folder}
+                )
                 raw = getattr(result, "response_metadata", None)
                 raw = getattr(raw, "raw", {}) if raw else {}
-                self.url = raw.get("url") or raw.get("filePath")
-                self.file_id = raw.get("fileId")
+                if not (raw.get("url") or raw.get("filePath")):
+                    raise ValueError(f"ImageKit returned no file URL: {raw}")
+                self.apply_upload_result(raw)
                 try:
                     file_path = os.path.join(settings.MEDIA_ROOT, file_obj.name)
-                    if os.path.exists(file_path):
+                    if os.path.exists(file_path) and not transcode:
                         os.remove(file_path)
                 except Exception:
                     pass
-            except Exception:
-                pass
+            except Exception as exc:
+                logger.exception(
+                    "Uploading video of product %s failed", self.product_id
+                )
+                self.record_upload_failure(exc)
 
         super().save(*args, **kwargs)
+        if self.upload_status == UploadStatus.QUEUED and has_local and imagekit:
+            from products.tasks import schedule_pending_uploads
+
+            transaction.on_commit(schedule_pending_uploads)
+        elif has_local and self.upload_status == UploadStatus.UPLOADED:
+            if self.transcode_status == TranscodeStatus.PENDING:
+                from products.tasks import schedule_video_transcodes
+
+                transaction.on_commit(lambda: schedule_video_transcodes([self.pk]))
+
+    def apply_upload_result(self, raw):
+        """Store the URL and fileId from an ImageKit upload response."""
+        self.url = raw.get("url") or raw.get("filePath")
+        self.file_id = raw.get("fileId")
+        self.mark_uploaded()
+
+    @property
+    def hls_url(self):
+        """Adaptive bitrate stream of long videos, which ImageKit segments
+        from the web MP4 on request.
+        """
+        if not self.mp4_url or (self.duration or 0) < settings.VIDEO_HLS_MIN_DURATION:
+            return None
+        # No rendition taller than the source
+        renditions = [
+            h for h in settings.VIDEO_HLS_RENDITIONS if h <= (self.height or 0)
+        ]
+        renditions = renditions or settings.VIDEO_HLS_RENDITIONS[:1]
+        return f"{self.mp4_url}/ik-master.m3u8?tr=sr-{'_'.join(map(str, renditions))}"
 
     def get_transformed_url(self, width=None, height=None, quality=None):
-        try:
-            from config.imagekit import imagekit
-        except Exception:
-            imagekit = None
-
         if not self.url:
             return None
-        if not imagekit:
-            return self.url
+        return transformed_url(self.url, width=width, height=height, quality=quality)
+
+
+class ProductCardQuerySet(models.QuerySet):
+    def refresh(self, product_ids):
+        """
+        Rebuild the cards of the given products from their source rows.
+        Products that no longer exist simply lose their card.
+        """
+        product_ids = list(product_ids)
+        primary_images = ProductImage.objects.exclude(url__isnull=True).exclude(url="")
+        products = (
+            Product.objects.filter(pk__in=product_ids)
+            .select_related("seller", "category")
+            .prefetch_related(
+                Prefetch(
+                    "images",
+                    queryset=primary_images.order_by(
+                        "-is_primary", "order", "-created_at"
+                    ),
+                    to_attr="card_images",
+                )
+            )
+        )
+        cards = [ProductCard.from_product(product) for product in products]
+
+        with transaction.atomic():
+            self.filter(product_id__in=product_ids).delete()
+            # A concurrent refresh may have inserted the same card already
+            self.bulk_create(cards, ignore_conflicts=True)
+        return cards
+
+
+class ProductCard(models.Model):
+    """Denormalized, read-only projection of a product for list cards.
+
+    Kept in sync by `products.signals` so the card list endpoint is a single
+    index scan over this table, with no joins.
+    """
+
+    product = models.OneToOneField(
+        Product, primary_key=True, related_name="card", on_delete=models.CASCADE
+    )
+    name = models.CharField(max_length=200)
+    price = models.DecimalField(decimal_places=2, max_digits=10)
+    in_stock = models.BooleanField()
+    category_name = models.CharField(max_length=100)
+    seller_name = models.CharField(max_length=300, blank=True)
+    thumbnail_url = models.URLField(max_length=600, blank=True, null=True)
+    created_at = models.DateTimeField()
+
+    objects = ProductCardQuerySet.as_manager()
+
+    class Meta:
+        ordering = ("-created_at",)
+        indexes = [
+            models.Index(
+                fields=["-created_at", "product"], name="productcard_created_at_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
 
-        transformation = []
-        if height:
-            transformation.append({"height": str(height)})
-        if width:
-            transformation.append({"width": str(width)})
-        if quality:
-            transformation.append({"quality": str(quality)})
+    @classmethod
+    def from_product(cls, product):
+        """
+        Build an unsaved card from a product with `seller` and `category`
+        loaded and its displayable images prefetched into `card_images`.
+        """
+        images = getattr(product, "card_images", None)
+        thumbnail = images[0] if images else None
+        return cls(
+            product=product,
+            name=product.name,
+            price=product.price,
+            in_stock=product.quantity > 0,
+            category_name=product.category.name,
+            seller_name=product.seller.get_full_name(),
+            thumbnail_url=(
+                thumbnail.get_variant_url(settings.PRODUCT_CARD_THUMBNAIL_VARIANT)
+                if thumbnail
+                else None
+            ),
+            created_at=product.created_at,
+        )
+
+
+class ProductVideoUpload(models.Model):
+    """A resumable, chunked upload of a product video.
+
+    Chunks are appended to a partial file on local disk until `offset`
+    reaches `size`. Completing the upload turns the file into a
+    `ProductVideo`, which the ImageKit upload worker then picks up.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(
+        Product, related_name="video_uploads", on_delete=models.CASCADE
+    )
+    uploaded_by = models.ForeignKey(
+        User, related_name="video_uploads", on_delete=models.CASCADE
+    )
+    file_name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    # Hex SHA-256 of the whole file, checked on completion when given
+    sha256 = models.CharField(max_length=64, blank=True)
+    video = models.OneToOneField(
+        ProductVideo,
+        related_name="upload",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"{self.file_name} ({self.offset}/{self.size})"
 
-        if transformation:
-            return imagekit.url({"src": self.url, "transformation": transformation})
-        return self.url
+    @property
+    def is_complete(self):
+        return self.video_id is not None
 
+    @property
+    def partial_path(self):
+        return os.path.join(settings.VIDEO_UPLOAD_TEMP_DIR, f"{self.pk}.part")
@@ -1,6 +1,13 @@
 from rest_framework.permissions import SAFE_METHODS, BasePermission
 
 
+def is_admin(user):
+    """
+    Admins are staff users, like in the permissions of the other apps
+    """
+    return user.is_staff
+
+
 class IsSellerOrAdmin(BasePermission):
     """
     Check if authenticated user is seller of the product or admin
@@ -13,4 +20,4 @@ class IsSellerOrAdmin(BasePermission):
         if request.method in SAFE_METHODS:
             return True
 
-        return obj.seller == request.user or request.user.is_admin
+        return obj.seller == request.user or is_admin(request.user)
@@ -1,6 +1,33 @@
+import os
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
-from products.models import Product, ProductCategory, ProductImage, ProductVideo
+from products.importers import IMPORT_FORMATS
+from products.models import (
+    Product,
+    ProductCard,
+    ProductCategory,
+    ProductImage,
+    ProductVideo,
+    ProductVideoUpload,
+)
+from products.permissions import is_admin
+
+
+class ProductOwnerMixin:
+    """
+    Only let the seller of `product`, or an admin, add media to it
+    """
+
+    product_owner_message = _("You can only upload media to your own products.")
+
+    def validate_product(self, product):
+        user = self.context["request"].user
+        if product.seller != user and not is_admin(user):
+            raise serializers.ValidationError(self.product_owner_message)
+        return product
 
 
 class ProductCategoryReadSerializer(serializers.ModelSerializer):
@@ -25,7 +52,7 @@ class ProductReadSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ("search_vector",)
 
     def get_images(self, obj):
         images = obj.images.all()
@@ -37,31 +64,162 @@ class ProductReadSerializer(serializers.ModelSerializer):
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImage
-        fields = ("id", "url", "file_id", "is_primary", "order")
+        fields = ("id", "url", "file_id", "is_primary", "order", "srcset")
+
+    def get_srcset(self, obj):
+        # Images uploaded before variants existed fall back to building them
+        return obj.variants or obj.build_variants()
 
 
-class ProductImageCreateSerializer(serializers.ModelSerializer):
+class ProductImageCreateSerializer(ProductOwnerMixin, serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    product_owner_message = _("You can only upload images to your own products.")
+
     class Meta:
         model = ProductImage
-        fields = ("id", "file_local", "url", "file_id", "is_primary", "order")
-        read_only_fields = ("url", "file_id")
+        fields = (
+            "id",
+            "product",
+            "file_local",
+            "url",
+            "file_id",
+            "is_primary",
+            "order",
+            "upload_status",
+        )
+        read_only_fields = ("url", "file_id", "upload_status")
 
 
-class ProductVideoCreateSerializer(serializers.ModelSerializer):
+class ProductVideoCreateSerializer(ProductOwnerMixin, serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    product_owner_message = _("You can only upload videos to your own products.")
+
     class Meta:
         model = ProductVideo
-        fields = ("id", "file_local", "url", "file_id", "is_primary", "order")
-        read_only_fields = ("url", "file_id")
+        fields = (
+            "id",
+            "product",
+            "file_local",
+            "url",
+            "file_id",
+            "is_primary",
+            "order",
+            "upload_status",
+        )
+        read_only_fields = ("url", "file_id", "upload_status")
 
 
 class ProductVideoSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductVideo
-        fields = ("id", "url", "file_id", "is_primary", "order")
+        fields = (
+            "id",
+            "url",
+            "file_id",
+            "is_primary",
+            "order",
+            "mp4_url",
+            "hls_url",
+            "poster_url",
+            "duration",
+            "width",
+            "height",
+            "transcode_status",
+        )
+
+
+class ProductImageUploadParamsSerializer(ProductOwnerMixin, serializers.Serializer):
+    """
+    Serializer class for requesting direct ImageKit upload parameters
+    """
+
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+
+    product_owner_message = _("You can only upload images to your own products.")
+
+
+class ProductImageBulkUploadSerializer(ProductImageUploadParamsSerializer):
+    """
+    Serializer class for uploading many images of one product at once.
+    The files themselves are validated one by one by `create_pending_images`.
+    """
+
+    files = serializers.ListField(
+        child=serializers.FileField(),
+        allow_empty=False,
+        max_length=settings.PRODUCT_IMAGE_BULK_MAX_FILES,
+    )
+
+
+class ProductImageConfirmSerializer(serializers.Serializer):
+    """
+    Serializer class for confirming a direct ImageKit upload
+    """
+
+    grant = serializers.CharField()
+    file_id = serializers.CharField(max_length=200)
+    is_primary = serializers.BooleanField(default=False)
+    order = serializers.IntegerField(default=0, min_value=0)
+
+
+class ProductVideoUploadSerializer(ProductOwnerMixin, serializers.ModelSerializer):
+    """
+    Serializer class for starting and inspecting chunked video uploads
+    """
+
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    sha256 = serializers.RegexField(
+        r"^[0-9a-fA-F]{64}$", required=False, allow_blank=True
+    )
+    chunk_size = serializers.SerializerMethodField()
+
+    product_owner_message = _("You can only upload videos to your own products.")
+
+    class Meta:
+        model = ProductVideoUpload
+        fields = (
+            "id",
+            "product",
+            "file_name",
+            "size",
+            "sha256",
+            "offset",
+            "chunk_size",
+            "video",
+            "created_at",
+        )
+        read_only_fields = ("offset", "video")
+
+    def get_chunk_size(self, obj):
+        return settings.VIDEO_UPLOAD_CHUNK_SIZE
+
+    def validate_file_name(self, file_name):
+        return os.path.basename(file_name)
+
+    def validate_size(self, size):
+        if size <= 0:
+            raise serializers.ValidationError(_("The file is empty."))
+        if size > settings.VIDEO_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                _("Videos may be at most %d bytes.") % settings.VIDEO_UPLOAD_MAX_SIZE
+            )
+        return size
+
+    def validate_sha256(self, sha256):
+        return sha256.lower()
+
+
+class ProductImportSerializer(serializers.Serializer):
+    """
+    Serializer class for bulk product import uploads
+    """
+
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=IMPORT_FORMATS, required=False)
 
 
 class ProductWriteSerializer(serializers.ModelSerializer):
@@ -72,8 +230,12 @@ class ProductWriteSerializer(serializers.ModelSerializer):
     seller = serializers.HiddenField(default=serializers.CurrentUserDefault())
     category = ProductCategoryReadSerializer()
 
-    image_files = serializers.ListField(child=serializers.FileField(), write_only=True, required=False)
-    video_files = serializers.ListField(child=serializers.FileField(), write_only=True, required=False)
+    image_files = serializers.ListField(
+        child=serializers.FileField(), write_only=True, required=False
+    )
+    video_files = serializers.ListField(
+        child=serializers.FileField(), write_only=True, required=False
+    )
 
     class Meta:
         model = Product
@@ -91,8 +253,16 @@ class ProductWriteSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         category = validated_data.pop("category")
-        image_files = validated_data.pop("image_files", []) if "image_files" in validated_data else []
-        video_files = validated_data.pop("video_files", []) if "video_files" in validated_data else []
+        image_files = (
+            validated_data.pop("image_files", [])
+            if "image_files" in validated_data
+            else []
+        )
+        video_files = (
+            validated_data.pop("video_files", [])
+            if "video_files" in validated_data
+            else []
+        )
         instance, created = ProductCategory.objects.get_or_create(**category)
         product = Product.objects.create(**validated_data, category=instance)
 
@@ -114,8 +284,16 @@ class ProductWriteSerializer(serializers.ModelSerializer):
             nested_serializer.update(nested_instance, nested_data)
 
         # Handle uploaded files during update
-        image_files = validated_data.pop("image_files", []) if "image_files" in validated_data else []
-        video_files = validated_data.pop("video_files", []) if "video_files" in validated_data else []
+        image_files = (
+            validated_data.pop("image_files", [])
+            if "image_files" in validated_data
+            else []
+        )
+        video_files = (
+            validated_data.pop("video_files", [])
+            if "video_files" in validated_data
+            else []
+        )
 
         instance = super(ProductWriteSerializer, self).update(instance, validated_data)
 
@@ -126,3 +304,24 @@ class ProductWriteSerializer(serializers.ModelSerializer):
             ProductVideo.objects.create(product=instance, file_local=f, order=idx)
 
         return instance
+
+
+class ProductCardSerializer(serializers.ModelSerializer):
+    """
+    Serializer class for the denormalized product cards
+    """
+
+    id = serializers.IntegerField(source="product_id", read_only=True)
+
+    class Meta:
+        model = ProductCard
+        fields = (
+            "id",
+            "name",
+            "price",
+            "in_stock",
+            "category_name",
+            "seller_name",
+            "thumbnail_url",
+            "created_at",
+        )
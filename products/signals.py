@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from products.cache import bump_catalog_version
+from products.models import (
+    Product,
+    ProductCard,
+    ProductCategory,
+    ProductImage,
+    ProductVideo,
+)
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductVideo)
+@receiver(post_delete, sender=ProductVideo)
+def invalidate_catalog_cache(sender, **kwargs):
+    # Bump after commit, otherwise a concurrent read could cache the old rows
+    # under the new version.
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if update_fields and not set(update_fields) & {"name", "desc", "category"}:
+        return
+    Product.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=ProductCategory)
+def update_category_products_search_vector(sender, instance, created, **kwargs):
+    if not created:
+        Product.objects.filter(category=instance).update_search_vector()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def refresh_product_card(sender, instance, **kwargs):
+    product_id = instance.pk if sender is Product else instance.product_id
+
+    def refresh():
+        ProductCard.objects.refresh([product_id])
+        # The version bumped by `invalidate_catalog_cache` may already have
+        # been used to cache the old card
+        bump_catalog_version()
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=ProductCategory)
+def update_product_cards_category_name(sender, instance, created, **kwargs):
+    if not created:
+        ProductCard.objects.filter(product__category=instance).update(
+            category_name=instance.name
+        )
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=ProductVideo)
+def touch_product_on_media_delete(sender, instance, **kwargs):
+    """
+    Removing a media row leaves no newer timestamp behind, so bump the product's
+    `updated_at` to keep its Last-Modified date moving forward.
+    """
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def invalidate_catalog_cache_on_seller_change(sender, instance, created, **kwargs):
+    """
+    Product responses embed the seller's full name. Logins only touch
+    `last_login` and don't need to invalidate anything.
+    """
+    update_fields = kwargs.get("update_fields")
+    if created or (update_fields and set(update_fields) <= {"last_login"}):
+        return
+    Product.objects.filter(seller=instance).update(updated_at=timezone.now())
+    ProductCard.objects.filter(product__seller=instance).update(
+        seller_name=instance.get_full_name()
+    )
+    transaction.on_commit(bump_catalog_version)
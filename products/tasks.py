@@ -1,82 +1,125 @@
+import logging
+
 from celery import shared_task
 from django.conf import settings
-from django.core.files.storage import default_storage
-import os
+from django.core.cache import cache
+from django.utils import timezone
 
-from products.models import ProductImage, ProductVideo
+from products.garbage import collect_media_garbage
+from products.models import (
+    ProductImage,
+    ProductVideo,
+    UploadStatus,
+    get_upload_retry_delay,
+)
+from products.uploads import next_upload_delay, upload_media, upload_pending
+from products.video_processing import fail_transcode, transcode_video
 
-try:
-    from config.imagekit import imagekit
-except Exception:
-    imagekit = None
+logger = logging.getLogger(__name__)
 
+UPLOAD_SCHEDULED_KEY = "imagekit:upload:scheduled"
 
-@shared_task(bind=True)
-def upload_product_image_to_imagekit(self, image_id):
+
+def schedule_pending_uploads(delay=None):
+    """
+    Queue a drain of the pending uploads in `delay` seconds, coalescing the
+    saves of a burst of media into a single `upload_pending_media` run.
+    """
+    delay = max(delay or 0, settings.IMAGEKIT_UPLOAD_DRAIN_DELAY)
+    # The drain clears the key when it starts. The timeout only stops a lost
+    # task from blocking scheduling forever.
+    if not cache.add(UPLOAD_SCHEDULED_KEY, True, timeout=delay + 60):
+        return
     try:
-        img = ProductImage.objects.get(pk=image_id)
-    except ProductImage.DoesNotExist:
-        return None
+        upload_pending_media.apply_async(countdown=delay)
+    except Exception:
+        cache.delete(UPLOAD_SCHEDULED_KEY)
+        logger.exception("Could not schedule the pending media upload")
+
 
-    if not img.file_local:
-        return None
-    if img.url:
-        return None  # Already uploaded
+@shared_task(bind=True)
+def upload_pending_media(self, batch_size=None, max_batches=None):
+    """
+    Upload pending product images and videos to ImageKit in concurrent batches,
+    then schedule the next run for when the earliest retry is due
+    """
+    cache.delete(UPLOAD_SCHEDULED_KEY)
+    report = upload_pending(batch_size=batch_size, max_batches=max_batches)
+    delay = next_upload_delay()
+    if delay is not None:
+        schedule_pending_uploads(delay=delay)
+    return report
 
+
+def upload_one(task, model, media_id):
+    """
+    Upload a single row, retrying the task when the row's backoff is over
+    """
     try:
-        file_obj = img.file_local
-        file_obj.open()
-        filename = os.path.basename(file_obj.name)
-        folder = f"/products/{img.product.id}/images" if img.product_id else "/products/images"
-        if imagekit:
-            result = imagekit.upload_file(file=file_obj, file_name=filename, options={"folder": folder})
-            raw = getattr(result, "response_metadata", None)
-            raw = getattr(raw, "raw", {}) if raw else {}
-            img.url = raw.get("url") or raw.get("filePath")
-            img.file_id = raw.get("fileId")
-            img.save()
-        # delete local file
-        try:
-            file_path = os.path.join(settings.MEDIA_ROOT, file_obj.name)
-            if default_storage.exists(file_obj.name) and os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception:
-            pass
-        return img.url
+        upload_media(model, media_ids=[media_id])
     except Exception as exc:
-        raise self.retry(exc=exc, countdown=10, max_retries=3)
+        raise task.retry(
+            exc=exc,
+            countdown=get_upload_retry_delay(task.request.retries + 1),
+            max_retries=settings.IMAGEKIT_UPLOAD_MAX_ATTEMPTS,
+        )
+    media = (
+        model.objects.filter(pk=media_id)
+        .values("url", "upload_status", "next_upload_at")
+        .first()
+    )
+    if (
+        media
+        and media["upload_status"] == UploadStatus.QUEUED
+        and media["next_upload_at"]
+    ):
+        countdown = max((media["next_upload_at"] - timezone.now()).total_seconds(), 0)
+        raise task.retry(
+            countdown=countdown, max_retries=settings.IMAGEKIT_UPLOAD_MAX_ATTEMPTS
+        )
+    return media["url"] if media else None
+
+
+@shared_task(bind=True)
+def upload_product_image_to_imagekit(self, image_id):
+    return upload_one(self, ProductImage, image_id)
 
 
 @shared_task(bind=True)
 def upload_product_video_to_imagekit(self, video_id):
-    try:
-        vid = ProductVideo.objects.get(pk=video_id)
-    except ProductVideo.DoesNotExist:
-        return None
+    return upload_one(self, ProductVideo, video_id)
 
-    if not vid.file_local:
-        return None
-    if vid.url:
-        return None
 
-    try:
-        file_obj = vid.file_local
-        file_obj.open()
-        filename = os.path.basename(file_obj.name)
-        folder = f"/products/{vid.product.id}/videos" if vid.product_id else "/products/videos"
-        if imagekit:
-            result = imagekit.upload_file(file=file_obj, file_name=filename, options={"folder": folder})
-            raw = getattr(result, "response_metadata", None)
-            raw = getattr(raw, "raw", {}) if raw else {}
-            vid.url = raw.get("url") or raw.get("filePath")
-            vid.file_id = raw.get("fileId")
-            vid.save()
+def schedule_video_transcodes(video_ids):
+    for video_id in video_ids:
         try:
-            file_path = os.path.join(settings.MEDIA_ROOT, file_obj.name)
-            if default_storage.exists(file_obj.name) and os.path.exists(file_path):
-                os.remove(file_path)
+            transcode_product_video.delay(video_id)
         except Exception:
-            pass
-        return vid.url
+            logger.exception("Could not schedule transcoding of video %s", video_id)
+
+
+@shared_task(bind=True)
+def transcode_product_video(self, video_id):
+    """
+    Make the web MP4 and poster frame of an uploaded video
+    """
+    try:
+        return transcode_video(video_id)
     except Exception as exc:
-        raise self.retry(exc=exc, countdown=10, max_retries=3)
+        if self.request.retries >= settings.VIDEO_TRANSCODE_MAX_RETRIES:
+            logger.exception("Giving up transcoding video %s", video_id)
+            fail_transcode(video_id)
+            raise
+        raise self.retry(
+            exc=exc,
+            countdown=get_upload_retry_delay(self.request.retries + 1),
+            max_retries=settings.VIDEO_TRANSCODE_MAX_RETRIES,
+        )
+
+
+@shared_task(bind=True)
+def collect_orphaned_media(self, dry_run=False):
+    """
+    Delete ImageKit files, local media and chunked uploads nothing refers to
+    """
+    return collect_media_garbage(dry_run=dry_run)
@@ -1,12 +1,8 @@
 from django import template
-from django.utils.safestring import mark_safe
 
-register = template.Library()
+from config.imagekit import transformed_url
 
-try:
-    from config.imagekit import imagekit
-except Exception:
-    imagekit = None
+register = template.Library()
 
 
 @register.simple_tag
@@ -20,21 +16,9 @@ def imagekit_url(src=None, width=None, height=None, quality=None, url_endpoint=N
     """
     if not src:
         return ""
-    if not imagekit:
-        return src
     try:
-        transformation = []
-        if width:
-            transformation.append({"width": str(width)})
-        if height:
-            transformation.append({"height": str(height)})
-        if quality:
-            transformation.append({"quality": str(quality)})
-        data = {"src": src}
-        if url_endpoint:
-            data["url_endpoint"] = url_endpoint
-        if transformation:
-            data["transformation"] = transformation
-        return imagekit.url(data)
+        return transformed_url(
+            src, width=width, height=height, quality=quality, url_endpoint=url_endpoint
+        )
     except Exception:
         return src
@@ -0,0 +1,440 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from products.fake_imagekit import FakeImageKitServer
+from products.garbage import MediaGarbageCollector
+from products.models import (
+    Product,
+    ProductCategory,
+    ProductImage,
+    ProductVideo,
+    UploadStatus,
+)
+from products.permissions import IsSellerOrAdmin, is_admin
+from products.serializers import (
+    ProductImageCreateSerializer,
+    ProductVideoCreateSerializer,
+)
+from products.uploads import ImageKitUploader, upload_media
+
+User = get_user_model()
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False)
+class ProductListQueryCountTests(TestCase):
+    """
+    The product list loads sellers, categories, images and videos in a fixed
+    number of queries, whatever the page size
+    """
+
+    # Facets, the page, its images and its videos
+    LIST_QUERIES = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(
+            "seller", "seller@example.com", "password"
+        )
+        cls.category = ProductCategory.objects.create(name="Category")
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_products(self, count):
+        products = Product.objects.bulk_create(
+            Product(
+                seller=self.seller,
+                category=self.category,
+                name=f"Product {index}",
+                desc="Description",
+                price=10,
+                quantity=5,
+            )
+            for index in range(count)
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(
+                product=product, url=f"https://ik.imagekit.io/demo/{product.pk}.jpg"
+            )
+            for product in products
+            for _ in range(2)
+        )
+        ProductVideo.objects.bulk_create(
+            ProductVideo(
+                product=product, url=f"https://ik.imagekit.io/demo/{product.pk}.mp4"
+            )
+            for product in products
+        )
+
+    def assert_list_queries(self, count):
+        self.create_products(count)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get("/api/products/", {"page_size": count})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), count)
+
+    def test_list_1_product(self):
+        self.assert_list_queries(1)
+
+    def test_list_10_products(self):
+        self.assert_list_queries(10)
+
+    def test_list_100_products(self):
+        self.assert_list_queries(100)
+
+
+@override_settings(PRODUCT_IMAGE_NORMALIZE=False, IMAGEKIT_PRIVATE_KEY="private_test")
+class ImageKitUploadWorkerTests(TestCase):
+    """
+    The batched upload worker against a local fake ImageKit server
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeImageKitServer(latency=0.05).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        category = ProductCategory.objects.create(name="Category")
+        cls.product = Product.objects.create(
+            seller=seller,
+            category=category,
+            name="Product",
+            desc="Description",
+            price=10,
+        )
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def create_images(self, count):
+        # Created without `save`, which would upload them right away
+        images = ProductImage.objects.bulk_create(
+            ProductImage(
+                product=self.product,
+                file_local=default_storage.save(
+                    f"product/images/upload_{index}.bin",
+                    ContentFile(b"x" * (index + 1)),
+                ),
+            )
+            for index in range(count)
+        )
+        return [image.pk for image in images]
+
+    def uploader(self, upload_url=None, concurrency=4):
+        uploader = ImageKitUploader(
+            concurrency=concurrency, upload_url=upload_url or self.server.url
+        )
+        self.addCleanup(uploader.close)
+        return uploader
+
+    def test_upload_files_returns_results_in_input_order(self):
+        paths = []
+        for index in range(8):
+            path = os.path.join(self.media_root, f"file_{index}.bin")
+            with open(path, "wb") as file_obj:
+                # Sizes grow with the index, so responses can be told apart
+                file_obj.write(b"x" * (index + 1) * 100)
+            paths.append(path)
+
+        results = self.uploader().upload_files(paths, "/products/test")
+
+        self.assertEqual([path for path, _raw, _error in results], paths)
+        self.assertEqual([error for _path, _raw, error in results], [None] * len(paths))
+        sizes = [raw["size"] for _path, raw, _error in results]
+        self.assertEqual(sizes, sorted(sizes))
+        self.assertEqual(len(set(sizes)), len(sizes))
+
+    def test_uploads_run_concurrently(self):
+        media_ids = self.create_images(8)
+        images = list(ProductImage.objects.filter(pk__in=media_ids))
+
+        start = timezone.now()
+        results = self.uploader(concurrency=8).upload_many(images)
+        elapsed = (timezone.now() - start).total_seconds()
+
+        self.assertEqual([media for media, _raw, _error in results], images)
+        # One at a time would take 8 round trips of 0.05s
+        self.assertLess(elapsed, 8 * 0.05)
+
+    def test_upload_media_saves_the_batch(self):
+        media_ids = self.create_images(5)
+        uploads = self.server.uploads
+
+        report = upload_media(
+            ProductImage, media_ids=media_ids, uploader=self.uploader()
+        )
+
+        self.assertEqual(report, {"uploaded": 5, "failed": 0, "reused": 0})
+        self.assertEqual(self.server.uploads - uploads, 5)
+        for image in ProductImage.objects.filter(pk__in=media_ids):
+            self.assertEqual(image.upload_status, UploadStatus.UPLOADED)
+            self.assertTrue(image.url.startswith(self.server.url_endpoint))
+            self.assertIn(image.file_id, self.server.files)
+        # Nothing is due anymore
+        self.assertEqual(
+            upload_media(ProductImage, media_ids=media_ids, uploader=self.uploader()),
+            {"uploaded": 0, "failed": 0, "reused": 0},
+        )
+
+    def test_failed_uploads_are_retried_after_a_backoff(self):
+        media_ids = self.create_images(3)
+        broken = self.uploader(upload_url=f"{self.server.url}/missing")
+
+        report = upload_media(ProductImage, media_ids=media_ids, uploader=broken)
+
+        self.assertEqual(report, {"uploaded": 0, "failed": 3, "reused": 0})
+        for image in ProductImage.objects.filter(pk__in=media_ids):
+            self.assertEqual(image.upload_status, UploadStatus.QUEUED)
+            self.assertEqual(image.upload_attempts, 1)
+            self.assertIn("404", image.upload_error)
+            self.assertGreater(image.next_upload_at, timezone.now())
+
+        # Not due again until the backoff is over
+        report = upload_media(
+            ProductImage, media_ids=media_ids, uploader=self.uploader()
+        )
+        self.assertEqual(report["uploaded"], 0)
+
+        ProductImage.objects.filter(pk__in=media_ids).update(
+            next_upload_at=timezone.now() - timedelta(seconds=1)
+        )
+        report = upload_media(
+            ProductImage, media_ids=media_ids, uploader=self.uploader()
+        )
+        self.assertEqual(report, {"uploaded": 3, "failed": 0, "reused": 0})
+
+    @override_settings(IMAGEKIT_UPLOAD_MAX_ATTEMPTS=1)
+    def test_uploads_out_of_attempts_fail(self):
+        media_ids = self.create_images(2)
+        broken = self.uploader(upload_url=f"{self.server.url}/missing")
+
+        upload_media(ProductImage, media_ids=media_ids, uploader=broken)
+
+        statuses = set(
+            ProductImage.objects.filter(pk__in=media_ids).values_list(
+                "upload_status", flat=True
+            )
+        )
+        self.assertEqual(statuses, {UploadStatus.FAILED})
+
+    def test_one_failure_does_not_fail_the_batch(self):
+        media_ids = self.create_images(4)
+        missing = ProductImage.objects.get(pk=media_ids[1])
+        default_storage.delete(missing.file_local.name)
+
+        report = upload_media(
+            ProductImage, media_ids=media_ids, uploader=self.uploader()
+        )
+
+        self.assertEqual(report, {"uploaded": 3, "failed": 1, "reused": 0})
+        statuses = dict(
+            ProductImage.objects.filter(pk__in=media_ids).values_list(
+                "pk", "upload_status"
+            )
+        )
+        self.assertEqual(statuses.pop(missing.pk), UploadStatus.QUEUED)
+        self.assertEqual(set(statuses.values()), {UploadStatus.UPLOADED})
+
+
+class LocalMediaGarbageCollectionTests(TestCase):
+    """
+    Local product media are kept while they wait to be uploaded
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        category = ProductCategory.objects.create(name="Category")
+        cls.product = Product.objects.create(
+            seller=seller,
+            category=category,
+            name="Product",
+            desc="Description",
+            price=10,
+        )
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, MEDIA_GC_GRACE_PERIOD=60
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def save_old_file(self, name):
+        name = default_storage.save(name, ContentFile(b"x"))
+        old = (timezone.now() - timedelta(hours=1)).timestamp()
+        os.utime(default_storage.path(name), (old, old))
+        return name
+
+    def test_collect_local(self):
+        pending = self.save_old_file("product/images/pending.jpg")
+        uploaded = self.save_old_file("product/images/uploaded.jpg")
+        stray = self.save_old_file("product/videos/stray.mp4")
+        ProductImage.objects.bulk_create(
+            [
+                ProductImage(product=self.product, file_local=pending),
+                ProductImage(
+                    product=self.product,
+                    file_local=uploaded,
+                    upload_status=UploadStatus.UPLOADED,
+                ),
+            ]
+        )
+
+        result = MediaGarbageCollector().collect_local()
+
+        self.assertEqual(result, {"scanned": 3, "orphans": 2, "bytes": 2})
+        self.assertTrue(default_storage.exists(pending))
+        self.assertFalse(default_storage.exists(uploaded))
+        self.assertFalse(default_storage.exists(stray))
+
+
+class MediaCreateOwnershipTests(TestCase):
+    """
+    Only the seller of a product, or an admin, can add media to it
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(
+            "seller", "seller@example.com", "password"
+        )
+        cls.other = User.objects.create_user("other", "other@example.com", "password")
+        cls.admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        category = ProductCategory.objects.create(name="Category")
+        cls.product = Product.objects.create(
+            seller=cls.seller,
+            category=category,
+            name="Product",
+            desc="Description",
+            price=10,
+        )
+
+    def assert_product_valid(self, serializer_class, user, valid):
+        request = APIRequestFactory().post("/")
+        request.user = user
+        serializer = serializer_class(
+            data={"product": self.product.pk}, context={"request": request}
+        )
+        serializer.is_valid()
+        self.assertEqual("product" not in serializer.errors, valid)
+
+    def test_images(self):
+        self.assert_product_valid(ProductImageCreateSerializer, self.seller, True)
+        self.assert_product_valid(ProductImageCreateSerializer, self.admin, True)
+        self.assert_product_valid(ProductImageCreateSerializer, self.other, False)
+
+    def test_videos(self):
+        self.assert_product_valid(ProductVideoCreateSerializer, self.seller, True)
+        self.assert_product_valid(ProductVideoCreateSerializer, self.admin, True)
+        self.assert_product_valid(ProductVideoCreateSerializer, self.other, False)
+
+    def test_same_admins_as_the_product_permission(self):
+        request = APIRequestFactory().patch("/")
+        permission = IsSellerOrAdmin()
+        for user, allowed in (
+            (self.seller, True),
+            (self.admin, True),
+            (self.other, False),
+        ):
+            request.user = user
+            self.assertEqual(
+                permission.has_object_permission(request, None, self.product), allowed
+            )
+            self.assertEqual(is_admin(user), user == self.admin)
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False)
+class ProductPaginationTests(TestCase):
+    """
+    Product lists page on a keyset, whatever the ordering
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seller = User.objects.create_user("seller", "seller@example.com", "password")
+        cls.category = ProductCategory.objects.create(name="Category")
+        # Ties on the price, which cursors must page through without offsets
+        cls.products = Product.objects.bulk_create(
+            Product(
+                seller=seller,
+                category=cls.category,
+                name=f"Product {index}",
+                price=index % 3,
+            )
+            for index in range(12)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, params, cursor_param="next"):
+        seen, pages = [], 0
+        response = self.client.get("/api/products/", params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(product["id"] for product in response.data["results"])
+            pages += 1
+            if not response.data[cursor_param]:
+                return seen, pages
+            response = self.client.get(response.data[cursor_param])
+
+    def test_ordering_by_price_pages_through_ties(self):
+        seen, pages = self.walk({"ordering": "price", "page_size": 5})
+        expected = [
+            product.pk
+            for product in sorted(
+                self.products, key=lambda product: (product.price, product.pk)
+            )
+        ]
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_ordering_by_price_descending(self):
+        seen, _pages = self.walk({"ordering": "-price", "page_size": 4})
+        expected = [
+            product.pk
+            for product in sorted(
+                self.products, key=lambda product: (-product.price, product.pk)
+            )
+        ]
+        self.assertEqual(seen, expected)
+
+    def test_previous_pages(self):
+        response = self.client.get(
+            "/api/products/", {"ordering": "price", "page_size": 5}
+        )
+        first = [product["id"] for product in response.data["results"]]
+        response = self.client.get(response.data["next"])
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([product["id"] for product in response.data["results"]], first)
+
+    def test_category_list_is_not_paginated(self):
+        response = self.client.get("/api/products/categories/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
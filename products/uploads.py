@@ -0,0 +1,492 @@
+"""
+Batched, concurrent upload of pending product media to ImageKit.
+
+A row is pending while it has a `file_local` and its `upload_status` isn't
+`uploaded`. `upload_pending` claims a batch of due rows, uploads their files
+in parallel through a bounded thread pool sharing one keep-alive HTTP
+session, and writes every result back with a single `bulk_update`.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from config.uploadhandlers import content_sha256
+from products.cache import bump_catalog_version
+from products.exceptions import UploadQueueFullException
+from products.image_processing import normalize_images
+from products.models import (
+    ProductCard,
+    ProductImage,
+    ProductVideo,
+    TranscodeStatus,
+    UploadStatus,
+)
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_PATH = "/api/v1/files/upload"
+UPLOAD_STATE_FIELDS = [
+    "upload_status",
+    "upload_attempts",
+    "upload_error",
+    "next_upload_at",
+]
+QUEUE_DEPTH_KEY = "imagekit:upload:queue-depth"
+
+
+class RateLimiter:
+    """
+    Space calls at least `1 / rate` seconds apart across threads.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_call = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ImageKitUploader:
+    """
+    Upload files to the ImageKit upload API from a pool of worker threads.
+
+    Usage:
+        uploader = ImageKitUploader(concurrency=8)
+        results = uploader.upload_many(ProductImage.objects.filter(...))
+    """
+
+    def __init__(
+        self, concurrency=None, rate_limit=None, upload_url=None, timeout=None
+    ):
+        self.concurrency = concurrency or settings.IMAGEKIT_UPLOAD_CONCURRENCY
+        self.upload_url = (upload_url or settings.IMAGEKIT_UPLOAD_API_URL).rstrip(
+            "/"
+        ) + UPLOAD_PATH
+        self.timeout = timeout or settings.IMAGEKIT_UPLOAD_TIMEOUT
+        if rate_limit is None:
+            rate_limit = settings.IMAGEKIT_UPLOAD_RATE_LIMIT
+        self.rate_limiter = RateLimiter(rate_limit)
+
+        # One connection per worker thread, reused for every upload
+        self.session = requests.Session()
+        self.session.auth = (settings.IMAGEKIT_PRIVATE_KEY, "")
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def upload(self, media):
+        """
+        Upload the local file of a ProductImage/ProductVideo and return the
+        decoded ImageKit response. Doesn't touch the database, so it is safe
+        to call from worker threads.
+        """
+        kind = "videos" if isinstance(media, ProductVideo) else "images"
+        folder = f"/products/{media.product_id}/{kind}"
+        filename = os.path.basename(media.file_local.name)
+        with media.file_local.open("rb") as file_obj:
+            return self.post_file(file_obj, filename, folder)
+
+    def upload_files(self, paths, folder):
+        """
+        Upload local files into `folder` concurrently.
+        Returns `(path, response, error)` tuples in input order.
+        """
+
+        def upload(path):
+            try:
+                with open(path, "rb") as file_obj:
+                    return (
+                        path,
+                        self.post_file(file_obj, os.path.basename(path), folder),
+                        None,
+                    )
+            except Exception as exc:
+                return path, None, exc
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(upload, paths))
+
+    def post_file(self, file_obj, filename, folder):
+        self.rate_limiter.wait()
+        response = self.session.post(
+            self.upload_url,
+            files={"file": (filename, file_obj)},
+            data={"fileName": filename, "folder": folder},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def upload_many(self, media_list):
+        """
+        Upload every item concurrently.
+        Returns `(media, response, error)` tuples in input order.
+        """
+
+        def upload(media):
+            try:
+                return media, self.upload(media), None
+            except Exception as exc:
+                return media, None, exc
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(upload, media_list))
+
+
+def pending_media(model):
+    """
+    Rows whose local file hasn't reached ImageKit, including the ones that
+    are waiting for a retry or failed for good
+    """
+    return (
+        model.objects.exclude(upload_status=UploadStatus.UPLOADED)
+        .exclude(file_local__isnull=True)
+        .exclude(file_local="")
+    )
+
+
+def due_media(model):
+    """
+    Pending rows the worker may upload now: queued ones whose backoff is
+    over, and ones left `processing` by a worker that died mid batch
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.IMAGEKIT_UPLOAD_STALE_AFTER)
+    return pending_media(model).filter(
+        Q(upload_status=UploadStatus.QUEUED, next_upload_at__isnull=True)
+        | Q(upload_status=UploadStatus.QUEUED, next_upload_at__lte=now)
+        | Q(upload_status=UploadStatus.PROCESSING, updated_at__lt=stale)
+    )
+
+
+def apply_upload_result(media, raw):
+    media.apply_upload_result(raw)
+    media.updated_at = timezone.now()
+
+
+def claim_media(model, media_ids=None, batch_size=None):
+    """
+    Move a batch of due rows to `processing` and return them.
+
+    Rows are locked with `SKIP LOCKED` while they are claimed, so concurrent
+    workers never claim the same row. The claim is committed right away: the
+    uploads happen outside of any transaction and pollers see the progress.
+    """
+    with transaction.atomic():
+        queryset = due_media(model)
+        if media_ids is not None:
+            queryset = queryset.filter(pk__in=media_ids)
+        batch = list(
+            queryset.select_for_update(skip_locked=True).order_by("pk")[:batch_size]
+        )
+        now = timezone.now()
+        model.objects.filter(pk__in=[media.pk for media in batch]).update(
+            upload_status=UploadStatus.PROCESSING, updated_at=now
+        )
+    for media in batch:
+        media.upload_status = UploadStatus.PROCESSING
+        media.updated_at = now
+    return batch
+
+
+def upload_media(model, media_ids=None, batch_size=None, uploader=None):
+    """
+    Upload one batch of due `model` rows and save the results.
+
+    Rows that fail are queued again with an exponential backoff, or marked
+    `failed` once they are out of attempts.
+
+    Returns a `{"uploaded": n, "failed": n, "reused": n}` report, where
+    `uploaded` includes the `reused` rows that took an existing upload.
+    """
+    batch_size = batch_size or settings.IMAGEKIT_UPLOAD_BATCH_SIZE
+    batch = claim_media(model, media_ids=media_ids, batch_size=batch_size)
+    if not batch:
+        return {"uploaded": 0, "failed": 0, "reused": 0}
+
+    own_uploader = uploader is None
+    try:
+        if own_uploader:
+            uploader = ImageKitUploader()
+
+        # Files whose content is on ImageKit already, or appears earlier in
+        # the batch, reuse that upload instead of being sent again
+        reusable = model.objects.uploaded_by_hash(
+            {media.content_hash for media in batch}
+        )
+        first_by_hash = {}
+        to_upload = []
+        duplicates = []
+        reused = []
+        for media in batch:
+            content_hash = media.content_hash
+            if content_hash in reusable:
+                apply_upload_result(media, reusable[content_hash])
+                reused.append(media)
+            elif content_hash in first_by_hash:
+                duplicates.append(media)
+            else:
+                if content_hash:
+                    first_by_hash[content_hash] = media
+                to_upload.append(media)
+
+        if model is ProductImage:
+            normalize_images(to_upload)
+
+        uploaded = []
+        errors = {}
+        for media, raw, error in uploader.upload_many(to_upload):
+            if error is not None:
+                errors[media.content_hash or media.pk] = error
+                logger.warning(
+                    "Uploading %s %s failed: %s", model.__name__, media.pk, error
+                )
+                media.record_upload_failure(error)
+                media.updated_at = timezone.now()
+                continue
+            apply_upload_result(media, raw)
+            uploaded.append(media)
+
+        failed = len(errors)
+        for media in duplicates:
+            original = first_by_hash[media.content_hash]
+            if original.url:
+                apply_upload_result(
+                    media, {"url": original.url, "fileId": original.file_id}
+                )
+                reused.append(media)
+            else:
+                failed += 1
+                media.record_upload_failure(errors[media.content_hash])
+                media.updated_at = timezone.now()
+        uploaded += reused
+    except Exception:
+        # Hand the batch back to the queue rather than waiting for it to go stale
+        model.objects.filter(pk__in=[media.pk for media in batch]).update(
+            upload_status=UploadStatus.QUEUED
+        )
+        raise
+    finally:
+        if own_uploader and uploader is not None:
+            uploader.close()
+
+    fields = ["url", "file_id", "updated_at"] + UPLOAD_STATE_FIELDS
+    if model is ProductImage:
+        # Normalized files were renamed whether or not they uploaded
+        fields += ["variants", "file_local", "original_size", "size"]
+    with transaction.atomic():
+        model.objects.bulk_update(batch, fields)
+        # What the post_save signals would have done for each row
+        if model is ProductImage:
+            ProductCard.objects.refresh({media.product_id for media in uploaded})
+        transaction.on_commit(bump_catalog_version)
+        # Originals of videos are kept for the transcoding stage, which
+        # deletes them when it is done
+        to_transcode = [
+            media.pk
+            for media in uploaded
+            if getattr(media, "transcode_status", None) == TranscodeStatus.PENDING
+        ]
+        transaction.on_commit(
+            lambda: delete_local_files(
+                [media for media in uploaded if media.pk not in to_transcode]
+            )
+        )
+        if to_transcode:
+            # Imported here, the tasks module imports this one
+            from products.tasks import schedule_video_transcodes
+
+            transaction.on_commit(lambda: schedule_video_transcodes(to_transcode))
+
+    return {"uploaded": len(uploaded), "failed": failed, "reused": len(reused)}
+
+
+def upload_pending(batch_size=None, max_batches=None, uploader=None):
+    """
+    Drain pending images and videos batch by batch. Stops once nothing is
+    left, after `max_batches` batches, or when a whole batch failed.
+    """
+    max_batches = max_batches or settings.IMAGEKIT_UPLOAD_MAX_BATCHES
+    own_uploader = uploader is None
+    if own_uploader:
+        uploader = ImageKitUploader()
+
+    report = {"uploaded": 0, "failed": 0, "reused": 0, "batches": 0}
+    try:
+        for model in (ProductImage, ProductVideo):
+            while report["batches"] < max_batches:
+                result = upload_media(model, batch_size=batch_size, uploader=uploader)
+                if not result["uploaded"] and not result["failed"]:
+                    break
+                report["batches"] += 1
+                report["uploaded"] += result["uploaded"]
+                report["failed"] += result["failed"]
+                report["reused"] += result["reused"]
+                if not result["uploaded"]:
+                    break
+    finally:
+        if own_uploader:
+            uploader.close()
+    return report
+
+
+def create_pending_images(product, files):
+    """
+    Store `files` as pending images of `product` with a single INSERT and
+    queue one upload drain for all of them.
+
+    Returns a result per file, in order: the `id` and `upload_status` of the
+    created image, or the `errors` that kept the file out. Invalid files
+    don't stop the valid ones from being created.
+    """
+    # Imported here, the tasks module imports this one
+    from products.tasks import schedule_pending_uploads
+
+    image_field = forms.ImageField()
+    next_order = (product.images.aggregate(order=Max("order"))["order"] or 0) + 1
+    results = []
+    images = []
+    for file in files:
+        try:
+            image_field.clean(file)
+        except ValidationError as exc:
+            results.append({"name": file.name, "errors": exc.messages})
+            continue
+        image = ProductImage(
+            product=product,
+            order=next_order + len(images),
+            content_hash=content_sha256(file),
+        )
+        # Writes the file only, the rows are inserted together below
+        image.file_local.save(os.path.basename(file.name), file, save=False)
+        images.append(image)
+        results.append({"name": file.name, "image": image})
+
+    with transaction.atomic():
+        ProductImage.objects.bulk_create(images)
+        # What the post_save signals would have done for each row
+        transaction.on_commit(bump_catalog_version)
+        if images:
+            transaction.on_commit(schedule_pending_uploads)
+
+    for result in results:
+        image = result.pop("image", None)
+        if image is not None:
+            result.update(id=image.pk, upload_status=image.upload_status)
+    return results
+
+
+def next_upload_delay():
+    """
+    Seconds until the next queued upload is due, or None when nothing is queued
+    """
+    now = timezone.now()
+    next_times = [
+        pending_media(model)
+        .filter(upload_status=UploadStatus.QUEUED)
+        .aggregate(next_at=Min(Coalesce("next_upload_at", now)))["next_at"]
+        for model in (ProductImage, ProductVideo)
+    ]
+    next_times = [next_at for next_at in next_times if next_at is not None]
+    if not next_times:
+        return None
+    return max((min(next_times) - now).total_seconds(), 0)
+
+
+def product_media_status(product_id):
+    """
+    Upload progress of a product's images and videos, with an overall
+    `status` that is `failed` if any file failed, `processing` while any is
+    still queued or uploading, and `uploaded` otherwise.
+    """
+    fields = ("id", "upload_status", "upload_attempts", "next_upload_at", "url")
+    data = {
+        "images": list(
+            ProductImage.objects.filter(product_id=product_id).values(*fields)
+        ),
+        "videos": list(
+            ProductVideo.objects.filter(product_id=product_id).values(*fields)
+        ),
+    }
+    counts = {value: 0 for value in UploadStatus.values}
+    for media in data["images"] + data["videos"]:
+        counts[media["upload_status"]] += 1
+
+    if counts[UploadStatus.FAILED]:
+        status = UploadStatus.FAILED
+    elif counts[UploadStatus.QUEUED] or counts[UploadStatus.PROCESSING]:
+        status = UploadStatus.PROCESSING
+    else:
+        status = UploadStatus.UPLOADED
+    return {"product": product_id, "status": status, "counts": counts, **data}
+
+
+def get_upload_queue_depth():
+    """
+    Number of media rows queued or being uploaded. Cached for a few seconds,
+    it is checked on every upload request.
+    """
+    depth = cache.get(QUEUE_DEPTH_KEY)
+    if depth is None:
+        depth = sum(
+            pending_media(model)
+            .filter(upload_status__in=[UploadStatus.QUEUED, UploadStatus.PROCESSING])
+            .count()
+            for model in (ProductImage, ProductVideo)
+        )
+        cache.set(
+            QUEUE_DEPTH_KEY, depth, timeout=settings.IMAGEKIT_UPLOAD_QUEUE_DEPTH_TTL
+        )
+    return depth
+
+
+def check_upload_queue():
+    """
+    Refuse new uploads with a 429 while the upload worker is
+    `IMAGEKIT_UPLOAD_MAX_QUEUE_DEPTH` files behind, e.g. because ImageKit is slow
+    """
+    max_depth = settings.IMAGEKIT_UPLOAD_MAX_QUEUE_DEPTH
+    if max_depth and get_upload_queue_depth() >= max_depth:
+        raise UploadQueueFullException(wait=settings.IMAGEKIT_UPLOAD_QUEUE_RETRY_AFTER)
+
+
+def delete_local_files(media_list):
+    for media in media_list:
+        try:
+            media.file_local.storage.delete(media.file_local.name)
+        except Exception:
+            pass
@@ -1,17 +1,31 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from products.views import ProductCategoryViewSet, ProductViewSet, ProductImageViewSet, ProductVideoViewSet
+from products.views import (
+    CatalogCacheStatsAPIView,
+    ProductCardViewSet,
+    ProductCategoryViewSet,
+    ProductImageViewSet,
+    ProductVideoUploadViewSet,
+    ProductVideoViewSet,
+    ProductViewSet,
+)
 
 app_name = "products"
 
 router = DefaultRouter()
 router.register(r"categories", ProductCategoryViewSet)
-router.register(r"", ProductViewSet)
+router.register(r"cards", ProductCardViewSet)
 router.register(r"images", ProductImageViewSet)
 router.register(r"videos", ProductVideoViewSet)
+router.register(r"video-uploads", ProductVideoUploadViewSet, basename="video-upload")
+# Registered last, its detail route would otherwise shadow the prefixes above
+router.register(r"", ProductViewSet)
 
 
 urlpatterns = [
+    path(
+        "cache-stats/", CatalogCacheStatsAPIView.as_view(), name="catalog_cache_stats"
+    ),
     path("", include(router.urls)),
 ]
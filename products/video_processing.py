@@ -0,0 +1,289 @@
+"""
+Transcoding of product videos with a local ffmpeg.
+
+Sellers upload whatever their phone records, often large MOV files. Once the
+original is on ImageKit, a Celery task re-encodes it into a web-optimized
+H.264/AAC MP4 whose index is at the start of the file (`faststart`), so
+players begin before the download completes, and extracts a JPEG poster
+frame. Both are uploaded next to the original.
+
+Long videos additionally get an adaptive bitrate HLS stream. ImageKit builds
+the ladder from the uploaded MP4 on request, see `ProductVideo.hls_url`.
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from products.cache import bump_catalog_version
+from products.models import ProductVideo, TranscodeStatus
+from products.uploads import ImageKitUploader
+
+logger = logging.getLogger(__name__)
+
+TRANSCODE_FIELDS = [
+    "mp4_url",
+    "mp4_file_id",
+    "poster_url",
+    "poster_file_id",
+    "duration",
+    "width",
+    "height",
+]
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def transcoding_available():
+    return bool(
+        settings.VIDEO_TRANSCODE_ENABLED
+        and shutil.which(settings.FFMPEG_BINARY)
+        and shutil.which(settings.FFPROBE_BINARY)
+    )
+
+
+def run(args):
+    try:
+        subprocess.run(
+            args,
+            check=True,
+            capture_output=True,
+            timeout=settings.VIDEO_TRANSCODE_TIMEOUT,
+        )
+    except subprocess.CalledProcessError as exc:
+        # The last lines of ffmpeg's log say what went wrong
+        stderr = exc.stderr.decode(errors="replace").strip().splitlines()[-5:]
+        raise TranscodeError(f"{args[0]} failed: {' '.join(stderr)}") from exc
+    except subprocess.TimeoutExpired as exc:
+        raise TranscodeError(f"{args[0]} timed out after {exc.timeout}s") from exc
+
+
+def probe_video(path):
+    """
+    `(duration, width, height)` of the first video stream of `path`
+    """
+    try:
+        output = subprocess.run(
+            [
+                settings.FFPROBE_BINARY,
+                "-v",
+                "error",
+                "-select_streams",
+                "v:0",
+                "-show_entries",
+                "stream=width,height:format=duration",
+                "-of",
+                "json",
+                path,
+            ],
+            check=True,
+            capture_output=True,
+            timeout=60,
+        ).stdout
+        info = json.loads(output)
+        stream = info["streams"][0]
+        return (
+            float(info["format"]["duration"]),
+            int(stream["width"]),
+            int(stream["height"]),
+        )
+    except (subprocess.SubprocessError, ValueError, KeyError, IndexError) as exc:
+        raise TranscodeError(f"Could not probe {path}: {exc}") from exc
+
+
+def transcode_mp4(path, output_path):
+    run(
+        [
+            settings.FFMPEG_BINARY,
+            "-y",
+            "-i",
+            path,
+            # First video and, if there is one, first audio stream
+            "-map",
+            "0:v:0",
+            "-map",
+            "0:a:0?",
+            "-c:v",
+            "libx264",
+            "-preset",
+            settings.VIDEO_TRANSCODE_PRESET,
+            "-crf",
+            str(settings.VIDEO_TRANSCODE_CRF),
+            "-pix_fmt",
+            "yuv420p",
+            # Cap the height, keeping the width even as H.264 requires
+            "-vf",
+            f"scale=-2:'min({settings.VIDEO_TRANSCODE_MAX_HEIGHT},ih)'",
+            "-c:a",
+            "aac",
+            "-b:a",
+            settings.VIDEO_TRANSCODE_AUDIO_BITRATE,
+            "-movflags",
+            "+faststart",
+            output_path,
+        ]
+    )
+
+
+def extract_poster(path, output_path, duration):
+    # Skip the first frames, they are often black
+    offset = min(settings.VIDEO_POSTER_OFFSET, duration / 2)
+    run(
+        [
+            settings.FFMPEG_BINARY,
+            "-y",
+            "-ss",
+            f"{offset:.2f}",
+            "-i",
+            path,
+            "-frames:v",
+            "1",
+            "-vf",
+            f"scale=-2:'min({settings.VIDEO_TRANSCODE_MAX_HEIGHT},ih)'",
+            "-q:v",
+            "3",
+            output_path,
+        ]
+    )
+
+
+def claim_video(video_id):
+    """
+    Move a video waiting for transcoding to `processing`, or return None if
+    it is not waiting, e.g. because another worker has it
+    """
+    with transaction.atomic():
+        video = (
+            ProductVideo.objects.select_for_update(skip_locked=True)
+            .filter(pk=video_id, transcode_status=TranscodeStatus.PENDING)
+            .first()
+        )
+        if video is not None:
+            video.transcode_status = TranscodeStatus.PROCESSING
+            ProductVideo.objects.filter(pk=video.pk).update(
+                transcode_status=video.transcode_status
+            )
+    return video
+
+
+def finish_video(video, status, fields=()):
+    video.transcode_status = status
+    video.updated_at = timezone.now()
+    fields = ["transcode_status", "updated_at", *fields]
+    with transaction.atomic():
+        ProductVideo.objects.filter(pk=video.pk).update(
+            **{field: getattr(video, field) for field in fields}
+        )
+        transaction.on_commit(bump_catalog_version)
+        if status != TranscodeStatus.PENDING:
+            transaction.on_commit(lambda: delete_local_file(video))
+
+
+def fail_transcode(video_id):
+    """
+    Give up on a video whose transcoding kept failing, players fall back
+    to the original
+    """
+    video = ProductVideo.objects.filter(
+        pk=video_id, transcode_status=TranscodeStatus.PENDING
+    ).first()
+    if video is not None:
+        finish_video(video, TranscodeStatus.FAILED)
+
+
+def delete_local_file(video):
+    if video.file_local:
+        try:
+            video.file_local.storage.delete(video.file_local.name)
+        except Exception:
+            pass
+
+
+def transcode_video(video_id, uploader=None):
+    """
+    Transcode the local original of a video, upload the web MP4 and poster
+    frame to ImageKit and record them on the video.
+
+    Returns the resulting transcode status, or None when the video wasn't
+    waiting for transcoding. On an error the video goes back to `pending`
+    and the error is raised, for the caller to retry.
+    """
+    video = claim_video(video_id)
+    if video is None:
+        return None
+
+    if not transcoding_available():
+        finish_video(video, TranscodeStatus.SKIPPED)
+        return TranscodeStatus.SKIPPED
+
+    # A copy of the same file was transcoded already
+    transcoded = (
+        ProductVideo.objects.filter(
+            content_hash=video.content_hash, transcode_status=TranscodeStatus.DONE
+        )
+        .exclude(content_hash="")
+        .values(*TRANSCODE_FIELDS)
+        .first()
+    )
+    if transcoded:
+        for field, value in transcoded.items():
+            setattr(video, field, value)
+        finish_video(video, TranscodeStatus.DONE, TRANSCODE_FIELDS)
+        return TranscodeStatus.DONE
+
+    own_uploader = uploader is None
+    if own_uploader:
+        uploader = ImageKitUploader(concurrency=2)
+    try:
+        if not video.file_local or not video.file_local.storage.exists(
+            video.file_local.name
+        ):
+            logger.warning("Video %s has no local file left to transcode", video.pk)
+            finish_video(video, TranscodeStatus.FAILED)
+            return TranscodeStatus.FAILED
+
+        source = video.file_local.path
+        stem = os.path.splitext(os.path.basename(video.file_local.name))[0]
+        folder = f"/products/{video.product_id}/videos"
+        with tempfile.TemporaryDirectory(prefix="transcode-") as workdir:
+            video.duration, video.width, video.height = probe_video(source)
+            mp4_path = os.path.join(workdir, f"{stem}-web.mp4")
+            poster_path = os.path.join(workdir, f"{stem}-poster.jpg")
+            transcode_mp4(source, mp4_path)
+            extract_poster(mp4_path, poster_path, video.duration)
+
+            for path, raw, error in uploader.upload_files(
+                [mp4_path, poster_path], folder
+            ):
+                if error is not None:
+                    raise error
+                if path == mp4_path:
+                    video.mp4_url, video.mp4_file_id = raw.get("url"), raw.get("fileId")
+                else:
+                    video.poster_url, video.poster_file_id = raw.get("url"), raw.get(
+                        "fileId"
+                    )
+            logger.info(
+                "Transcoded video %s: %d bytes to %d",
+                video.pk,
+                os.path.getsize(source),
+                os.path.getsize(mp4_path),
+            )
+    except Exception:
+        finish_video(video, TranscodeStatus.PENDING)
+        raise
+    finally:
+        if own_uploader:
+            uploader.close()
+
+    finish_video(video, TranscodeStatus.DONE, TRANSCODE_FIELDS)
+    return TranscodeStatus.DONE
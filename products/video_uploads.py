@@ -0,0 +1,118 @@
+"""
+Chunked, resumable uploads of product videos.
+
+Clients create a `ProductVideoUpload`, PUT the file in chunks at the offset
+the server reports, and complete it. Each chunk is streamed from the request
+straight into a partial file, so memory use is bounded by the read block size
+and a slow connection only holds a worker for the duration of one chunk.
+Resuming after a dropped connection is a GET of the upload for its offset.
+"""
+
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import ValidationError
+
+from products.exceptions import UploadOffsetConflictException
+from products.models import ProductVideo
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def append_chunk(upload, stream, offset, length, sha256=None):
+    """
+    Write `length` bytes read from `stream` at `offset` of the partial file.
+
+    `upload` must be locked by the caller. A chunk with a wrong offset, size
+    or checksum leaves the upload unchanged, so the client can simply retry it.
+    """
+    if upload.is_complete:
+        raise ValidationError({"detail": _("This upload is already complete.")})
+    if offset != upload.offset:
+        raise UploadOffsetConflictException(
+            {
+                "detail": UploadOffsetConflictException.default_detail,
+                "offset": upload.offset,
+            }
+        )
+    if length <= 0:
+        raise ValidationError({"detail": _("The chunk is empty.")})
+    if length > settings.VIDEO_UPLOAD_CHUNK_SIZE:
+        raise ValidationError(
+            {
+                "detail": _("Chunks may be at most %d bytes.")
+                % settings.VIDEO_UPLOAD_CHUNK_SIZE
+            }
+        )
+    if offset + length > upload.size:
+        raise ValidationError({"detail": _("The chunk goes past the end of the file.")})
+
+    os.makedirs(os.path.dirname(upload.partial_path), exist_ok=True)
+    digest = hashlib.sha256()
+    received = 0
+    mode = "r+b" if os.path.exists(upload.partial_path) else "wb"
+    with open(upload.partial_path, mode) as partial:
+        # Overwrite whatever an interrupted attempt at this chunk left behind
+        partial.seek(offset)
+        partial.truncate()
+        while received < length:
+            block = stream.read(min(READ_BLOCK_SIZE, length - received))
+            if not block:
+                break
+            partial.write(block)
+            digest.update(block)
+            received += len(block)
+
+        if received != length:
+            partial.truncate(offset)
+            raise ValidationError({"detail": _("The chunk was cut short.")})
+        if sha256 and digest.hexdigest() != sha256.lower():
+            partial.truncate(offset)
+            raise ValidationError({"detail": _("The chunk checksum does not match.")})
+
+    upload.offset = offset + length
+    upload.save(update_fields=["offset", "updated_at"])
+    return upload
+
+
+def complete_upload(upload):
+    """
+    Verify the assembled file and turn it into a `ProductVideo`, which
+    schedules the ImageKit upload like any other video.
+    """
+    if upload.is_complete:
+        return upload.video
+    if upload.offset != upload.size:
+        raise ValidationError(
+            {"detail": _("The upload is incomplete."), "offset": upload.offset}
+        )
+
+    digest = hashlib.sha256()
+    with open(upload.partial_path, "rb") as partial:
+        for block in iter(lambda: partial.read(READ_BLOCK_SIZE), b""):
+            digest.update(block)
+    content_hash = digest.hexdigest()
+    if upload.sha256 and content_hash != upload.sha256:
+        # There is no telling which chunk is corrupt, start over
+        os.remove(upload.partial_path)
+        upload.offset = 0
+        upload.save(update_fields=["offset", "updated_at"])
+        raise ValidationError(
+            {"detail": _("The file checksum does not match."), "offset": 0}
+        )
+
+    video = ProductVideo(product=upload.product, content_hash=content_hash)
+    with open(upload.partial_path, "rb") as partial:
+        # Storages copy `File` objects chunk by chunk
+        video.file_local.save(upload.file_name, File(partial), save=False)
+    video.save()
+
+    upload.video = video
+    upload.save(update_fields=["video", "updated_at"])
+    partial_path = upload.partial_path
+    transaction.on_commit(lambda: os.remove(partial_path))
+    return video
@@ -1,19 +1,61 @@
-from rest_framework import permissions, viewsets, status
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.http import condition
+from rest_framework import filters, mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from products.models import Product, ProductCategory, ProductImage, ProductVideo
+from config.imagekit import get_url_cache_stats
+from config.pagination import CreatedAtCursorPagination, SearchResultsPagination
+from products.cache import (
+    CatalogCacheMixin,
+    catalog_list_etag,
+    category_etag,
+    category_last_modified,
+    get_catalog_cache_stats,
+    product_etag,
+    product_last_modified,
+)
+from products.direct_uploads import confirm_upload, issue_upload_params
+from products.filters import ProductFilterBackend, product_facets
+from products.importers import ProductImporter, detect_format
+from products.models import (
+    Product,
+    ProductCard,
+    ProductCategory,
+    ProductImage,
+    ProductVideo,
+    ProductVideoUpload,
+)
 from products.permissions import IsSellerOrAdmin
 from products.serializers import (
+    ProductCardSerializer,
     ProductCategoryReadSerializer,
-    ProductReadSerializer,
-    ProductWriteSerializer,
-    ProductImageSerializer,
-    ProductVideoSerializer,
+    ProductImageBulkUploadSerializer,
+    ProductImageConfirmSerializer,
     ProductImageCreateSerializer,
+    ProductImageSerializer,
+    ProductImageUploadParamsSerializer,
+    ProductImportSerializer,
+    ProductReadSerializer,
     ProductVideoCreateSerializer,
+    ProductVideoSerializer,
+    ProductVideoUploadSerializer,
+    ProductWriteSerializer,
 )
+from products.uploads import (
+    check_upload_queue,
+    create_pending_images,
+    product_media_status,
+)
+from products.video_uploads import append_chunk, complete_upload
 
 
-class ProductCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductCategoryViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     List and Retrieve product categories
     """
@@ -22,22 +64,128 @@ class ProductCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = ProductCategoryReadSerializer
     permission_classes = (permissions.AllowAny,)
 
+    @method_decorator(condition(etag_func=catalog_list_etag))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(
+        condition(etag_func=category_etag, last_modified_func=category_last_modified)
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
-class ProductViewSet(viewsets.ModelViewSet):
+
+class ProductCardViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    List and Retrieve denormalized product cards
+    """
+
+    queryset = ProductCard.objects.all()
+    serializer_class = ProductCardSerializer
+    permission_classes = (permissions.AllowAny,)
+    pagination_class = CreatedAtCursorPagination
+
+    @method_decorator(condition(etag_func=catalog_list_etag))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+
+class ProductViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     """
     CRUD products
     """
 
     queryset = Product.objects.all()
+    filter_backends = (ProductFilterBackend, filters.OrderingFilter)
+    ordering_fields = ("price", "created_at")
+    ordering = ("-created_at", "id")
+    pagination_class = CreatedAtCursorPagination
+
+    def get_queryset(self):
+        res = super().get_queryset()
+        if self.action in ("list", "retrieve", "search"):
+            # ProductReadSerializer reads seller/category and every image/video
+            res = res.select_related("seller", "category").prefetch_related(
+                "images", "videos"
+            )
+        return res
+
+    @method_decorator(condition(etag_func=catalog_list_etag))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(
+        condition(etag_func=product_etag, last_modified_func=product_last_modified)
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=["get"], pagination_class=SearchResultsPagination)
+    def search(self, request, *args, **kwargs):
+        """
+        Full-text search over product name, description and category name
+        """
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": _("A search query is required.")})
+
+        queryset = ProductFilterBackend().filter_queryset(
+            request, self.get_queryset().search(query), self
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def bulk_import(self, request, *args, **kwargs):
+        """
+        Import products for the current user from a CSV or JSONL file
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        file_format = serializer.validated_data.get("format") or detect_format(
+            upload.name
+        )
+
+        report = ProductImporter(request.user).run(upload, file_format)
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"], url_path="media-status")
+    @method_decorator(
+        condition(etag_func=product_etag, last_modified_func=product_last_modified)
+    )
+    def media_status(self, request, pk=None):
+        """
+        Upload progress of the product's images and videos. Every status
+        change touches `updated_at`, so polls answer 304 until something moved.
+        """
+        product = get_object_or_404(Product.objects.only("pk"), pk=pk)
+        return Response(product_media_status(product.pk))
+
+    def paginate_queryset(self, queryset):
+        # Facets don't change between pages, so only the first page carries them
+        self.facets = None
+        if self.action == "list" and "cursor" not in self.request.query_params:
+            self.facets = product_facets(queryset)
+        return super().paginate_queryset(queryset)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.facets is not None:
+            response.data["facets"] = self.facets
+        return response
 
     def get_serializer_class(self):
         if self.action in ("create", "update", "partial_update", "destroy"):
             return ProductWriteSerializer
+        if self.action == "bulk_import":
+            return ProductImportSerializer
 
         return ProductReadSerializer
 
     def get_permissions(self):
-        if self.action in ("create",):
+        if self.action in ("create", "bulk_import"):
             self.permission_classes = (permissions.IsAuthenticated,)
         elif self.action in ("update", "partial_update", "destroy"):
             self.permission_classes = (IsSellerOrAdmin,)
@@ -56,13 +204,64 @@ class ProductImageViewSet(viewsets.ModelViewSet):
             return ProductImageCreateSerializer
         return ProductImageSerializer
 
+    def create(self, request, *args, **kwargs):
+        check_upload_queue()
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         instance = serializer.save()
         # If asynchronous upload is enabled the task will pick it up
         return instance
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Upload many images of one product in a single request. Returns a
+        result per file, valid files are stored even when others are not.
+        """
+        check_upload_queue()
+        serializer = ProductImageBulkUploadSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        results = create_pending_images(
+            serializer.validated_data["product"], serializer.validated_data["files"]
+        )
+        created = any("id" in result for result in results)
+        return Response(
+            {"results": results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
+
+    @action(detail=False, methods=["post"], url_path="upload-params")
+    def upload_params(self, request, *args, **kwargs):
+        """
+        Signed parameters to upload an image straight to ImageKit
+        """
+        serializer = ProductImageUploadParamsSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        params = issue_upload_params(serializer.validated_data["product"], request.user)
+        return Response(params, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"])
+    def confirm(self, request, *args, **kwargs):
+        """
+        Record an image uploaded straight to ImageKit
+        """
+        serializer = ProductImageConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        image = confirm_upload(user=request.user, **serializer.validated_data)
+        return Response(
+            ProductImageSerializer(image).data, status=status.HTTP_201_CREATED
+        )
+
     def get_permissions(self):
         if self.action in ("create", "update", "partial_update", "destroy"):
             self.permission_classes = (IsSellerOrAdmin,)
+        elif self.action in ("bulk", "upload_params", "confirm"):
+            self.permission_classes = (permissions.IsAuthenticated,)
         else:
             self.permission_classes = (permissions.AllowAny,)
         return super().get_permissions()
@@ -77,12 +276,113 @@ class ProductVideoViewSet(viewsets.ModelViewSet):
             return ProductVideoCreateSerializer
         return ProductVideoSerializer
 
+    def create(self, request, *args, **kwargs):
+        check_upload_queue()
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         instance = serializer.save()
         return instance
+
     def get_permissions(self):
         if self.action in ("create", "update", "partial_update", "destroy"):
             self.permission_classes = (IsSellerOrAdmin,)
         else:
             self.permission_classes = (permissions.AllowAny,)
         return super().get_permissions()
+
+
+class ProductVideoUploadViewSet(
+    mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
+    """
+    Resumable chunked video uploads.
+
+    POST a file name, size and optional SHA-256 to start an upload, then PUT
+    the raw bytes of each chunk to `chunk/` with an `Upload-Offset` header and,
+    optionally, an `Upload-Checksum: sha256 <hex digest>` header. After a
+    dropped connection, GET the upload and continue from its `offset`.
+    POST to `complete/` once every byte is in to create the video.
+    """
+
+    serializer_class = ProductVideoUploadSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = ProductVideoUpload.objects.all()
+        if not user.is_staff:
+            queryset = queryset.filter(uploaded_by=user)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        # Refused up front, not after the client has sent every chunk
+        check_upload_queue()
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(uploaded_by=self.request.user)
+
+    def get_locked_upload(self):
+        upload = self.get_object()
+        return self.get_queryset().select_for_update().get(pk=upload.pk)
+
+    @action(detail=True, methods=["put"])
+    def chunk(self, request, *args, **kwargs):
+        try:
+            offset = int(request.META["HTTP_UPLOAD_OFFSET"])
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except (KeyError, ValueError):
+            raise ValidationError(
+                {"detail": _("A numeric Upload-Offset header is required.")}
+            )
+
+        sha256 = None
+        checksum = request.META.get("HTTP_UPLOAD_CHECKSUM", "")
+        if checksum:
+            algorithm, _sep, sha256 = checksum.partition(" ")
+            if algorithm.lower() != "sha256" or not sha256:
+                raise ValidationError(
+                    {"detail": _("Upload-Checksum must be 'sha256 <hex digest>'.")}
+                )
+
+        with transaction.atomic():
+            upload = self.get_locked_upload()
+            # Read the body as a stream, request.data would buffer it
+            append_chunk(upload, request.stream, offset, length, sha256=sha256)
+
+        serializer = self.get_serializer(upload)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"])
+    def complete(self, request, *args, **kwargs):
+        # Validation errors are raised after the upload is reset for a retry,
+        # which has to be committed
+        error = None
+        with transaction.atomic():
+            upload = self.get_locked_upload()
+            try:
+                video = complete_upload(upload)
+            except ValidationError as exc:
+                error = exc
+        if error is not None:
+            raise error
+
+        serializer = ProductVideoSerializer(
+            video, context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class CatalogCacheStatsAPIView(APIView):
+    """
+    Hit/miss counters of the catalog response cache and, for the serving
+    process, of the ImageKit URL cache
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):
+        stats = get_catalog_cache_stats()
+        stats["imagekit_urls"] = get_url_cache_stats()
+        return Response(stats)
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.4 on 2026-10-17 23:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_address_options_alter_profile_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='address',
+            index=models.Index(fields=['user', '-created_at', 'id'], name='address_user_created_idx'),
+        ),
+    ]
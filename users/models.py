@@ -125,6 +125,11 @@ class Address(models.Model):
 
     class Meta:
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "id"], name="address_user_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.user.get_full_name()
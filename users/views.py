@@ -13,6 +13,7 @@ from rest_framework.generics import (
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from config.pagination import CreatedAtCursorPagination
 from users.models import Address, PhoneNumber, Profile
 from users.permissions import IsUserAddressOwner, IsUserProfileOwner
 from users.serializers import (
@@ -160,6 +161,7 @@ class AddressViewSet(ReadOnlyModelViewSet):
     queryset = Address.objects.all()
     serializer_class = AddressReadOnlySerializer
     permission_classes = (IsUserAddressOwner,)
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         res = super().get_queryset()